@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Compare per-request latency with and without connection reuse.
+
+A local stand-in for the MyPyTutor server (a threaded HTTP/1.1 server which
+answers every request with a short MyPyTutor response) is started in-process.
+The same sequence of requests is then made through a plain urllib opener,
+which opens a new connection for every request, and through the keep-alive
+opener used by SessionManager (see tutorlib.online.transport).
+
+Requests are made from several threads at once, as the sync thread pool
+does.  Connecting to localhost is much cheaper than connecting to the real
+server (and there is no TLS handshake), so the real saving is larger than
+the one shown here.
+
+Usage:
+  $ python3 benchmarks/keepalive_transport.py [--requests N]
+                                              [--concurrency N]
+
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+from socketserver import ThreadingMixIn
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'code'
+    ),
+)
+
+from tutorlib.online.session import make_opener
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answer every request as the MyPyTutor server would a simple action.
+
+    """
+    protocol_version = 'HTTP/1.1'  # allow keep-alive
+
+    # the headers and body are written separately, so without this, Nagle's
+    # algorithm would delay every keep-alive response (as a real server would
+    # not)
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = b'mypytutor>>>3.0.0\n'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass  # silence the per-request log lines
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_plain_opener():
+    """
+    Make an opener like the one SessionManager used before connection reuse.
+
+    """
+    return urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(),
+        urllib.request.ProxyHandler(proxies={}),
+    )
+
+
+def measure(opener, url, num_requests, concurrency):
+    """
+    Make num_requests requests to url, spread over concurrency threads.
+
+    Returns:
+      A list of the latency of each request, in seconds.
+
+    """
+    def request(_):
+        start = time.perf_counter()
+        with opener.open(url, None, 30) as response:
+            response.read()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return list(executor.map(request, range(num_requests)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare per-request latency with and without '
+                    'connection reuse',
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=2000,
+        help='The number of requests to make with each opener',
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='The number of requests to make at once',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    server = ThreadingHTTPServer(('localhost', 0), StandInHandler)
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    url = 'http://localhost:{}/mpt_cgi.py?action=get_version'.format(
+        server.server_port
+    )
+
+    results = []
+    for name, opener in [('plain', make_plain_opener()),
+                         ('keep-alive', make_opener())]:
+        measure(opener, url, args.concurrency, args.concurrency)  # warm up
+        latencies = sorted(
+            measure(opener, url, args.requests, args.concurrency)
+        )
+        results.append((name, latencies))
+
+    server.shutdown()
+
+    for name, latencies in results:
+        print('{:>10}: median {:7.3f}ms, p95 {:7.3f}ms'.format(
+            name,
+            statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.95)] * 1000,
+        ))
+
+    speedup = statistics.median(results[0][1]) \
+        / statistics.median(results[1][1])
+    print('speedup (median): {:.1f}x'.format(speedup))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Check that MyPyTutor starts up within a time budget.
+
+MyPyTutor is launched in a fresh interpreter for each run, with
+--profile-startup and --exit-after-startup, so every run is a cold start (as
+far as the Python process is concerned).  The median total startup time is
+compared against the budget, and the benchmark fails if it is exceeded.
+
+This runs the real launch path, so it needs a display, an installed tutorial
+package, and (unless the server is unreachable) will make the usual network
+requests.  The slowest phases and imports are printed, to show where the time
+went.
+
+Usage:
+  $ python3 benchmarks/startup_budget.py [--runs N] [--budget SECONDS]
+                                         [--trace-dir DIR]
+
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MYPYTUTOR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'code', 'MyPyTutor.py',
+)
+
+# the default budget for the median total startup time, in seconds
+# this can be overridden with --budget, or the MPT_STARTUP_BUDGET variable
+DEFAULT_BUDGET = 5.0
+
+
+def run_once(trace_path):
+    """
+    Launch MyPyTutor once, and return its startup trace.
+
+    """
+    subprocess.check_call(
+        [
+            sys.executable, MYPYTUTOR,
+            '--profile-startup', trace_path, '--exit-after-startup',
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+
+    with open(trace_path) as f:
+        return json.load(f)
+
+
+def summarise(traces, key, name_key, value_key, limit):
+    """
+    Return the median value of each named entry across the given traces, for
+    the `limit` entries with the largest medians.
+
+    """
+    values = {}
+    for trace in traces:
+        for entry in trace[key]:
+            values.setdefault(entry[name_key], []).append(entry[value_key])
+
+    medians = [
+        (statistics.median(times), name) for name, times in values.items()
+    ]
+    return sorted(medians, reverse=True)[:limit]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Check that MyPyTutor starts up within a time budget',
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=5,
+        help='The number of times to launch MyPyTutor',
+    )
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=float(os.environ.get('MPT_STARTUP_BUDGET', DEFAULT_BUDGET)),
+        help='The maximum median startup time, in seconds',
+    )
+    parser.add_argument(
+        '--trace-dir',
+        type=str,
+        default=None,
+        help='The directory to keep the startup traces in (by default, they '
+             'are discarded)',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    trace_dir = args.trace_dir or tempfile.mkdtemp()
+    os.makedirs(trace_dir, exist_ok=True)
+
+    traces = []
+    for run in range(args.runs):
+        trace_path = os.path.join(trace_dir, 'startup_{}.json'.format(run))
+        traces.append(run_once(trace_path))
+
+    total = statistics.median(trace['total'] for trace in traces)
+
+    print('phases (median seconds):')
+    for duration, name in summarise(traces, 'phases', 'name', 'duration', 20):
+        print('  {:8.3f}  {}'.format(duration, name))
+
+    print('slowest imports (median seconds, excluding child imports):')
+    for duration, name in summarise(traces, 'imports', 'module', 'self', 10):
+        print('  {:8.3f}  {}'.format(duration, name))
+
+    print('total: {:.3f}s (budget {:.3f}s)'.format(total, args.budget))
+
+    if total > args.budget:
+        print('FAIL: startup time exceeds budget')
+        return 1
+
+    print('OK')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Compare test run times with and without the test function cache.
+
+Every tutorial in problem_db is tested against its preload code (the code
+given to students to start with), which is enough to exercise every test
+function, whether it passes or not.  Each suite is run repeatedly with the
+cache cleared before every run (so that each test function's source is
+extracted and compiled every time it is used, as it was before the cache
+existed), and then repeatedly with the cache warm.
+
+Usage:
+  $ python3 benchmarks/test_function_cache.py [--runs N] [--problem-db DIR]
+
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'code'))
+
+from tutorlib.interface.tutorial import Tutorial
+import tutorlib.testing.cases
+from tutorlib.testing.submission import PreparedSubmission
+from tutorlib.testing.tester import TutorialTester
+
+
+def load_suites(problem_db):
+    """
+    Load every tutorial in the given directory which can be tested.
+
+    Returns:
+      A list of (name, test_classes, test_lcls, submission) tuples.
+
+    """
+    answer_dir = tempfile.mkdtemp()
+    suites = []
+
+    for name in sorted(os.listdir(problem_db)):
+        path = os.path.join(problem_db, name)
+        if not name.endswith('.tut') or not os.path.isdir(path):
+            continue
+
+        try:
+            tutorial = Tutorial(name, path, answer_dir)
+
+            lcls = {}
+            tutorial.exec_submodule(Tutorial.SUPPORT_MODULE, lcls, None)
+
+            submission = PreparedSubmission(
+                tutorial.preload_code_text, tutorial.wrap_student_code
+            )
+            suites.append((name, tutorial.test_classes, lcls, submission))
+        except Exception as e:
+            print('skipping {}: {}'.format(name, e), file=sys.stderr)
+
+    return suites
+
+
+def run_suites(suites, clear_cache):
+    """
+    Run every suite once.
+
+    Returns:
+      The total time taken, in seconds.
+
+    """
+    total = 0
+    for _, test_classes, lcls, submission in suites:
+        if clear_cache:
+            tutorlib.testing.cases._test_function_code.clear()
+
+        tester = TutorialTester(test_classes, lcls)
+
+        start = time.perf_counter()
+        tester.run(submission)
+        total += time.perf_counter() - start
+
+    return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare test run times with and without the test '
+                    'function cache',
+    )
+    parser.add_argument(
+        '--runs',
+        type=int,
+        default=20,
+        help='The number of times to run every suite in each mode',
+    )
+    parser.add_argument(
+        '--problem-db',
+        default=os.path.join(ROOT, 'problem_db'),
+        help='The directory containing the tutorials to test',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    suites = load_suites(args.problem_db)
+    num_tests = sum(len(test_classes) for _, test_classes, _, _ in suites)
+    print('{} tutorials, {} test classes'.format(len(suites), num_tests))
+
+    run_suites(suites, clear_cache=False)  # warm up (imports, linecache)
+
+    results = []
+    for name, clear_cache in [('uncached', True), ('cached', False)]:
+        times = [run_suites(suites, clear_cache) for _ in range(args.runs)]
+        results.append((name, statistics.median(times)))
+
+    for name, median in results:
+        print('{:>10}: median {:8.1f}ms for all suites'.format(
+            name, median * 1000
+        ))
+
+    print('speedup (median): {:.1f}x'.format(results[0][1] / results[1][1]))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+#! /usr/bin/env python2.7
+"""
+Compare the request throughput of the cgi and WSGI server entry points.
+
+The cgi path is measured by running mpt_cgi.py in a fresh interpreter for
+every request, exactly as the web server does.  The WSGI path is measured by
+making HTTP requests to mpt_wsgi.application, served in-process by a threaded
+server.
+
+Both paths need the server dependencies (dateutil, werkzeug) to be installed.
+The default action does not require authentication or any server data.
+
+Usage:
+  $ python2.7 benchmarks/wsgi_vs_cgi.py [--requests N] [--concurrency N]
+                                         [--action ACTION]
+
+"""
+import argparse
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib
+import urllib2
+
+CGI_BIN_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cgi-bin'
+)
+sys.path.insert(0, CGI_BIN_DIR)
+
+import mpt_wsgi
+
+
+def run_concurrently(func, num_requests, concurrency):
+    """
+    Call func num_requests times, spread over concurrency threads.
+
+    Returns:
+      The number of requests made per second.
+
+    """
+    remaining = [num_requests]
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            func()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return num_requests / (time.time() - start)
+
+
+def make_cgi_request(query_string):
+    """
+    Run mpt_cgi.py as the web server would, and check its response.
+
+    """
+    env = dict(os.environ)
+    env.update({
+        'GATEWAY_INTERFACE': 'CGI/1.1',
+        'REQUEST_METHOD': 'GET',
+        'QUERY_STRING': query_string,
+    })
+
+    output = subprocess.check_output(
+        [sys.executable, os.path.join(CGI_BIN_DIR, 'mpt_cgi.py')],
+        env=env,
+        cwd=CGI_BIN_DIR,
+    )
+    assert 'mypytutor' in output, output
+
+
+def make_wsgi_request(url):
+    """
+    Make an HTTP request to the WSGI server, and check its response.
+
+    """
+    output = urllib2.urlopen(url).read()
+    assert 'mypytutor' in output, output
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare the cgi and WSGI server entry points',
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=200,
+        help='The number of requests to make to each entry point',
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='The number of requests to make at once',
+    )
+    parser.add_argument(
+        '--action',
+        type=str,
+        default='get_tut_zip_file',
+        help='The action to request',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    query_string = urllib.urlencode({'action': args.action})
+
+    server = mpt_wsgi.make_server(
+        'localhost', 0, mpt_wsgi.application,
+        server_class=mpt_wsgi.ThreadingWSGIServer,
+    )
+    # silence the per-request log lines
+    server.RequestHandlerClass.log_message = lambda *args: None
+
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    url = 'http://localhost:{}/?{}'.format(server.server_port, query_string)
+
+    results = [
+        ('cgi', run_concurrently(
+            lambda: make_cgi_request(query_string),
+            args.requests, args.concurrency,
+        )),
+        ('wsgi', run_concurrently(
+            lambda: make_wsgi_request(url),
+            args.requests, args.concurrency,
+        )),
+    ]
+
+    server.shutdown()
+
+    for name, rate in results:
+        print '{:>5}: {:8.1f} requests/sec'.format(name, rate)
+    print 'speedup: {:.1f}x'.format(results[1][1] / results[0][1])
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
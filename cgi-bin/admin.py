@@ -4,11 +4,12 @@
 import cgi
 import csv
 import os
-from collections import Counter
+import sys
 
 from mako.template import Template
 from mako import exceptions
 
+import export
 import support
 import uqauth
 
@@ -117,29 +118,39 @@ def _upload_userlist(form):
 
 
 def _export(form):
-    """Return a list of summarised results for CSV download.
+    """Stream the selected users' marks (out of 10) as a CSV download.
     If the export cannot be performed (e.g. no users selected), then return a
     tuple with the error message to show.
 
-    This is kinda messy and hacky and squeezed into a place that it probably
-    shouldn't be.
+    The marks can be restricted to some problem sets (export_problem_set),
+    and to tutorials due within a date range (export_from and export_to, both
+    inclusive).
     """
     selected_users = form.getlist('selected_user')
     if not selected_users:
         return ('alert-warning', 'No users selected.')
 
-    rows = []
-    for user in selected_users:
-        progress = summarise_progress(user)
-        # Scale the mark out of 10
-        mark = progress['CORRECT'] * 10.0 / progress['TOTAL']
-        rows.append((user, mark))
+    try:
+        due_from = export.parse_export_date(form.getvalue('export_from', ''))
+        due_to = export.parse_export_date(form.getvalue('export_to', ''))
+    except ValueError as e:
+        return ('alert-danger', 'Invalid date: {}'.format(e))
+
+    catalogue = support.get_tutorial_catalogue()
+    tutorials = export.select_tutorials(
+        catalogue,
+        problem_sets=form.getlist('export_problem_set'),
+        due_from=due_from,
+        due_to=due_to,
+    )
+    if not tutorials:
+        return ('alert-warning', 'No tutorials match the export filters.')
 
     print "Content-Type: text/csv"
     print "Content-disposition: attachment;filename=results.csv\n"
-    # Too lazy to use a CSV writer
-    for line in rows:
-        print ','.join(map(str, line))
+    sys.stdout.flush()
+
+    export.write_marks(sys.stdout, selected_users, catalogue, tutorials)
     raise StopOutput()
 
 
@@ -151,7 +162,19 @@ ACTIONS = {
           }
 
 
-def get_sort_key(sort):
+def get_problem_set_names(catalogue):
+    """Return the names of the problem sets in the catalogue, in order."""
+    names = []
+    for ti in catalogue.tutorials:
+        if ti.problem_set_name not in names:
+            names.append(ti.problem_set_name)
+    return names
+
+
+def get_sort_key(sort, progress):
+    """Return a key-function to sort users on, given a mapping of user ids to
+    their progress (see summarise_progress).
+    """
     if sort in ('id', 'id_reverse'):
         return lambda user: user.id
     if sort in ('name', 'name_reverse'):
@@ -159,21 +182,25 @@ def get_sort_key(sort):
     if sort in ('email', 'email_reverse'):
         return lambda user: user.email
     if sort in ('marks', 'marks_reverse'):
-        return lambda user: -summarise_progress(user.id)['CORRECT']
+        return lambda user: -progress[user.id]['CORRECT']
     return None
 
 
-def summarise_progress(user):
-    """Summarise the user's progress by returning a mapping of the form
+def summarise_progress(users):
+    """Summarise the progress of each of the given users (ids), by returning a
+    mapping of user ids to mappings of the form
       {'OK': #, 'LATE': #, 'LATE_OK': #, 'MISSING': #, ...}
     where the values are the number of times the user has a submission of that
     type, and where CORRECT = OK + LATE_OK; TOTAL = CORRECT + LATE + MISSING.
+
+    This reads the stored progress summaries, so it does not need to parse
+    every user's logs.
     """
-    submissions = support.get_submissions_for_user(user)
-    counter = Counter(submissions.values())
-    counter['CORRECT'] = counter['OK'] + counter['LATE_OK']
-    counter['TOTAL'] = len(submissions)
-    return counter
+    summaries = support.get_progress_summaries(users)
+    return {
+        user: export.summarise_progress(submissions)
+        for user, submissions in summaries.items()
+    }
 
 
 def admin_init(admins=ADMINS, permitted_user=None):
@@ -231,11 +258,19 @@ def main():
     enrol_filter = form.getvalue('enrol_filter', support.ENROLLED)
     sort = form.getvalue('sort', 'id')
     reverse = sort.endswith('_reverse')
-    users = support.get_users(query, enrol_filter, get_sort_key(sort), reverse)
-    user_data = zip(users, [summarise_progress(u.id) for u in users])
+    users = support.get_users(query, enrol_filter)
+    progress = summarise_progress([u.id for u in users])
+
+    sort_key = get_sort_key(sort, progress)
+    if sort_key is not None:
+        users.sort(key=sort_key, reverse=reverse)
+    user_data = [(u, progress[u.id]) for u in users]
+
+    catalogue = support.get_tutorial_catalogue()
 
     data = {
             'user_data': user_data,
+            'problem_sets': get_problem_set_names(catalogue),
             'query': query,
             'enrol_filter': enrol_filter,
             'sort': sort,
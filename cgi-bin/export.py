@@ -0,0 +1,178 @@
+"""
+Export of student marks, for the admin interface (see admin.py).
+
+Marks are computed from the stored progress summaries (see
+support.get_progress_summaries), against a single TutorialCatalogue which is
+loaded once for the whole export.  Students are summarised in batches, in a
+pool of worker threads, and each row is written as soon as it (and every row
+before it) is ready, so the export never needs to be held in memory.
+
+"""
+from collections import Counter
+import csv
+from datetime import datetime, timedelta
+from multiprocessing.pool import ThreadPool
+
+import support
+
+
+# the number of batches of students to summarise at once
+EXPORT_WORKERS = 4
+
+# the number of students to summarise in each batch
+EXPORT_BATCH_SIZE = 200
+
+# how many rows to write between flushes of the output
+FLUSH_INTERVAL = 100
+
+# the format of the dates used to filter exports
+EXPORT_DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_export_date(date_str):
+    """
+    Parse a date used to filter an export.
+
+    Args:
+      date_str (str): The date, in EXPORT_DATE_FORMAT, or the empty string.
+
+    Returns:
+      The date, as a datetime, or None if date_str is empty.
+
+    Raises:
+      ValueError: If the date is not in the correct format.
+
+    """
+    if not date_str:
+        return None
+    return datetime.strptime(date_str, EXPORT_DATE_FORMAT)
+
+
+def select_tutorials(catalogue, problem_sets=None, due_from=None,
+                     due_to=None):
+    """
+    Return the tutorials to include in an export.
+
+    Args:
+      catalogue (TutorialCatalogue): The current tutorial catalogue.
+      problem_sets ([str], optional): The names of the problem sets to
+          include.  Defaults to None, which includes every problem set.
+      due_from (datetime, optional): Only include tutorials due on or after
+          this date.  Defaults to None.
+      due_to (datetime, optional): Only include tutorials due on or before
+          this date (inclusive of the whole day).  Defaults to None.
+
+    Returns:
+      A list of TutorialInfo objects, in catalogue order.
+
+    """
+    if due_to is not None:
+        due_to += timedelta(days=1)
+
+    return [
+        ti for ti in catalogue.tutorials
+        if (not problem_sets or ti.problem_set_name in problem_sets)
+        and (due_from is None or ti.due >= due_from)
+        and (due_to is None or ti.due < due_to)
+    ]
+
+
+def summarise_progress(submissions, tutorials=None):
+    """
+    Summarise a user's progress on the given tutorials.
+
+    Args:
+      submissions ({str: str}): The user's submission statuses, as returned
+          by support.get_submissions_for_user.
+      tutorials ([TutorialInfo], optional): The tutorials to count.  Defaults
+          to None, which counts every tutorial in the catalogue.
+
+    Returns:
+      A mapping of the form
+        {'OK': #, 'LATE': #, 'LATE_OK': #, 'MISSING': #, ...}
+      where the values are the number of times the user has a submission of
+      that type, and where CORRECT = OK + LATE_OK;
+      TOTAL = CORRECT + LATE + MISSING.
+
+    """
+    if tutorials is not None:
+        submissions = {ti.hash: submissions[ti.hash] for ti in tutorials}
+
+    counter = Counter(submissions.values())
+    counter['CORRECT'] = counter['OK'] + counter['LATE_OK']
+    counter['TOTAL'] = len(submissions)
+    return counter
+
+
+def get_mark(progress):
+    """
+    Return the mark for the given progress summary, out of 10.
+
+    """
+    if not progress['TOTAL']:
+        return 0.0
+    return progress['CORRECT'] * 10.0 / progress['TOTAL']
+
+
+def iter_marks(users, catalogue, tutorials, workers=EXPORT_WORKERS):
+    """
+    Compute the mark of each of the given users.
+
+    Args:
+      users ([str]): The users to compute marks for.
+      catalogue (TutorialCatalogue): The current tutorial catalogue.
+      tutorials ([TutorialInfo]): The tutorials to count.
+      workers (int, optional): The number of worker threads to use.  Only
+          summaries which are out of date need much work to compute.
+
+    Yields:
+      A (user, mark) tuple for each user, in the order given.
+
+    """
+    def _get_rows(batch):
+        summaries = support.get_progress_summaries(batch, catalogue=catalogue)
+        return [
+            (user, get_mark(summarise_progress(summaries[user], tutorials)))
+            for user in batch
+        ]
+
+    batches = [
+        users[i:i + EXPORT_BATCH_SIZE]
+        for i in range(0, len(users), EXPORT_BATCH_SIZE)
+    ]
+
+    support.get_storage()  # create the storage backend before the threads
+
+    pool = ThreadPool(workers)
+    try:
+        for rows in pool.imap(_get_rows, batches):
+            for row in rows:
+                yield row
+    finally:
+        pool.terminate()
+
+
+def write_marks(f, users, catalogue, tutorials, workers=EXPORT_WORKERS):
+    """
+    Write the marks of the given users to the given file, as CSV.
+
+    Rows are written as they are computed.
+
+    Args:
+      f (file): The file to write to.
+      users ([str]): The users to export.
+      catalogue (TutorialCatalogue): The current tutorial catalogue.
+      tutorials ([TutorialInfo]): The tutorials to count.
+      workers (int, optional): The number of worker threads to use.
+
+    """
+    writer = csv.writer(f, lineterminator='\n')
+
+    marks = iter_marks(users, catalogue, tutorials, workers=workers)
+    for count, (user, mark) in enumerate(marks, 1):
+        writer.writerow([user, str(mark)])
+
+        if count % FLUSH_INTERVAL == 0:
+            f.flush()
+
+    f.flush()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python2.7
+"""
+Maintenance commands for the MyPyTutor server storage.
+
+This script is run by hand on the server; it is not a cgi script.
+
+Usage:
+  $ python2.7 manage_storage.py migrate [--database PATH] [--overwrite]
+
+    Import the submission logs, admin logs, attempts and answers in the data/
+    tree into an SQLite database (see sqlite_storage.py).  Once this has been
+    run, set support.STORAGE_BACKEND to 'sqlite'.
+
+    The data/ tree is only read, never modified, so it is always possible to
+    switch back to the filesystem backend.
+
+  $ python2.7 manage_storage.py rebuild-summaries
+
+    Recompute every user's progress summary (see
+    support.get_progress_summaries) from their logs, using the configured
+    storage backend, and list any users whose stored summary was missing,
+    out of date, or inconsistent.  Summaries are kept up to date
+    automatically, so this is only needed after editing the logs by hand,
+    or as a consistency check.
+
+"""
+import argparse
+import json
+import os
+import sys
+
+import dateutil.parser
+
+import support
+from sqlite_storage import SQLiteStorage, hash_code
+
+
+def _list_dirs(path):
+    """
+    Return the names of all directories directly inside the given path.
+
+    """
+    if not os.path.exists(path):
+        return []
+    return sorted(
+        name for name in os.listdir(path)
+        if os.path.isdir(os.path.join(path, name))
+    )
+
+
+def _read_lines(path):
+    """
+    Return the non-empty lines of the given file, split on whitespace.
+
+    If the file does not exist, return an empty list.
+
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.split() for line in f if line.strip()]
+
+
+def _answer_rows():
+    """
+    Generate a row for the answers table for each answer in the data/ tree.
+
+    """
+    for user in _list_dirs(support.ANSWERS_DIR):
+        user_dir = os.path.join(support.ANSWERS_DIR, user)
+
+        for package in _list_dirs(user_dir):
+            package_dir = os.path.join(user_dir, package)
+
+            for problem_set in _list_dirs(package_dir):
+                problem_set_dir = os.path.join(package_dir, problem_set)
+
+                for tutorial in sorted(os.listdir(problem_set_dir)):
+                    path = os.path.join(problem_set_dir, tutorial)
+                    with open(path) as f:
+                        code = f.read()
+
+                    yield (user, package, problem_set, tutorial, code,
+                           hash_code(code), os.path.getmtime(path))
+
+
+def _submission_rows(user, user_dir):
+    """
+    Generate a row for the submissions table for each line of the user's
+    submission_log.
+
+    """
+    path = os.path.join(user_dir, support.SUBMISSION_LOG_NAME)
+    for tutorial_hash, date_str in _read_lines(path):
+        yield user, tutorial_hash, dateutil.parser.parse(date_str)
+
+
+def _admin_log_rows(user, user_dir):
+    """
+    Generate a row for the admin_log table for each line of the user's
+    admin_log.
+
+    Old log entries may be missing the authorising user and the time.
+
+    """
+    path = os.path.join(user_dir, support.ADMIN_LOG_NAME)
+    for line in _read_lines(path):
+        action, tutorial_hash = line[:2]
+        authorised_by = line[2] if len(line) > 2 else None
+        date = dateutil.parser.parse(line[3]) if len(line) > 3 else None
+
+        yield user, action, tutorial_hash, authorised_by, date
+
+
+def _attempts_rows(user, user_dir):
+    """
+    Generate a row for the attempts table for each entry in the user's
+    attempts file.
+
+    """
+    path = os.path.join(user_dir, support.ATTEMPTS_NAME)
+    if not os.path.exists(path):
+        return
+
+    with open(path) as f:
+        attempts = json.loads(f.read())
+
+    for tutorial_hash, num_attempts in sorted(attempts.items()):
+        yield user, str(tutorial_hash), int(num_attempts)
+
+
+def migrate(database_path, overwrite=False):
+    """
+    Import the data/ tree into a new SQLite database at the given path.
+
+    Args:
+      database_path (str): The path of the database to create.
+      overwrite (bool, optional): Whether to replace an existing database.
+          Defaults to False.
+
+    Returns:
+      A dictionary mapping table names to the number of rows imported.
+
+    Raises:
+      ValueError: If the database already exists, and overwrite is False.
+
+    """
+    if os.path.exists(database_path):
+        if not overwrite:
+            raise ValueError(
+                'Database already exists: {}'.format(database_path)
+            )
+        os.remove(database_path)
+
+    storage = SQLiteStorage(database_path)
+    counts = dict.fromkeys(
+        ['answers', 'submissions', 'admin_log', 'allow_late', 'attempts'], 0
+    )
+
+    # everything is imported in a single transaction; if anything goes wrong,
+    # we end up with an empty database rather than a partial one
+    with storage.connection as connection:
+        for row in _answer_rows():
+            connection.execute(
+                'INSERT INTO answers VALUES (?, ?, ?, ?, ?, ?, ?)', row
+            )
+            counts['answers'] += 1
+
+        for user in _list_dirs(support.SUBMISSIONS_DIR):
+            user_dir = os.path.join(support.SUBMISSIONS_DIR, user)
+
+            for row in _submission_rows(user, user_dir):
+                connection.execute(
+                    'INSERT INTO submissions (user, hash, date) '
+                    'VALUES (?, ?, ?)', row
+                )
+                counts['submissions'] += 1
+
+            # replay the admin log to get the current allow_late flags
+            allow_lates = set()
+            for row in _admin_log_rows(user, user_dir):
+                connection.execute(
+                    'INSERT INTO admin_log '
+                    '(user, action, hash, authorised_by, date) '
+                    'VALUES (?, ?, ?, ?, ?)', row
+                )
+                counts['admin_log'] += 1
+
+                _, action, tutorial_hash, _, _ = row
+                if action == 'allow_late':
+                    allow_lates.add(tutorial_hash)
+                elif action == 'disallow_late':
+                    allow_lates.discard(tutorial_hash)
+
+            for tutorial_hash in sorted(allow_lates):
+                connection.execute(
+                    'INSERT INTO allow_late (user, hash) VALUES (?, ?)',
+                    (user, tutorial_hash),
+                )
+                counts['allow_late'] += 1
+
+            for row in _attempts_rows(user, user_dir):
+                connection.execute(
+                    'INSERT INTO attempts (user, hash, num_attempts) '
+                    'VALUES (?, ?, ?)', row
+                )
+                counts['attempts'] += 1
+
+    storage.close()
+
+    return counts
+
+
+def rebuild_summaries():
+    """
+    Recompute the progress summaries of every known user.
+
+    Returns:
+      A two-element tuple of the number of users, and a list of the users
+      whose stored summary was changed.
+
+    """
+    users = set(user.id for user in support.get_users())
+    users.update(_list_dirs(support.SUBMISSIONS_DIR))
+
+    storage = support.get_storage()
+    if storage is not None:
+        rows = storage.connection.execute(
+            'SELECT DISTINCT user FROM submissions'
+        )
+        users.update(user for user, in rows)
+
+    users = sorted(users)
+    return len(users), support.rebuild_progress_summaries(users)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Maintenance commands for the MyPyTutor server storage',
+    )
+    subparsers = parser.add_subparsers(dest='command')
+
+    migrate_parser = subparsers.add_parser(
+        'migrate',
+        help='Import the data/ tree into an SQLite database',
+    )
+    migrate_parser.add_argument(
+        '--database',
+        type=str,
+        default=support.DATABASE_FILE,
+        help='The database file to create',
+    )
+    migrate_parser.add_argument(
+        '--overwrite',
+        action='store_true',
+        help='Replace the database if it already exists',
+    )
+
+    subparsers.add_parser(
+        'rebuild-summaries',
+        help='Recompute every user\'s progress summary, and report any '
+             'which were inconsistent',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    # never do anything if we've somehow been invoked as a cgi script
+    if 'GATEWAY_INTERFACE' in os.environ:
+        print 'Content-Type: text/plain\n'
+        print 'Forbidden'
+        return 1
+
+    args = parse_args()
+
+    if args.command == 'migrate':
+        try:
+            counts = migrate(args.database, overwrite=args.overwrite)
+        except ValueError as e:
+            sys.stderr.write('{}\n'.format(e))
+            return 1
+
+        for table, count in sorted(counts.items()):
+            print '{}: {} rows'.format(table, count)
+    elif args.command == 'rebuild-summaries':
+        num_users, changed = rebuild_summaries()
+
+        for user in changed:
+            print 'updated: {}'.format(user)
+        print '{} users, {} summaries updated'.format(num_users, len(changed))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,10 +2,13 @@
 
 import cgi
 import inspect
+from io import BytesIO
 import json
 import os
 import shutil
 import functools
+import sys
+import zlib
 
 import support
 import uqauth
@@ -13,14 +16,13 @@ import uqauth
 # static files (eg zipfiles)
 TUTORIAL_ZIPFILE_URL = "http://csse1001.uqcloud.net/mpt3/CSSE1001Tutorials.zip"
 MPT35_ZIPFILE_URL = "http://csse1001.uqcloud.net/mpt3/MyPyTutor351.zip"
+TUTORIAL_UPDATES_URL = "http://csse1001.uqcloud.net/mpt3/updates/"
 
 
 
 ######## end config   #################################
 
-HTML_ERROR = '''Content-Type: text/html
-
-<!DOCTYPE html>
+HTML_ERROR = '''<!DOCTYPE html>
 <html>
     <head>
         <title>MyPyTutor</title>
@@ -32,6 +34,30 @@ HTML_ERROR = '''Content-Type: text/html
 
 ADMINS = ['uqprobin', 'uqspurdo', 'uqbmart8', 'uqposhe1']
 
+# the maximum length of an uploaded answer, in bytes
+MAX_CODE_LENGTH = 5*1024
+
+# the maximum length of a request body once decompressed, in bytes
+MAX_REQUEST_LENGTH = 16*1024*1024
+
+# the minimum length of a response body to compress, in bytes
+COMPRESS_THRESHOLD = 1024
+
+# per-tutorial decisions returned by the sync_answers action
+SYNC_NONE = 'none'
+SYNC_UPLOAD = 'upload'
+SYNC_DOWNLOAD = 'download'
+
+# optional features of the protocol which this server supports, so that newer
+# clients know what they can use (see get_version)
+# bulk_sync -- the sync_answers and upload_answers actions
+CAPABILITIES = ['bulk_sync']
+
+# prefixes of responses to MyPyTutor
+RESPONSE_OK = 'mypytutor>>>'
+RESPONSE_ERROR = 'mypytutor_error>>>'
+RESPONSE_NULL = 'mypytutor_nullresponse>>>'
+
 ACTIONS = {}
 
 
@@ -69,7 +95,7 @@ class NullResponse(Exception):
 def action(name, admin=False):
     """Decorator constructor to register different server actions.
 
-    If the action requires administrator privileges
+    If the action requires administrator privileges, set admin to True.
 
     The decorated function could raise certain errors:
     * a ActionError if the CGI form is missing a required parameter,
@@ -139,7 +165,7 @@ def upload_code(code, tutorial_package_name, problem_set_name, tutorial_name):
 
     # immediately fail if the student is trying to send us too much junk
     # (so that we can't easily be DOSed)
-    if len(code) > 5*1024:
+    if len(code) > MAX_CODE_LENGTH:
         raise ActionError('Code exceeds maximum length')
 
     # write the answer
@@ -231,6 +257,150 @@ def answer_info(tutorial_package_name, problem_set_name, tutorial_name):
     return json.dumps(response_dict)
 
 
+def _load_json_list(name, value):
+    """
+    Decode the given JSON parameter, which must be a list.
+
+    Raises:
+      ActionError: If the parameter is not valid JSON, or is not a list.
+
+    """
+    try:
+        data = json.loads(value)
+    except ValueError:
+        raise ActionError('Invalid JSON for parameter {!r}'.format(name))
+
+    if not isinstance(data, list):
+        raise ActionError('Parameter {!r} must be a list'.format(name))
+
+    return data
+
+
+@action('sync_answers')
+def sync_answers(tutorial_package_name, manifest):
+    """
+    Compare the student's local answers against the server copies, for a
+    whole tutorial package at once.
+
+    This replaces one answer_info request per tutorial (plus a download
+    request for each answer which is newer on the server).  Answers which
+    are newer locally should then be sent using upload_answers.
+
+    The decision for each tutorial is made in the same way as the client's
+    per-tutorial sync (see SyncClient in the client code).
+
+    Args:
+      tutorial_package_name (str): The name of the tutorial package.
+      manifest (str): A JSON list of objects, each with the keys
+          'problem_set_name', 'tutorial_name', 'hash' and 'timestamp'.
+          The hash (a base32 encoding of the sha512 hash of the local answer)
+          and timestamp (the last-modified time of the local answer, as a unix
+          timestamp) are null if there is no local answer.
+
+    Returns:
+      A JSON list of objects, one for each element of the manifest, each with
+      the keys 'problem_set_name', 'tutorial_name' and 'action'.
+
+      The action is one of SYNC_NONE, SYNC_UPLOAD or SYNC_DOWNLOAD.  If it is
+      SYNC_DOWNLOAD, then the object will also have the key 'code', containing
+      the server copy of the answer.
+
+    Raises:
+      ActionError: If the manifest is not valid.
+
+    """
+    # authenticate the user
+    user = get_user_and_add()
+
+    entries = _load_json_list('manifest', manifest)
+
+    results = []
+    for entry in entries:
+        try:
+            problem_set_name = str(entry['problem_set_name'])
+            tutorial_name = str(entry['tutorial_name'])
+            local_hash = entry['hash']
+            local_timestamp = entry['timestamp']
+        except (KeyError, TypeError, UnicodeError):
+            raise ActionError('Invalid manifest entry: {!r}'.format(entry))
+
+        remote_hash = support.get_answer_hash(
+            user, tutorial_package_name, problem_set_name, tutorial_name
+        )
+        remote_timestamp = support.get_answer_modification_time(
+            user, tutorial_package_name, problem_set_name, tutorial_name
+        )
+
+        if local_hash is None:
+            decision = SYNC_NONE if remote_hash is None else SYNC_DOWNLOAD
+        elif local_hash == remote_hash:
+            decision = SYNC_NONE
+        elif remote_hash is None or local_timestamp >= remote_timestamp:
+            decision = SYNC_UPLOAD
+        else:
+            decision = SYNC_DOWNLOAD
+
+        result = {
+            'problem_set_name': problem_set_name,
+            'tutorial_name': tutorial_name,
+            'action': decision,
+        }
+        if decision == SYNC_DOWNLOAD:
+            result['code'] = support.read_answer(
+                user, tutorial_package_name, problem_set_name, tutorial_name
+            )
+        results.append(result)
+
+    return json.dumps(results)
+
+
+@action('upload_answers')
+def upload_answers(tutorial_package_name, answers):
+    """
+    Store the given answers on the server for the student's account.
+
+    This is the batched equivalent of the upload action.
+
+    Args:
+      tutorial_package_name (str): The name of the tutorial package.
+      answers (str): A JSON list of objects, each with the keys
+          'problem_set_name', 'tutorial_name' and 'code'.
+
+    Returns:
+      A JSON list of booleans, indicating whether each answer was stored.
+      Answers are not stored if the code is too large.
+
+    Raises:
+      ActionError: If the answers are not valid.
+
+    """
+    # authenticate the user
+    user = get_user_and_add()
+
+    entries = _load_json_list('answers', answers)
+
+    results = []
+    for entry in entries:
+        try:
+            problem_set_name = str(entry['problem_set_name'])
+            tutorial_name = str(entry['tutorial_name'])
+            # json gives us unicode; write_answer expects utf8-encoded text
+            code = entry['code'].encode('utf8')
+        except (KeyError, TypeError, AttributeError, UnicodeError):
+            raise ActionError('Invalid answer entry: {!r}'.format(entry))
+
+        if len(code) > MAX_CODE_LENGTH:
+            results.append(False)
+            continue
+
+        support.write_answer(
+            user, tutorial_package_name, problem_set_name, tutorial_name, code
+        )
+        results.append(True)
+
+    return json.dumps(results)
+
+
 @action('submit')
 def submit_answer(tutorial_hash, code, num_attempts):
     """
@@ -276,7 +446,8 @@ def submit_answer(tutorial_hash, code, num_attempts):
     user = get_user_and_add()
 
     # check that the tutorial actually exists
-    hashes = support.parse_tutorial_hashes()
+    catalogue = support.get_tutorial_catalogue()
+    hashes = catalogue.hashes
 
     if tutorial_hash not in hashes:
         raise ActionError('Invalid tutorial: {}'.format(tutorial_hash))
@@ -294,7 +465,7 @@ def submit_answer(tutorial_hash, code, num_attempts):
     # any previous hash that the problem may have had
     submissions = support.parse_submission_log(user)
 
-    valid_hashes = [h for h, ti in hashes.items() if ti == tutorial_info]
+    valid_hashes = catalogue.get_all_hashes(tutorial_hash)
 
     try:
         next(si for si in submissions if si.hash in valid_hashes
@@ -506,6 +677,29 @@ def get_tut_zip_file():
     return TUTORIAL_ZIPFILE_URL
 
 
+@action('get_tut_manifest')
+def get_tut_manifest():
+    """
+    Return the manifest of the per-tutorial update archives, as JSON.
+
+    This allows clients to download only the tutorials which have changed,
+    rather than the whole tutorial package zip file.  The manifest has keys:
+      url -- the base URL of the update archives
+      files -- a mapping of the package configuration filenames to their
+               contents
+      tutorials -- a mapping of each tutorial directory name to a hash of its
+                   contents; the update archive for a tutorial directory is
+                   named <directory>.zip
+
+    """
+    manifest = support.get_tutorials_manifest()
+    if manifest is None:
+        raise ActionError('No tutorial package manifest available')
+
+    manifest['url'] = TUTORIAL_UPDATES_URL
+    return json.dumps(manifest)
+
+
 @action('get_mpt')
 def get_mpt():
     """
@@ -516,12 +710,21 @@ def get_mpt():
 
 
 @action('get_version')
-def get_version():
+def get_version(capabilities=None):
     """
     Return the current MyPyTutor version, as a string.
 
+    If capabilities is given, the version is followed by the optional features
+    which this server supports (see CAPABILITIES), separated by spaces.  Older
+    servers ignore the parameter, so clients should assume that a feature is
+    unsupported unless it is listed.
+
     """
-    return support.get_mypytutor_version()
+    version = support.get_mypytutor_version()
+    if capabilities is None:
+        return version
+
+    return ' '.join([version.strip()] + CAPABILITIES)
 
 
 @action('get_tutorials_timestamp')
@@ -533,31 +736,163 @@ def get_tutorials_timestamp():
     return support.get_tutorials_timestamp()
 
 
-def main():
-    form = cgi.FieldStorage(keep_blank_values=True)
+def dispatch(form):
+    """
+    Run the action requested in the given form.
+
+    This is shared by the cgi entry point (main, below) and the WSGI entry
+    point (see mpt_wsgi.py), so that both produce identical responses.
 
+    Args:
+      form (cgi.FieldStorage): The request parameters.
+
+    Returns:
+      A two-element tuple of the response content type and the response body.
+
+    Raises:
+      uqauth.Redirected: If the user must log in first.
+
+    """
     if 'action' not in form:
-        print HTML_ERROR.format("You must use MyPyTutor directly to interact with the online data.")
-        return
+        return 'text/html', HTML_ERROR.format(
+            "You must use MyPyTutor directly to interact with the online data."
+        )
 
     action = form['action'].value
     if action not in ACTIONS:
-        print HTML_ERROR.format("Unknown action: " + action)
-        return
+        return 'text/html', HTML_ERROR.format("Unknown action: " + action)
 
     try:
         result = ACTIONS[action](form)
-    except uqauth.Redirected:
-        return
     except ActionError as e:
-        print "Content-Type: text/plain\n"
-        print "mypytutor_error>>>" + str(e)
+        return 'text/plain', RESPONSE_ERROR + str(e)
     except NullResponse as e:
-        print "Content-Type: text/plain\n"
-        print "mypytutor_nullresponse>>>" + str(e)
+        return 'text/plain', RESPONSE_NULL + str(e)
     else:
+        return 'text/plain', RESPONSE_OK + result
+
+
+class RequestEncodingError(Exception):
+    """
+    An error representing a request body which could not be decoded.
+
+    """
+    pass
+
+
+def decode_request(fp, environ):
+    """
+    Decompress the body of the given request, if it is gzipped.
+
+    Clients may send large request bodies (eg, bulk answer uploads) with
+    Content-Encoding: gzip (see tutorlib.online.transport).  The cgi module
+    does not understand this, so the body must be decompressed first.
+
+    Args:
+      fp (file): The request body.
+      environ (dict): The cgi (or WSGI) environment of the request.
+
+    Returns:
+      A two-element tuple of the body and environment to pass to
+      cgi.FieldStorage.  If the body is not compressed, these are the
+      arguments which were passed in.
+
+    Raises:
+      RequestEncodingError: If the body is compressed with an unsupported
+          encoding, is invalid, or is too long once decompressed.
+
+    """
+    encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+    if encoding in ('', 'identity'):
+        return fp, environ
+    if encoding != 'gzip':
+        raise RequestEncodingError(
+            'Unsupported request encoding: {}'.format(encoding)
+        )
+
+    try:
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        raise RequestEncodingError('Invalid Content-Length')
+
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)  # gzip format
+    try:
+        body = decompressor.decompress(fp.read(length), MAX_REQUEST_LENGTH)
+    except zlib.error:
+        raise RequestEncodingError('Invalid gzipped request body')
+
+    if decompressor.unconsumed_tail:
+        raise RequestEncodingError('Request body is too long')
+
+    environ = dict(environ)
+    del environ['HTTP_CONTENT_ENCODING']
+    environ['CONTENT_LENGTH'] = str(len(body))
+
+    return BytesIO(body), environ
+
+
+def encode_response(body, accept_encoding=None):
+    """
+    Compress the given response body, if the client accepts gzip and the body
+    is long enough to be worth compressing.
+
+    Args:
+      body (str): The response body.
+      accept_encoding (str, optional): The Accept-Encoding request header.
+
+    Returns:
+      A two-element tuple of the (possibly compressed) response body, and a
+      list of (name, value) headers to add to the response.
+
+    """
+    if isinstance(body, unicode):
+        body = body.encode('utf8')
+
+    if len(body) < COMPRESS_THRESHOLD:
+        return body, []
+
+    headers = [('Vary', 'Accept-Encoding')]
+
+    accepts_gzip = False
+    for coding in (accept_encoding or '').split(','):
+        params = [param.strip() for param in coding.split(';')]
+        if params[0].lower() in ('gzip', 'x-gzip'):
+            accepts_gzip = 'q=0' not in params and 'q=0.0' not in params
+
+    if not accepts_gzip:
+        return body, headers
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    body = compressor.compress(body) + compressor.flush()
+
+    return body, headers + [('Content-Encoding', 'gzip')]
+
+
+def main():
+    try:
+        fp, environ = decode_request(sys.stdin, os.environ)
+    except RequestEncodingError as e:
         print "Content-Type: text/plain\n"
-        print "mypytutor>>>" + result
+        print RESPONSE_ERROR + str(e)
+        return
+
+    form = cgi.FieldStorage(fp=fp, environ=environ, keep_blank_values=True)
+
+    try:
+        content_type, body = dispatch(form)
+    except uqauth.Redirected:
+        return
+
+    # print would append a newline to the body, so keep doing that
+    body, encoding_headers = encode_response(
+        body + '\n', os.environ.get('HTTP_ACCEPT_ENCODING'),
+    )
+
+    for name, value in encoding_headers:
+        print "{}: {}".format(name, value)
+    print "Content-Type: {}\n".format(content_type)
+
+    sys.stdout.write(body)
 
 if __name__ == '__main__':
     main()
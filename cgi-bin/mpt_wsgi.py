@@ -0,0 +1,158 @@
+#! /usr/bin/env python2.7
+"""
+A WSGI entry point for the MyPyTutor server actions.
+
+Running mpt_cgi.py as a cgi script means that every request pays for starting
+the interpreter, importing our dependencies, and re-reading the tutorial
+hashes (etc) from disk.  This module serves the same actions (see ACTIONS in
+mpt_cgi.py) from a long-running process instead, so that the support caches
+(eg, the tutorial catalogue and the storage backend) stay warm between
+requests.
+
+Responses are identical to those produced by mpt_cgi.py, so clients do not
+need to know which entry point they are talking to.
+
+Deployment:
+  Point any WSGI server at `mpt_wsgi:application`, eg:
+
+    $ gunicorn --workers 4 --threads 8 mpt_wsgi:application
+
+  Both pre-forking and threaded servers are supported.  Authentication state
+  is kept per-thread (see uqauth.set_environ).
+
+  For local testing, this module can also be run directly:
+
+    $ python2.7 mpt_wsgi.py [--host HOST] [--port PORT]
+
+"""
+import argparse
+import cgi
+from SocketServer import ThreadingMixIn
+import os
+import sys
+from wsgiref.simple_server import make_server, WSGIServer
+
+import mpt_cgi
+import uqauth
+
+
+def _get_form(environ):
+    """
+    Parse the request parameters from the given WSGI environ.
+
+    Returns:
+      A cgi.FieldStorage object, as would be seen by mpt_cgi.py.
+
+    Raises:
+      mpt_cgi.RequestEncodingError: If the request body cannot be decoded.
+
+    """
+    # FieldStorage reads QUERY_STRING itself for GET requests, so make sure
+    # that it is there; we don't want to fall back to os.environ
+    environ = dict(environ)
+    environ.setdefault('QUERY_STRING', '')
+
+    fp, environ = mpt_cgi.decode_request(environ['wsgi.input'], environ)
+
+    return cgi.FieldStorage(
+        fp=fp,
+        environ=environ,
+        keep_blank_values=True,
+    )
+
+
+def application(environ, start_response):
+    """
+    Handle a single request to the MyPyTutor server.
+
+    Args:
+      environ (dict): The WSGI environ.
+      start_response (callable): The WSGI start_response callback.
+
+    Returns:
+      A list containing the response body.
+
+    """
+    # uqauth redirects back to the requested url after logging in
+    if 'REQUEST_URI' not in environ:
+        environ['REQUEST_URI'] = environ.get('SCRIPT_NAME', '') \
+            + environ.get('PATH_INFO', '')
+        if environ.get('QUERY_STRING'):
+            environ['REQUEST_URI'] += '?' + environ['QUERY_STRING']
+
+    uqauth.set_environ(environ)
+    try:
+        form = _get_form(environ)
+        content_type, body = mpt_cgi.dispatch(form)
+    except uqauth.Redirected as e:
+        start_response('302 Found', [('Location', e.location)])
+        return ['']
+    except mpt_cgi.RequestEncodingError as e:
+        content_type, body = 'text/plain', mpt_cgi.RESPONSE_ERROR + str(e)
+    finally:
+        uqauth.set_environ(None)
+
+    # mpt_cgi.py prints the body, which appends a newline
+    body, encoding_headers = mpt_cgi.encode_response(
+        body + '\n', environ.get('HTTP_ACCEPT_ENCODING'),
+    )
+
+    start_response('200 OK', encoding_headers + [
+        ('Content-Type', content_type),
+        ('Content-Length', str(len(body))),
+    ])
+    return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """
+    A WSGI server which handles each request in a new thread.
+
+    """
+    daemon_threads = True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Serve the MyPyTutor actions over WSGI (for testing)',
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default='localhost',
+        help='The host to listen on',
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=8000,
+        help='The port to listen on',
+    )
+
+    return parser.parse_args()
+
+
+def main():
+    # never start a server if we've somehow been invoked as a cgi script
+    if 'GATEWAY_INTERFACE' in os.environ:
+        print 'Content-Type: text/plain\n'
+        print 'Forbidden'
+        return 1
+
+    args = parse_args()
+
+    server = make_server(
+        args.host, args.port, application, server_class=ThreadingWSGIServer,
+    )
+    print 'Serving on http://{}:{}/'.format(args.host, args.port)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
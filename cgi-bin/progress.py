@@ -19,9 +19,10 @@ TZ_DELTA = datetime.timedelta(hours=10)
 def get_submissions(user):
     """Return a list of submission statistics for the given user."""
     # get the raw data
-    tutorials = support.get_tutorials()
+    catalogue = support.get_tutorial_catalogue()
+    tutorials = catalogue.tutorials
     submissions = support.parse_submission_log(user)
-    mappings = support.parse_tutorial_hashes()
+    mappings = catalogue.hashes
 
     tutorial_submissions = {
         mappings[submission.hash]: submission for submission in submissions
@@ -0,0 +1,397 @@
+"""
+An indexed SQLite storage backend for user submissions, allow-late flags,
+attempt counts and synced answers.
+
+The filesystem layout described in support.py requires every request to
+re-read (and re-parse) the user's entire submission and admin logs.  This
+backend keeps the same data in indexed tables instead, so that the cost of a
+request does not grow with the length of a user's history.
+
+The database is opened in WAL mode, so that readers (eg, progress pages) do
+not block writers (eg, submissions) when many students use MyPyTutor at once.
+
+This module is not used directly by the cgi code.  support.py delegates to it
+when STORAGE_BACKEND is set to 'sqlite'.  An existing data/ tree can be
+imported using manage_storage.py.
+
+Tables:
+  submissions (user, hash, date)           <- one row per submission_log line
+  allow_late (user, hash)                  <- current allow_late flags
+  admin_log (user, action, hash, authorised_by, date)
+                                           <- audit trail of admin actions
+  attempts (user, hash, num_attempts)      <- attempts before submission
+  answers (user, package, problem_set, tutorial, code, hash, mtime)
+                                           <- synced answer files
+  progress_summaries (user, version, summary)
+                                           <- see support.get_progress_summaries
+
+"""
+import base64
+import hashlib
+import sqlite3
+import threading
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS submissions (
+    user TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    date TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_by_user ON submissions (user, hash);
+
+CREATE TABLE IF NOT EXISTS allow_late (
+    user TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (user, hash)
+);
+
+CREATE TABLE IF NOT EXISTS admin_log (
+    user TEXT NOT NULL,
+    action TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    authorised_by TEXT,
+    date TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS admin_log_by_user ON admin_log (user);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    user TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    num_attempts INTEGER NOT NULL,
+    PRIMARY KEY (user, hash)
+);
+
+CREATE TABLE IF NOT EXISTS answers (
+    user TEXT NOT NULL,
+    package TEXT NOT NULL,
+    problem_set TEXT NOT NULL,
+    tutorial TEXT NOT NULL,
+    code TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (user, package, problem_set, tutorial)
+);
+
+CREATE TABLE IF NOT EXISTS progress_summaries (
+    user TEXT NOT NULL PRIMARY KEY,
+    version TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+'''
+
+# the maximum number of parameters in a single query
+MAX_QUERY_PARAMETERS = 500
+
+# how long to wait on a locked database before giving up, in seconds
+LOCK_TIMEOUT = 10.0
+
+
+def hash_code(code):
+    """
+    Return a base32 encoding of the sha512 hash of the given code.
+
+    This must match support.get_answer_hash, as clients compare it against
+    the hash of their local copy of the answer.
+
+    Args:
+      code (str): The code to hash.
+
+    Returns:
+      The base32-encoded hash, as a string.
+
+    """
+    data = code if isinstance(code, bytes) else code.encode('utf8')
+    answer_hash = hashlib.sha512(data).digest()
+
+    return base64.b32encode(answer_hash).decode('ascii')
+
+
+class SQLiteStorage(object):
+    """
+    Storage for submissions, allow-late flags, attempts and answers in an
+    indexed SQLite database.
+
+    Each thread gets its own connection, so a single SQLiteStorage object may
+    be shared by a long-running, multi-threaded server.
+
+    Attributes:
+      path (str): The path to the database file.
+
+    """
+    def __init__(self, path):
+        """
+        Initialise a new SQLiteStorage object.
+
+        The database (and its tables) will be created on first use if they do
+        not already exist.
+
+        Args:
+          path (str): The path to the database file.
+
+        """
+        self.path = path
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        """
+        Return the database connection for the current thread.
+
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=LOCK_TIMEOUT,
+                detect_types=sqlite3.PARSE_DECLTYPES,
+            )
+            # return byte strings under Python 2, which is what the rest of
+            # the cgi code expects to be working with
+            connection.text_factory = str
+
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """
+        Close the database connection for the current thread, if open.
+
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+    ##########################################################################
+    # ANSWERS
+    ##########################################################################
+
+    def read_answer(self, user, package, problem_set, tutorial):
+        """
+        Return the text of the given answer, or None if it does not exist.
+
+        """
+        row = self.connection.execute(
+            'SELECT code FROM answers WHERE user = ? AND package = ? '
+            'AND problem_set = ? AND tutorial = ?',
+            (user, package, problem_set, tutorial),
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def write_answer(self, user, package, problem_set, tutorial, code,
+            mtime=None):
+        """
+        Write (or overwrite) the given answer.
+
+        Args:
+          mtime (float, optional): The modification time to record for the
+              answer, as a unix timestamp.  Defaults to the current time.
+
+        """
+        if mtime is None:
+            mtime = time.time()
+
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO answers '
+                '(user, package, problem_set, tutorial, code, hash, mtime) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (user, package, problem_set, tutorial, code, hash_code(code),
+                 mtime),
+            )
+
+    def get_answer_info(self, user, package, problem_set, tutorial):
+        """
+        Return the hash and modification time of the given answer.
+
+        Returns:
+          A two-element tuple of the base32-encoded answer hash and the
+          modification time (as a unix timestamp).
+          (None, None) if no such answer exists.
+
+        """
+        row = self.connection.execute(
+            'SELECT hash, mtime FROM answers WHERE user = ? AND package = ? '
+            'AND problem_set = ? AND tutorial = ?',
+            (user, package, problem_set, tutorial),
+        ).fetchone()
+        return tuple(row) if row is not None else (None, None)
+
+    def get_users(self):
+        """
+        Return the set of users who have synced at least one answer.
+
+        """
+        rows = self.connection.execute('SELECT DISTINCT user FROM answers')
+        return set(user for user, in rows)
+
+    ##########################################################################
+    # SUBMISSIONS
+    ##########################################################################
+
+    def get_submissions(self, user):
+        """
+        Return the user's submissions, in the order they were made.
+
+        Returns:
+          A list of (hash, date) tuples.
+
+        """
+        return self.connection.execute(
+            'SELECT hash, date FROM submissions WHERE user = ? ORDER BY rowid',
+            (user,),
+        ).fetchall()
+
+    def get_allow_lates(self, user):
+        """
+        Return the set of tutorial hashes the user may submit late.
+
+        """
+        rows = self.connection.execute(
+            'SELECT hash FROM allow_late WHERE user = ?', (user,),
+        )
+        return set(h for h, in rows)
+
+    def add_submission(self, user, tutorial_hash, date):
+        """
+        Record a submission of the given tutorial by the given user.
+
+        """
+        with self.connection as connection:
+            connection.execute(
+                'INSERT INTO submissions (user, hash, date) VALUES (?, ?, ?)',
+                (user, tutorial_hash, date),
+            )
+
+    def remove_submissions(self, user, tutorial_hashes):
+        """
+        Remove all of the user's submissions of the given tutorials.
+
+        Returns:
+          A dictionary mapping each hash which was either submitted or given
+          to one of 'RETAINED', 'REMOVED', or 'IGNORED', as for
+          support.reset_submissions_for_user.
+
+        """
+        tutorial_hashes = list(tutorial_hashes)
+        to_remove = set(tutorial_hashes)
+
+        res = {}
+        for tutorial_hash, _ in self.get_submissions(user):
+            res[tutorial_hash] = \
+                'REMOVED' if tutorial_hash in to_remove else 'RETAINED'
+
+        for tutorial_hash in tutorial_hashes:
+            res.setdefault(tutorial_hash, 'IGNORED')
+
+        with self.connection as connection:
+            connection.executemany(
+                'DELETE FROM submissions WHERE user = ? AND hash = ?',
+                [(user, h) for h in to_remove],
+            )
+
+        return res
+
+    def has_allow_late(self, user, tutorial_hash):
+        """
+        Return whether the user has the allow_late flag set on the tutorial.
+
+        """
+        row = self.connection.execute(
+            'SELECT 1 FROM allow_late WHERE user = ? AND hash = ?',
+            (user, tutorial_hash),
+        ).fetchone()
+        return row is not None
+
+    def set_allow_late(self, user, tutorial_hash, authorised_by, on, date):
+        """
+        Set or unset the allow_late flag, and log the change.
+
+        Callers are responsible for checking whether the flag is already set.
+
+        """
+        action = ('disallow_late', 'allow_late')[on]
+
+        with self.connection as connection:
+            if on:
+                connection.execute(
+                    'INSERT OR IGNORE INTO allow_late (user, hash) '
+                    'VALUES (?, ?)',
+                    (user, tutorial_hash),
+                )
+            else:
+                connection.execute(
+                    'DELETE FROM allow_late WHERE user = ? AND hash = ?',
+                    (user, tutorial_hash),
+                )
+
+            connection.execute(
+                'INSERT INTO admin_log '
+                '(user, action, hash, authorised_by, date) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (user, action, tutorial_hash, authorised_by, date),
+            )
+
+    ##########################################################################
+    # ATTEMPTS
+    ##########################################################################
+
+    def record_attempts(self, user, tutorial_hash, num_attempts):
+        """
+        Record the number of attempts made by the user at the tutorial,
+        overwriting any existing record.
+
+        """
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO attempts (user, hash, num_attempts) '
+                'VALUES (?, ?, ?)',
+                (user, tutorial_hash, num_attempts),
+            )
+
+    ##########################################################################
+    # PROGRESS SUMMARIES
+    ##########################################################################
+
+    def get_progress_summaries(self, users):
+        """
+        Return the stored progress summaries of the given users.
+
+        Returns:
+          A dictionary mapping users to a (version, summary) tuple.  Users
+          without a stored summary are omitted.
+
+        """
+        users = list(users)
+
+        results = {}
+        for i in range(0, len(users), MAX_QUERY_PARAMETERS):
+            chunk = users[i:i + MAX_QUERY_PARAMETERS]
+            rows = self.connection.execute(
+                'SELECT user, version, summary FROM progress_summaries '
+                'WHERE user IN ({})'.format(', '.join('?' * len(chunk))),
+                chunk,
+            )
+            for user, version, summary in rows:
+                results[user] = version, summary
+
+        return results
+
+    def put_progress_summary(self, user, version, summary):
+        """
+        Store the progress summary of the given user, replacing any existing
+        summary.
+
+        """
+        with self.connection as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO progress_summaries '
+                '(user, version, summary) VALUES (?, ?, ?)',
+                (user, version, summary),
+            )
@@ -8,6 +8,12 @@ filesystem like this) has been extracted into this file.
 
 The cgi code should remain unaware of the underlying storage mechanisms.
 
+Submissions, allow-late flags, attempts and answers can alternatively be kept
+in an indexed SQLite database (see sqlite_storage.py), by setting
+STORAGE_BACKEND to 'sqlite'.  Existing data can be imported into the database
+using manage_storage.py.  The functions in this file have the same behaviour
+regardless of the backend in use.
+
 File structure:
   base_dir/
     mpt_version                      <- MyPyTutor version file
@@ -25,6 +31,7 @@ File structure:
           submission_log             <- student submission log
           admin_log                  <- log of admin actions taken on the user
           attempts                   <- record of num attempts at tutorials
+          progress_summary           <- the student's submission statuses
           <tutorial_problem_hash>    <- the student's answer, as submitted
       feedback/
         <username>.<feedback_id>     <- an individual item of feedback
@@ -34,6 +41,7 @@ import base64
 from collections import namedtuple
 from datetime import datetime
 import dateutil.parser
+import fcntl
 import hashlib
 import json
 import os
@@ -62,21 +70,87 @@ TUTORIAL_HASH_MAPPINGS_FILE = os.path.join(
 SUBMISSION_LOG_NAME = "submission_log"
 ADMIN_LOG_NAME = "admin_log"
 ATTEMPTS_NAME = 'attempts'
+PROGRESS_SUMMARY_NAME = 'progress_summary'
 
 DUE_DATE_FORMAT = "%H_%d/%m/%y"
 
+# storage backend for submissions, attempts and answers
+# one of 'filesystem' (the layout above) or 'sqlite' (see sqlite_storage.py)
+STORAGE_BACKEND = 'filesystem'
+DATABASE_FILE = os.path.join(DATA_DIR, 'mpt.sqlite3')
+
 # MyPyTutor version file
 MPT_VERSION_FILE = os.path.join(BASE_DIR, 'mpt_version')
 
 # Tutorial zipfile
 TUTORIALS_ZIP_PATH = os.path.join(PUBLIC_DIR, 'CSSE1001Tutorials.zip')
 
+# Per-tutorial update archives, and the manifest describing them
+# (see create_tutorial.py)
+TUTORIALS_UPDATES_DIR = os.path.join(PUBLIC_DIR, 'updates')
+TUTORIALS_MANIFEST_PATH = os.path.join(TUTORIALS_UPDATES_DIR, 'manifest.json')
+
+
+##############################################################################
+# SUPPORT FOR SELECTING THE STORAGE BACKEND
+##############################################################################
+
+
+_storage = None
+
+
+def get_storage():
+    """
+    Return the storage backend object to delegate to.
+
+    The backend is created once per process, so that a long-running server can
+    reuse its database connections between requests.
+
+    Returns:
+      None if STORAGE_BACKEND is 'filesystem', in which case the functions in
+      this file access the filesystem directly.
+      The backend object (eg, an SQLiteStorage instance) otherwise.
+
+    """
+    global _storage
+
+    if STORAGE_BACKEND == 'filesystem':
+        return None
+
+    if _storage is None:
+        assert STORAGE_BACKEND == 'sqlite', \
+            'Unknown storage backend: {}'.format(STORAGE_BACKEND)
+
+        from sqlite_storage import SQLiteStorage
+        _storage = SQLiteStorage(DATABASE_FILE)
+
+    return _storage
+
 
 ##############################################################################
 # SUPPORT FOR STORING USER'S SYNCED ANSWERS
 ##############################################################################
 
 
+def _sanitise_answer_names(tutorial_package_name, problem_set_name,
+        tutorial_name):
+    """
+    Sanitise the names which identify an answer.
+
+    The same sanitised names are used as keys by every storage backend, so
+    that answers migrated from the filesystem can be found again.
+
+    Returns:
+      A tuple of the sanitised package, problem set and tutorial names.
+
+    """
+    return (
+        secure_filename(tutorial_package_name),
+        secure_filename(problem_set_name),
+        secure_filename(tutorial_name),
+    )
+
+
 def _get_answer_path(user, tutorial_package_name, problem_set_name,
         tutorial_name, create_dir=False):
     """
@@ -112,9 +186,10 @@ def _get_answer_path(user, tutorial_package_name, problem_set_name,
     """
     # sanitise the path components
     # this is essential to avoid, eg, tutorial_name='hi/../../passwords.uhoh'
-    tutorial_package_name = secure_filename(tutorial_package_name)
-    problem_set_name = secure_filename(problem_set_name)
-    tutorial_name = secure_filename(tutorial_name)
+    tutorial_package_name, problem_set_name, tutorial_name \
+        = _sanitise_answer_names(
+            tutorial_package_name, problem_set_name, tutorial_name
+        )
 
     # create/get our directory structure
     problem_set_dir = os.path.join(
@@ -149,6 +224,13 @@ def read_answer(user, tutorial_package_name, problem_set_name, tutorial_name):
       The text contents of the answer file otherwise.
 
     """
+    storage = get_storage()
+    if storage is not None:
+        names = _sanitise_answer_names(
+            tutorial_package_name, problem_set_name, tutorial_name
+        )
+        return storage.read_answer(user, *names)
+
     path = _get_answer_path(
         user, tutorial_package_name, problem_set_name, tutorial_name,
         create_dir=True,
@@ -175,6 +257,14 @@ def write_answer(user, tutorial_package_name, problem_set_name, tutorial_name,
       code (str): The code to write to the answer file.
 
     """
+    storage = get_storage()
+    if storage is not None:
+        package, problem_set, tutorial = _sanitise_answer_names(
+            tutorial_package_name, problem_set_name, tutorial_name
+        )
+        storage.write_answer(user, package, problem_set, tutorial, code)
+        return
+
     path = _get_answer_path(
         user, tutorial_package_name, problem_set_name, tutorial_name,
         create_dir=True,
@@ -203,6 +293,14 @@ def get_answer_hash(user, tutorial_package_name, problem_set_name,
       answer to the relevant question, otherwise.
 
     """
+    storage = get_storage()
+    if storage is not None:
+        names = _sanitise_answer_names(
+            tutorial_package_name, problem_set_name, tutorial_name
+        )
+        answer_hash, _ = storage.get_answer_info(user, *names)
+        return answer_hash
+
     code = read_answer(
         user, tutorial_package_name, problem_set_name, tutorial_name
     )
@@ -237,6 +335,14 @@ def get_answer_modification_time(user, tutorial_package_name, problem_set_name,
       The last-modified time of the answer, as a unix timestamp, otherwise.
 
     """
+    storage = get_storage()
+    if storage is not None:
+        names = _sanitise_answer_names(
+            tutorial_package_name, problem_set_name, tutorial_name
+        )
+        _, mtime = storage.get_answer_info(user, *names)
+        return mtime
+
     path = _get_answer_path(
         user, tutorial_package_name, problem_set_name, tutorial_name,
         create_dir=True,
@@ -258,6 +364,163 @@ TutorialInfo = namedtuple(
 )
 
 
+class TutorialCatalogue(object):
+    """
+    The current tutorial set, along with all known tutorial hash mappings.
+
+    Parsing the tutorial hashes and resolving the mappings is comparatively
+    expensive, so a catalogue is built once and then reused for as long as
+    neither of the underlying files changes (see get_tutorial_catalogue).
+
+    Attributes:
+      tutorials ([TutorialInfo]): The current tutorials, in the order of the
+          tutorial hashes file.
+      hashes ({str: TutorialInfo}): A mapping from every valid hash (current
+          or old) to the current TutorialInfo object for that tutorial.
+      version (str): An identifier which changes whenever the contents of the
+          catalogue do (used to invalidate progress summaries).
+
+    """
+    def __init__(self, tutorials, hash_mappings, version=''):
+        """
+        Initialise a new TutorialCatalogue object.
+
+        Args:
+          tutorials ([TutorialInfo]): The current tutorials.
+          hash_mappings ({str: str}): A mapping from old tutorial hashes to the
+              hash which replaced them (which may itself be an old hash).
+          version (str, optional): The version of the catalogue.
+
+        """
+        self.tutorials = tutorials
+        self.version = version
+        self.hashes = {ti.hash: ti for ti in tutorials}
+
+        # resolve all mappings to the current TutorialInfo object (but only if
+        # that is possible -- ignore removed tutorials)
+        # don't check for hash collisions - that would be a server error
+        # checking for collisions is the responsibility of the hash file
+        # generation scripts
+        for old_hash in hash_mappings:
+            tutorial_info = self._resolve_hash(old_hash, hash_mappings)
+            if tutorial_info is not None:
+                self.hashes.setdefault(old_hash, tutorial_info)
+
+        self._all_hashes = {}
+        for tutorial_hash, tutorial_info in self.hashes.items():
+            self._all_hashes.setdefault(tutorial_info.hash, set()) \
+                .add(tutorial_hash)
+
+    def _resolve_hash(self, tutorial_hash, hash_mappings):
+        """
+        Follow the chain of mappings from the given hash to a current hash.
+
+        Returns:
+          The current TutorialInfo object, or None if the chain ends in a
+          tutorial which has been removed (or if the chain is cyclic).
+
+        """
+        seen = set()
+        while tutorial_hash not in self.hashes:
+            if tutorial_hash in seen or tutorial_hash not in hash_mappings:
+                return None
+            seen.add(tutorial_hash)
+            tutorial_hash = hash_mappings[tutorial_hash]
+        return self.hashes[tutorial_hash]
+
+    def get_all_hashes(self, tutorial_hash):
+        """
+        Return every hash (current or old) for the tutorial with the given
+        hash.
+
+        Args:
+          tutorial_hash (str): Any valid hash for the tutorial.
+
+        Returns:
+          A set of hashes, or an empty set if the hash is not valid.
+
+        """
+        tutorial_info = self.hashes.get(tutorial_hash)
+        if tutorial_info is None:
+            return set()
+        return self._all_hashes[tutorial_info.hash]
+
+
+def _get_file_signature(path):
+    """
+    Return a value which changes whenever the file at the given path does.
+
+    """
+    st = os.stat(path)
+    return st.st_ino, st.st_mtime, st.st_size
+
+
+def _read_tutorial_catalogue():
+    """
+    Build a new TutorialCatalogue from the tutorial hashes files.
+
+    Format of tutorial_hashes file:
+      hash due_hh_dd_mm_yy package_name problem_set_name tutorial_name
+
+    Format of tutorial_hash_mappings file:
+      a json object mapping old hashes to new hashes
+
+    """
+    with open(TUTORIAL_HASHES_FILE) as f:
+        hashes_data = f.read()
+
+    with open(TUTORIAL_HASH_MAPPINGS_FILE) as f:
+        mappings_data = f.read()
+
+    tutorials = []
+    for line in filter(None, map(str.strip, hashes_data.splitlines())):
+        hash_str, due_date_str, pkg_name, pset_name, tut_name = line.split()
+
+        due_date = datetime.strptime(due_date_str, DUE_DATE_FORMAT)
+
+        tutorial_info = TutorialInfo(
+            hash_str, due_date, pkg_name, pset_name, tut_name
+        )
+        tutorials.append(tutorial_info)
+
+    hash_mappings = json.loads(mappings_data)
+
+    version = hashlib.sha1(hashes_data + '\0' + mappings_data).hexdigest()
+
+    return TutorialCatalogue(tutorials, hash_mappings, version=version[:16])
+
+
+_catalogue = None
+_catalogue_signature = None
+
+
+def get_tutorial_catalogue():
+    """
+    Return the TutorialCatalogue for the current tutorial hashes files.
+
+    The catalogue is cached for the life of the process, and is only rebuilt
+    if the tutorial hashes file or the hash mappings file changes on disk
+    (ie, if its inode, modification time or size changes).
+
+    The returned object is shared, and must not be modified by callers.
+
+    Returns:
+      A TutorialCatalogue object.
+
+    """
+    global _catalogue, _catalogue_signature
+
+    signature = (
+        _get_file_signature(TUTORIAL_HASHES_FILE),
+        _get_file_signature(TUTORIAL_HASH_MAPPINGS_FILE),
+    )
+    if _catalogue is None or signature != _catalogue_signature:
+        _catalogue = _read_tutorial_catalogue()
+        _catalogue_signature = signature
+
+    return _catalogue
+
+
 def get_tutorials():
     """
     Get a list of all tutorials, as TutorialInfo objects.
@@ -269,28 +532,13 @@ def get_tutorials():
       An ordered list of TutorialInfo objects.
 
     """
-    tutorials = []
-    with open(TUTORIAL_HASHES_FILE) as f:
-        for line in filter(None, map(str.strip, f)):
-            hash_str, due_date_str, pkg_name, pset_name, tut_name \
-                = line.split()
-
-            due_date = datetime.strptime(due_date_str, DUE_DATE_FORMAT)
-
-            tutorial_info = TutorialInfo(
-                hash_str, due_date, pkg_name, pset_name, tut_name
-            )
-            tutorials.append(tutorial_info)
-    return tutorials
+    return list(get_tutorial_catalogue().tutorials)
 
 
 def parse_tutorial_hashes():
     """
     Get all valid tutorial hashes, as TutorialInfo objects.
 
-    Format of tutorial_hashes file:
-      hash due_hh_dd_mm_yy package_name problem_set_name tutorial_name
-
     It is assumed that there will be no hash collisions.  If there are, this
     can be fixed by editing one of the package files ;)
 
@@ -309,46 +557,7 @@ def parse_tutorial_hashes():
       Multiple hashes may therefore map to the same TutorialInfo object.
 
     """
-    hashes = {}
-
-    # get the current tutorial set
-    with open(TUTORIAL_HASHES_FILE) as f:
-        for line in filter(None, map(str.strip, f)):
-            hash_str, due_date_str, pkg_name, pset_name, tut_name \
-                = line.split()
-
-            due_date = datetime.strptime(due_date_str, DUE_DATE_FORMAT)
-
-            tutorial_info = TutorialInfo(
-                hash_str, due_date, pkg_name, pset_name, tut_name
-            )
-            hashes[tutorial_info.hash] = tutorial_info
-
-    # get the changes
-    with open(TUTORIAL_HASH_MAPPINGS_FILE) as f:
-        hash_mappings = json.loads(f.read())
-
-    # resolve all mappings to the current TutorialInfo object (but only if
-    # that is possible -- ignore removed tutorials)
-    def resolve_hash(tutorial_hash):
-        if tutorial_hash in hashes:
-            return hashes[tutorial_hash]
-        if tutorial_hash in hash_mappings:
-            return resolve_hash(hash_mappings[tutorial_hash])
-        return None
-
-    resolved_hashes = {h: resolve_hash(h) for h in hash_mappings}
-    resolved_hashes = {
-        h: ti for h, ti in resolved_hashes.items() if ti is not None
-    }
-
-    # update our existing hashes
-    # don't check for hash collisions - that would be a server error
-    # checking for collisions is the responsibility of the hash file
-    # generation scripts
-    hashes.update(resolved_hashes)
-
-    return hashes
+    return dict(get_tutorial_catalogue().hashes)
 
 
 ##############################################################################
@@ -425,6 +634,64 @@ TutorialSubmission = namedtuple('TutorialSubmission',
                                 ['hash', 'date', 'allow_late'])
 
 
+def _parse_admin_log(user):
+    """
+    Return the set of tutorial hashes the user is allowed to submit late,
+    according to their admin_log file.
+
+    """
+    admin_log_path = _get_or_create_admin_log_file(user)
+
+    allow_lates = set()
+    with open(admin_log_path) as f:
+        for line in map(str.split, f):
+            if line[0] == 'allow_late':
+                allow_lates.add(line[1])
+            elif line[0] == 'disallow_late':
+                allow_lates.discard(line[1])
+
+    return allow_lates
+
+
+def _parse_submission_date(date_str):
+    """
+    Parse a submission date from a submission_log file.
+
+    Dates are written with datetime.isoformat, which can be parsed much more
+    quickly with strptime than with dateutil.  Anything else (eg, dates
+    edited by hand) falls back to dateutil.
+
+    """
+    for date_format in ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S'):
+        try:
+            return datetime.strptime(date_str, date_format)
+        except ValueError:
+            pass
+
+    return dateutil.parser.parse(date_str)
+
+
+def _parse_submission_log_file(user):
+    """
+    Return the user's submissions, according to their submission_log file.
+
+    Returns:
+      A list of (hash, date) tuples, in the order the submissions were made.
+
+    """
+    submission_log_path = _get_or_create_user_submissions_file(user)
+
+    submissions = []
+    with open(submission_log_path) as f:
+        for line in filter(None, map(str.strip, f)):
+            hash_str, submitted_date_str = line.split()
+
+            submitted_date = _parse_submission_date(submitted_date_str)
+            submissions.append((hash_str, submitted_date))
+
+    return submissions
+
+
 def parse_submission_log(user):
     """Get the submission log for the given user.
 
@@ -455,30 +722,22 @@ def parse_submission_log(user):
     """
     data = []
 
-    submission_log_path = _get_or_create_user_submissions_file(user)
-    admin_log_path = _get_or_create_admin_log_file(user)
-
-    allow_lates = set()
-    with open(admin_log_path) as f:
-        for line in map(str.split, f):
-            if line[0] == 'allow_late':
-                allow_lates.add(line[1])
-            elif line[0] == 'disallow_late':
-                allow_lates.discard(line[1])
-
-    # parse the submission log file
-    with open(submission_log_path) as f:
-        for line in filter(None, map(str.strip, f)):
-            hash_str, submitted_date_str = line.split()
+    storage = get_storage()
+    if storage is not None:
+        allow_lates = storage.get_allow_lates(user)
+        submissions = storage.get_submissions(user)
+    else:
+        allow_lates = _parse_admin_log(user)
+        submissions = _parse_submission_log_file(user)
 
-            submitted_date = dateutil.parser.parse(submitted_date_str)
-            allow_late = hash_str in allow_lates
-            allow_lates.discard(hash_str)
+    for hash_str, submitted_date in submissions:
+        allow_late = hash_str in allow_lates
+        allow_lates.discard(hash_str)
 
-            submission_info = TutorialSubmission(hash_str,
-                                                 submitted_date,
-                                                 allow_late)
-            data.append(submission_info)
+        submission_info = TutorialSubmission(hash_str,
+                                             submitted_date,
+                                             allow_late)
+        data.append(submission_info)
 
     # get data for problems which aren't submitted but have allow_late set
     for hash_str in allow_lates:
@@ -512,10 +771,14 @@ def add_submission(user, tutorial_hash, code):
     submission = TutorialSubmission(tutorial_hash, submitted_date, False)
 
     # write to the log
-    submission_log_path = _get_or_create_user_submissions_file(user)
+    storage = get_storage()
+    if storage is not None:
+        storage.add_submission(user, tutorial_hash, submitted_date)
+    else:
+        submission_log_path = _get_or_create_user_submissions_file(user)
 
-    with open(submission_log_path, 'a') as f:
-        f.write(' '.join([tutorial_hash, submitted_date_str]) + '\n')
+        with open(submission_log_path, 'a') as f:
+            f.write(' '.join([tutorial_hash, submitted_date_str]) + '\n')
 
     # a base32 hash should NEVER need to be sanitised, with the exception of
     # removing the padding characters
@@ -526,12 +789,17 @@ def add_submission(user, tutorial_hash, code):
 
     # write the student's code to file
     # this file should not exist, but if it does, overwrite it
+    # submitted code is always archived on the filesystem, regardless of the
+    # storage backend, as it is written once and never read by the cgi code
     user_submissions_dir = _get_or_create_user_submissions_dir(user)
     answer_path = os.path.join(user_submissions_dir, stripped_b32_hash)
 
     with open(answer_path, 'w') as f:
         f.write(code)
 
+    # only once the code is safely archived
+    update_progress_summary(user)
+
     # return the TutorialSubmission object
     return submission
 
@@ -543,6 +811,11 @@ def reset_submissions_for_user(user, tutorial_hashes):
     :param tutorial_hash: The tutorial_hash corresponding to the tutorial for which the submission should be reset.
     :return:
     """
+    storage = get_storage()
+    if storage is not None:
+        res = storage.remove_submissions(user, tutorial_hashes)
+        update_progress_summary(user)
+        return res
 
     submission_log_path = _get_or_create_user_submissions_file(user)
 
@@ -576,20 +849,25 @@ def reset_submissions_for_user(user, tutorial_hashes):
     with open(submission_log_path, 'w') as fd:
         fd.writelines(new_lines)
 
-
+    update_progress_summary(user)
 
     return res
 
 
-def get_submissions_for_user(user):
+def get_submissions_for_user(user, catalogue=None):
     """
     Return the submissions for the given user.
 
     No attempt is made to check that the logged in user has permission to view
     these submissions.  That is the responsibility of the caller.
 
+    This reads the user's progress summary (see get_progress_summaries).
+
     Args:
       user (str): The user to return the submissions for.
+      catalogue (TutorialCatalogue, optional): The catalogue to use.  Callers
+          which get the submissions of many users should use
+          get_progress_summaries instead.  Defaults to the current catalogue.
 
     Returns:
       A dictionary mapping tutorial hashes to the submission status of that
@@ -599,10 +877,20 @@ def get_submissions_for_user(user):
       {'MISSING', 'OK', 'LATE', 'LATE_OK'}
 
     """
-    # get our data
-    hashes = parse_tutorial_hashes()
+    return get_progress_summaries([user], catalogue=catalogue)[user]
+
+
+def _compute_submissions_for_user(user, catalogue):
+    """
+    Compute the submissions for the given user from their submission and
+    admin logs (ie, without using their progress summary).
+
+    Arguments and return value as for get_submissions_for_user.
+
+    """
+    hashes = catalogue.hashes
     submissions = parse_submission_log(user)
-    tutorials = set(hashes.values())
+    tutorials = catalogue.tutorials
 
     # check if our submissions are late or not
     results = {ti.hash: 'MISSING' for ti in tutorials}
@@ -628,6 +916,222 @@ def get_submissions_for_user(user):
     return results
 
 
+##############################################################################
+# SUPPORT FOR PROGRESS SUMMARIES
+##############################################################################
+
+# Computing a user's submission statuses means reading (and parsing) their
+# submission and admin logs, which is far too slow to do for every user each
+# time the admin page is loaded.  Instead, the statuses are stored in a
+# progress summary for each user, which is updated whenever the user's
+# submissions or allow_late flags change.
+#
+# A summary is a string of one status code per tutorial, in catalogue order,
+# along with the version of the catalogue it was computed against.  If the
+# catalogue changes (eg, a new tutorial is added), summaries for the old
+# version are recomputed the next time they are read.
+#
+# Each user's summary is stored (and locked) separately, so updating it costs
+# the same however many users there are, and never holds up other users.
+# A user's summary is only ever written while holding that user's lock.  A
+# summary computed under the lock is always current; a summary computed
+# without it (see get_progress_summaries) is only stored if no other process
+# has stored one in the meantime, as it may otherwise be out of date.
+
+_STATUS_CODES = {'MISSING': 'M', 'OK': 'O', 'LATE': 'L', 'LATE_OK': 'K'}
+_STATUS_NAMES = {code: name for name, code in _STATUS_CODES.items()}
+
+
+def _encode_progress_summary(catalogue, statuses):
+    return ''.join(
+        _STATUS_CODES[statuses[ti.hash]] for ti in catalogue.tutorials
+    )
+
+
+def _decode_progress_summary(catalogue, summary):
+    return {
+        ti.hash: _STATUS_NAMES[code]
+        for ti, code in zip(catalogue.tutorials, summary)
+    }
+
+
+def _lock_progress_summary(user):
+    """
+    Take an exclusive lock on the progress summary of the given user.
+
+    Returns:
+      The lock file, which must be closed to release the lock.
+
+    """
+    user_submissions_dir = _get_or_create_user_submissions_dir(user)
+    lock_path = os.path.join(
+        user_submissions_dir, PROGRESS_SUMMARY_NAME + '.lock'
+    )
+
+    lock_file = open(lock_path, 'a')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+
+def _read_progress_summary_file(user):
+    """
+    Return the stored (version, summary) pair of the given user, or None if
+    they have no stored summary.
+
+    """
+    summary_path = os.path.join(SUBMISSIONS_DIR, user, PROGRESS_SUMMARY_NAME)
+
+    try:
+        with open(summary_path) as f:
+            return tuple(json.load(f))
+    except (IOError, ValueError):
+        return None
+
+
+def _load_progress_summaries(users):
+    """
+    Return the stored summaries of the given users, as a dictionary mapping
+    users to a (version, summary) pair.  Users without a stored summary are
+    omitted.
+
+    """
+    storage = get_storage()
+    if storage is not None:
+        return storage.get_progress_summaries(users)
+
+    stored = {}
+    for user in users:
+        summary = _read_progress_summary_file(user)
+        if summary is not None:
+            stored[user] = summary
+
+    return stored
+
+
+def _store_progress_summary(user, version, summary):
+    """
+    Store the given summary for the given user.
+
+    The caller must hold the user's progress summary lock.
+
+    """
+    storage = get_storage()
+    if storage is not None:
+        storage.put_progress_summary(user, version, summary)
+        return
+
+    # the file is replaced atomically, so readers never need the lock
+    user_submissions_dir = _get_or_create_user_submissions_dir(user)
+    summary_path = os.path.join(user_submissions_dir, PROGRESS_SUMMARY_NAME)
+
+    tmp_path = '{}.{}.tmp'.format(summary_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump([version, summary], f)
+    os.rename(tmp_path, summary_path)
+
+
+def get_progress_summaries(users, catalogue=None):
+    """
+    Return the submission statuses of each of the given users.
+
+    Stored summaries are used where they are up to date; any others are
+    computed from the users' logs, and stored for next time (unless another
+    process has stored a summary for the user in the meantime).
+
+    Args:
+      users ([str]): The users to return the statuses of.
+      catalogue (TutorialCatalogue, optional): The catalogue to use.  Defaults
+          to the current catalogue.
+
+    Returns:
+      A dictionary mapping each user to a dictionary of their submission
+      statuses, as returned by get_submissions_for_user.
+
+    """
+    if catalogue is None:
+        catalogue = get_tutorial_catalogue()
+
+    stored = _load_progress_summaries(users)
+
+    results = {}
+    for user in users:
+        version, summary = stored.get(user, (None, None))
+        if version == catalogue.version:
+            results[user] = _decode_progress_summary(catalogue, summary)
+            continue
+
+        # the summary is computed without the lock (so as not to hold up the
+        # user's submissions while computing it), so if a summary has been
+        # stored since we read the old one, ours may be out of date
+        results[user] = _compute_submissions_for_user(user, catalogue)
+        summary = _encode_progress_summary(catalogue, results[user])
+
+        lock_file = _lock_progress_summary(user)
+        try:
+            current = _load_progress_summaries([user])
+            if current.get(user) == stored.get(user):
+                _store_progress_summary(user, catalogue.version, summary)
+        finally:
+            lock_file.close()
+
+    return results
+
+
+def update_progress_summary(user):
+    """
+    Recompute and store the progress summary of the given user.
+
+    This must be called whenever the user's submissions or allow_late flags
+    change.
+
+    """
+    catalogue = get_tutorial_catalogue()
+
+    # read the logs under the lock, so that a summary computed from older
+    # logs can never be stored over this one
+    lock_file = _lock_progress_summary(user)
+    try:
+        statuses = _compute_submissions_for_user(user, catalogue)
+        summary = _encode_progress_summary(catalogue, statuses)
+
+        _store_progress_summary(user, catalogue.version, summary)
+    finally:
+        lock_file.close()
+
+
+def rebuild_progress_summaries(users):
+    """
+    Recompute the progress summaries of the given users from their logs,
+    replacing their stored summaries.
+
+    Args:
+      users ([str]): The users to compute summaries for.
+
+    Returns:
+      A list of the users whose stored summary was missing, out of date, or
+      inconsistent with their logs.
+
+    """
+    catalogue = get_tutorial_catalogue()
+
+    changed = []
+    for user in users:
+        lock_file = _lock_progress_summary(user)
+        try:
+            stored = _load_progress_summaries([user]).get(user)
+
+            statuses = _compute_submissions_for_user(user, catalogue)
+            summary = _encode_progress_summary(catalogue, statuses)
+            _store_progress_summary(user, catalogue.version, summary)
+        finally:
+            lock_file.close()
+
+        if stored != (catalogue.version, summary):
+            changed.append(user)
+
+    return changed
+
+
 def set_allow_late(user, tutorial_hash, authorised_by, on):
     """
     Allow a user to submit a tutorial late without incurring a mark penalty.
@@ -648,13 +1152,21 @@ def set_allow_late(user, tutorial_hash, authorised_by, on):
     if on == has_allow_late(user, tutorial_hash):
         return False
 
-    msg = ('disallow_late', 'allow_late')[on]
-    admin_log_path = _get_or_create_admin_log_file(user)
-    time = datetime.now().isoformat()
+    now = datetime.now()
 
-    with open(admin_log_path, 'a') as f:
-        f.write('{} {} {} {}\n'
-                .format(msg, tutorial_hash, authorised_by, time))
+    storage = get_storage()
+    if storage is not None:
+        storage.set_allow_late(user, tutorial_hash, authorised_by, on, now)
+    else:
+        msg = ('disallow_late', 'allow_late')[on]
+        admin_log_path = _get_or_create_admin_log_file(user)
+        time = now.isoformat()
+
+        with open(admin_log_path, 'a') as f:
+            f.write('{} {} {} {}\n'
+                    .format(msg, tutorial_hash, authorised_by, time))
+
+    update_progress_summary(user)
     return True
 
 
@@ -663,6 +1175,10 @@ def has_allow_late(user, tutorial_hash):
     Return True if the user has the 'allow_late' flag set on the given
     tutorial.
     """
+    storage = get_storage()
+    if storage is not None:
+        return storage.has_allow_late(user, tutorial_hash)
+
     admin_log_path = _get_or_create_admin_log_file(user)
     allowed = False
     with open(admin_log_path, 'rU') as f:
@@ -721,7 +1237,13 @@ def get_users(query='', enrol_filter=ALL, sort_key=None, reverse=False):
                 users[id] = User(id, name, email, enrolled)
 
     # now, read off all of the users who have logged in
-    for user in os.listdir(ANSWERS_DIR):
+    logged_in_users = set(os.listdir(ANSWERS_DIR))
+
+    storage = get_storage()
+    if storage is not None:
+        logged_in_users.update(storage.get_users())
+
+    for user in logged_in_users:
         if user not in users:
             users[user] = User(user, '', '', NOT_ENROLLED)
 
@@ -846,6 +1368,24 @@ def get_tutorials_timestamp():
             return f.readline().strip()  # we just need the first line
 
 
+def get_tutorials_manifest():
+    """
+    Return the manifest of the per-tutorial update archives for CSSE1001.
+
+    The manifest is written by create_tutorial.py, alongside the archives.
+
+    Returns:
+      The manifest, as a dictionary, or None if no manifest has been
+      published.
+
+    """
+    try:
+        with open(TUTORIALS_MANIFEST_PATH) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
 ##############################################################################
 # SUPPORT FOR STORING FEEDBACK
 ##############################################################################
@@ -1017,6 +1557,11 @@ def record_attempts(user, tutorial_hash, num_attempts):
         tutorial before submission.
 
     """
+    storage = get_storage()
+    if storage is not None:
+        storage.record_attempts(user, tutorial_hash, num_attempts)
+        return
+
     # get the path to the file
     attempts_path = _get_or_create_user_attempts_file(user)
 
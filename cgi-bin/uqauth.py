@@ -12,6 +12,10 @@ else:
 Run the get_user_info() method *before* printing anything out, in case the user
 needs to be redirected.
 
+Under WSGI (see mpt_wsgi.py), call set_environ() with the request environ
+before handling each request.  Redirects are then not printed; instead, the
+login URL is available as the `location` attribute of the Redirected exception.
+
 """
 
 import os
@@ -21,6 +25,7 @@ import socket
 import random
 import struct
 import select
+import threading
 
 KV_OP_CREATE = 0
 KV_OP_CREATED = 1
@@ -129,24 +134,45 @@ class KV(object):
 
 
 class Redirected(BaseException):
-    pass
+    def __init__(self, location=None):
+        super(Redirected, self).__init__(location)
+        self.location = location
+
+
+# the environ of the WSGI request being handled by each thread, if any
+_local = threading.local()
+
+
+def set_environ(environ):
+    """Use the given WSGI environ for requests handled by this thread.
+    Pass None to go back to using os.environ (ie, running as a cgi script)."""
+    _local.environ = environ
+
+
+def get_environ():
+    """Return the environ of the current request."""
+    environ = getattr(_local, 'environ', None)
+    return os.environ if environ is None else environ
 
 
 def redirect():
-    domain = os.environ['HTTP_HOST']
-    url = os.environ['REQUEST_URI']
-    out = "Location: https://api.uqcloud.net/login/http://{0}\n\n"
-    print out.format(domain+url)
-    raise Redirected()
+    environ = get_environ()
+    domain = environ['HTTP_HOST']
+    url = environ['REQUEST_URI']
+    location = "https://api.uqcloud.net/login/http://{0}".format(domain+url)
+    if environ is os.environ:
+        print "Location: {0}\n\n".format(location)
+    raise Redirected(location)
 
 
 def get_user_info():
     """Get a JSON object with all the information about a logged in user."""
+    environ = get_environ()
     cookie = Cookie.SimpleCookie()
-    if 'HTTP_COOKIE' not in os.environ:
+    if 'HTTP_COOKIE' not in environ:
         redirect()
 
-    cookie.load(os.environ['HTTP_COOKIE'])
+    cookie.load(environ['HTTP_COOKIE'])
     if 'EAIT_WEB' not in cookie:
         redirect()
     eait_web = cookie['EAIT_WEB'].value
@@ -1,7 +1,14 @@
 #!/usr/bin/env python3
 from __future__ import print_function
+import time
+_clock = getattr(time, 'perf_counter', time.time)
+STARTUP_TIME = _clock()  # as early as possible, for --profile-startup
+
 import sys
 from argparse import ArgumentParser
+from contextlib import contextmanager
+import json
+import threading
 
 ALLOWED_VERSIONS = [(3, 6)]  # [(3, 5), (3, 4)]
 
@@ -34,6 +41,146 @@ MPT_FILENAME = 'MyPyTutor.py'  # usually __file__, but need to support renaming
 GLOBAL_TIMEOUT = 10.  # seconds
 
 
+class StartupProfiler():
+    """
+    Records the wall time taken by each phase of startup, and by each module
+    imported along the way (for --profile-startup).
+
+    Times are measured from STARTUP_TIME, which is as close to the start of
+    the process as we can get.  The trace is written in the Chrome trace event
+    format (which can be viewed in chrome://tracing, or in Perfetto), with
+    summaries of the phases and imports added for convenience.
+
+    Attributes:
+      enabled (bool): Whether anything is being recorded.
+
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+
+        self._phases = []  # (name, start, end)
+        self._imports = []  # (module, start, end, self time)
+        self._import_stack = []  # [start, time in child imports]
+        self._original_import = None
+
+    def install_import_hook(self):
+        """
+        Start recording the time taken by each module imported by the main
+        thread.
+
+        Only the first import of each module is recorded (subsequent imports
+        are just lookups in sys.modules).
+
+        """
+        if not self.enabled or self._original_import is not None:
+            return
+
+        import builtins
+        self._original_import = original_import = builtins.__import__
+        main_thread = threading.current_thread()
+
+        def timed_import(name, globals=None, locals=None, fromlist=(),
+                level=0):
+            if level or name in sys.modules \
+                    or threading.current_thread() is not main_thread:
+                return original_import(name, globals, locals, fromlist, level)
+
+            self._import_stack.append([_clock(), 0.])
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                start, child_time = self._import_stack.pop()
+                end = _clock()
+
+                self._imports.append(
+                    (name, start, end, end - start - child_time)
+                )
+                if self._import_stack:
+                    self._import_stack[-1][1] += end - start
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_hook(self):
+        """
+        Stop recording imports.
+
+        """
+        if self._original_import is not None:
+            import builtins
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Record the time taken by the body of the with statement as the given
+        startup phase.
+
+        """
+        start = _clock()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def record(self, name, start=STARTUP_TIME):
+        """
+        Record a phase which started at the given time and ends now.
+
+        Args:
+          name (str): The name of the phase.
+          start (float, optional): The start time of the phase, as returned by
+              _clock.  Defaults to STARTUP_TIME.
+
+        """
+        if self.enabled:
+            self._phases.append((name, start, _clock()))
+
+    def write(self, path):
+        """
+        Write the trace recorded so far to the given path, as JSON.
+
+        """
+        if not self.enabled or not self._phases:
+            return
+
+        to_us = lambda t: int((t - STARTUP_TIME)*1e6)
+        to_s = lambda t: round(t - STARTUP_TIME, 6)
+
+        events = [
+            {
+                'name': name, 'cat': 'phase', 'ph': 'X', 'pid': 0, 'tid': 0,
+                'ts': to_us(start), 'dur': int((end - start)*1e6),
+            }
+            for name, start, end in self._phases
+        ]
+        events.extend(
+            {
+                'name': module, 'cat': 'import', 'ph': 'X', 'pid': 0, 'tid': 1,
+                'ts': to_us(start), 'dur': int((end - start)*1e6),
+            }
+            for module, start, end, _ in self._imports
+        )
+
+        trace = {
+            'traceEvents': events,
+            'total': to_s(max(end for _, _, end in self._phases)),
+            'phases': [
+                {'name': name, 'start': to_s(start), 'duration': end - start}
+                for name, start, end in self._phases
+            ],
+            'imports': [
+                {'module': module, 'duration': end - start, 'self': self_time}
+                for module, start, end, self_time in sorted(
+                    self._imports, key=lambda i: i[3], reverse=True
+                )
+            ],
+        }
+
+        with open(path, 'w') as f:
+            json.dump(trace, f, indent=2)
+
+
 def execl(cmd, *args):
     """
     Execute the given command with the given arguments.
@@ -217,16 +364,18 @@ def bootstrap_install(use_gui):
         execl(sys.executable, sys.executable, *argv)
 
 
-def update_mpt(force_update=False):
+def update_mpt(force_update=False, restart=True):
     """
     Update MyPyTutor if necessary.
 
-    If an update is available, this function will not return, but will instead
-    re-exec the current script.
+    If an update is available and restart is True, this function will not
+    return, but will instead re-exec the current script.
 
     Args:
       force_update (bool, optional): If True, update regardless of whether a
         newer version of MyPyTutor is available on the server.
+      restart (bool, optional): If True, re-exec the current script once the
+        update has been installed.  Defaults to True.
 
     """
     # if we've made it to here, we assume that we are running in the MyPyTutor
@@ -262,6 +411,9 @@ def update_mpt(force_update=False):
 
             print('done')
 
+            if not restart:
+                return
+
             # re-exec with the new version
             # remove update arg, or we get an infinite loop
             argv = sys.argv
@@ -276,6 +428,29 @@ def update_mpt(force_update=False):
         print('failed')
 
 
+def mpt_update_available():
+    """
+    Return whether a newer version of MyPyTutor is available on the server.
+
+    Unlike update_mpt, this does not install the update.  If the server cannot
+    be contacted, assume that there is no update.
+
+    Returns:
+      Whether an update is available.
+
+    """
+    from tutorlib.gui.app.app import VERSION
+    from tutorlib.interface.web_api import WebAPI, WebAPIError
+
+    try:
+        version = WebAPI().get_version()
+    except WebAPIError:
+        return False
+
+    create_tuple = lambda v: tuple(map(int, v.split('.')))
+    return create_tuple(version) > create_tuple(VERSION)
+
+
 def create_config_if_needed():
     """
     If no configuration file exists, create the default configuration file.
@@ -357,10 +532,45 @@ def bootstrap_tutorials():
             os.mkdir(options.ans_dir)
 
         save_config(cfg)
+        prewarm_tutorial_hashes()
 
         print('done')
 
 
+def prewarm_tutorial_hashes():
+    """
+    Add the hash of every tutorial in the default tutorial package to the
+    tutorial hash cache.
+
+    This should be done whenever the package is installed or updated, so that
+    MyPyTutor itself does not need to read every tutorial file the first time
+    it needs the hashes (eg, to show the student's submissions).
+
+    """
+    from tutorlib.config.configuration import load_config
+    from tutorlib.config.shared import TUTORIAL_HASH_CACHE_FILE
+    from tutorlib.interface.problems \
+            import TutorialPackage, TutorialPackageError
+    from tutorlib.interface.tutorial import Tutorial
+
+    Tutorial.HASH_CACHE_FILE = TUTORIAL_HASH_CACHE_FILE
+
+    cfg = load_config()
+    package_name = cfg.tutorials.default
+    package_options = getattr(cfg, package_name)
+
+    try:
+        tutorial_package = TutorialPackage(package_name, package_options)
+    except TutorialPackageError:
+        return
+
+    # write the cache once at the end, rather than after every tutorial
+    with Tutorial.batch_hashes():
+        for problem_set in tutorial_package.problem_sets:
+            for tutorial in problem_set:
+                tutorial.hash  # computes and caches the hash, if necessary
+
+
 def update_default_tutorial_package(force_update=False):
     """
     Update the default tutorial package if necessary.
@@ -369,6 +579,9 @@ def update_default_tutorial_package(force_update=False):
       force_update (bool, optional): If True, update regardless of whether a
         newer version of the tutorial package is available on the server.
 
+    Returns:
+      Whether the tutorial package was updated.
+
     """
     from tutorlib.config.configuration import load_config
     from tutorlib.gui.app.support \
@@ -376,6 +589,8 @@ def update_default_tutorial_package(force_update=False):
     from tutorlib.interface.problems \
             import TutorialPackage, TutorialPackageError
     from tutorlib.interface.web_api import WebAPI, WebAPIError
+    from tutorlib.online.updates \
+            import PackageUpdateError, update_tutorial_package
 
     print('Checking for tutorial package updates...', end='', flush=True)
 
@@ -385,11 +600,14 @@ def update_default_tutorial_package(force_update=False):
     package_options = getattr(cfg, package_name)
 
     # try to open the tutorial package
+    # we only need the timestamp, so don't load the tutorials themselves
     try:
-        tutorial_package = TutorialPackage(package_name, package_options)
+        tutorial_package = TutorialPackage(
+            package_name, package_options, lazy=True
+        )
     except TutorialPackageError:
         print('failed')
-        return
+        return False
 
     # check if we need to do an update at all
     web_api = WebAPI()
@@ -398,7 +616,7 @@ def update_default_tutorial_package(force_update=False):
         timestamp = web_api.get_tutorials_timestamp()
     except WebAPIError:
         print('failed')
-        return
+        return False
 
     # we need to be comparing as ints
     create_tuple = lambda t: tuple(map(int, t.split('.')))
@@ -410,22 +628,34 @@ def update_default_tutorial_package(force_update=False):
     # we only want to update if the server's version is more recent
     # a more recent local version should only arise in development, anyway
     if server_timestamp <= local_timestamp and not force_update:
-        return
+        return False
 
     print('Updating tutorial package...', end='', flush=True)
 
+    # try to download only the tutorials which have changed
+    try:
+        update_tutorial_package(tutorial_package.options.tut_dir, web_api)
+    except (PackageUpdateError, WebAPIError, OSError):
+        pass  # fall back to downloading the whole package
+    else:
+        prewarm_tutorial_hashes()
+        print('done')
+        return True
+
     # grab the zipfile
     try:
         zip_path = web_api.get_tutorials_zipfile()
     except WebAPIError:
         print('failed')
-        return
+        return False
 
     # extract the zipfile into our empty tutorial directory
     remove_directory_contents(tutorial_package.options.tut_dir)
     safely_extract_zipfile(zip_path, tutorial_package.options.tut_dir)
+    prewarm_tutorial_hashes()
 
     print('done')
+    return True
 
 
 def install_keyring_module():
@@ -520,13 +750,48 @@ def try_get_credentials():
     return cfg.online.username, password
 
 
-def try_login(username, password):
+def get_stored_credentials():
+    """
+    Get the user's stored credentials, if any.
+
+    Unlike try_get_credentials, this never prompts the user, so it is safe to
+    call from a background thread.
+
+    Returns:
+      A tuple containing the user's username and password, or (None, None)
+      if no credentials are stored.
+
+    """
+    from tutorlib.config.configuration import load_config
+    cfg = load_config()
+
+    if not cfg.online.store_credentials or not cfg.online.username:
+        return None, None
+
+    try:
+        import keyring
+        password = keyring.get_password(MPT_SERVICE, cfg.online.username)
+    except Exception:  # not installed, or no usable keyring backend
+        return None, None
+
+    if password is None:
+        return None, None
+
+    return cfg.online.username, password
+
+
+def try_login(username, password, web_api=None):
     """
     Try to log in with the given username and password.
 
+    If the login fails, the stored credentials are cleared, so that the user
+    will be prompted for them next time.
+
     Args:
       username (str): The username to log in with.
       password (str): The password to use.
+      web_api (WebAPI, optional): The WebAPI instance to log in.  Defaults to
+          None, in which case a new instance is created.
 
     Returns:
       If successful, the logged-in WebAPI instance.
@@ -534,7 +799,8 @@ def try_login(username, password):
 
     """
     from tutorlib.interface.web_api import WebAPI, WebAPIError
-    web_api = WebAPI()
+    if web_api is None:
+        web_api = WebAPI()
 
     print('Attempting to login as {}...'.format(username), end='', flush=True)
 
@@ -567,6 +833,29 @@ def try_login(username, password):
     return web_api if success else None
 
 
+def login_with_stored_credentials(web_api):
+    """
+    Log the given WebAPI instance in with the user's stored credentials, if
+    there are any.
+
+    This never prompts the user, so it is safe to call from a background
+    thread.  Stored credentials which fail to log in are cleared (see
+    try_login).
+
+    Args:
+      web_api (WebAPI): The WebAPI instance to log in.
+
+    Returns:
+      Whether the login succeeded.
+
+    """
+    username, password = get_stored_credentials()
+    if username is None:
+        return False
+
+    return try_login(username, password, web_api=web_api) is not None
+
+
 def synchronise_problems(web_api):
     """
     Synchronise problems for the default tutorial package.
@@ -612,7 +901,7 @@ def print_version():
     print(VERSION)
 
 
-def launch_mpt(web_api=None):
+def launch_mpt(web_api=None, on_ready=None, startup=None):
     """
     Launch MyPyTutor.
 
@@ -622,7 +911,12 @@ def launch_mpt(web_api=None):
     Args:
       web_api (WebAPI, optional): The WebAPI object, if any, to pass to the
         TutorialApp instance.  Defaults to None.  If provided, this must be
-        logged in.
+        logged in, or else be being logged in by the credentials startup phase.
+      on_ready ((tk.Tk) -> None, optional): A callback to call with the root
+        window once the main loop has started.  Defaults to None.
+      startup (StartupPipeline, optional): The startup phases which are still
+        running in the background, to pass to the TutorialApp instance.
+        Defaults to None.
 
     Returns:
       The TutorialApp instance which was used.
@@ -634,7 +928,9 @@ def launch_mpt(web_api=None):
     print('Running MyPyTutor...', end='', flush=True)
 
     root = tk.Tk()
-    app = TutorialApp(root, web_api=web_api)
+    app = TutorialApp(root, web_api=web_api, startup=startup)
+    if on_ready is not None:
+        root.after(0, on_ready, root)
     root.mainloop()
 
     print('done')
@@ -686,6 +982,26 @@ def parse_args():
         action='store_true',
         help='Update tutorials even if this would not normally be required',
     )
+    parser.add_argument(
+        '--prewarm-hash-cache',
+        action='store_true',
+        help='Cache the hashes of the installed tutorials, and then terminate',
+    )
+    parser.add_argument(
+        '--profile-startup',
+        type=str,
+        nargs='?',
+        const='mpt_startup_profile.json',
+        default=None,
+        metavar='PATH',
+        help='Write a JSON trace of the time taken by each startup phase and '
+             'each imported module, once MyPyTutor is ready',
+    )
+    parser.add_argument(
+        '--exit-after-startup',
+        action='store_true',
+        help='Terminate as soon as MyPyTutor is ready (for benchmarking)',
+    )
     parser.add_argument(
         '--no-gui',
         action='store_true',
@@ -709,41 +1025,85 @@ def main():
         print_version()
         return 0
 
+    if args.prewarm_hash_cache:
+        prewarm_tutorial_hashes()
+        return 0
+
+    profiler = StartupProfiler(enabled=args.profile_startup is not None)
+    profiler.record('interpreter and top-level imports')
+    profiler.install_import_hook()
+
     # exit if the user's system is not compatible with MyPyTutor
-    check_compatibility()
+    with profiler.phase('check_compatibility'):
+        check_compatibility()
 
     # set up module globals (eg, socket timeout)
-    setup_modules()
+    with profiler.phase('setup_modules'):
+        setup_modules()
+
+    # install MyPyTutor
+    with profiler.phase('bootstrap_install'):
+        bootstrap_install(use_gui=not args.no_gui)
+
+    # an explicitly requested update must happen before we start
+    if args.force_update_mpt:
+        with profiler.phase('update_mpt'):
+            update_mpt(force_update=True)
+
+    with profiler.phase('create_config_if_needed'):
+        create_config_if_needed()
+
+    # install the default tutorial package
+    with profiler.phase('bootstrap_tutorials'):
+        bootstrap_tutorials()
+
+    # everything else needs the network, but nothing else depends on it, so
+    # do it all in the background while the GUI starts up
+    # the app will wait for these to finish where it needs their results
+    from tutorlib.interface.startup import CREDENTIALS_PHASE, \
+            StartupPipeline, TUTORIALS_PHASE, VERSION_PHASE
+
+    startup = StartupPipeline()
+    startup.start(VERSION_PHASE, mpt_update_available)
+    startup.start(
+        TUTORIALS_PHASE, update_default_tutorial_package,
+        force_update=args.force_update_tutorials,
+    )
+    from tutorlib.interface.web_api import WebAPI
 
-    # install and update MyPyTutor
-    bootstrap_install(use_gui=not args.no_gui)
-    update_mpt(force_update=args.force_update_mpt)
+    # the app picks up this login once it has finished
+    web_api = WebAPI()
+    startup.start(CREDENTIALS_PHASE, login_with_stored_credentials, web_api)
 
-    create_config_if_needed()
+    # launch MyPyTutor itself
+    launch_start = _clock()
 
-    # install and update the default tutorial package
-    bootstrap_tutorials()
-    update_default_tutorial_package(force_update=args.force_update_tutorials)
+    def on_ready(root):
+        profiler.uninstall_import_hook()
+        profiler.record('launch_mpt', launch_start)
+        profiler.record('total')
 
-    # try to log the user in automatically
-    """
-    username, password = try_get_credentials()
-    if username is not None:
-        web_api = try_login(username, password)
-    else:
-        web_api = None
-    """
-    web_api = None
+        if args.profile_startup is not None:
+            profiler.write(args.profile_startup)
 
-    if web_api is not None:
-        synchronise_problems(web_api)
+        if args.exit_after_startup:
+            root.destroy()
 
-    # launch MyPyTutor itself
-    app = launch_mpt(web_api)
+    app = launch_mpt(web_api=web_api, on_ready=on_ready, startup=startup)
 
     # cleanup (syncrhonise, logout etc)
     shutdown(app)
 
+    # don't leave a tutorial package update half-finished
+    startup.shutdown()
+
+    # install any MyPyTutor update now that the app has closed
+    # if the student chose to restart, this will re-exec, and so will not return
+    if app.restart_to_update:
+        update_mpt(force_update=True)
+    elif startup.result(VERSION_PHASE):
+        update_mpt(force_update=True, restart=False)
+
     return 0
 
 
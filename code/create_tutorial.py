@@ -23,9 +23,12 @@
 ## individual problems.
 
 import argparse
+import base64
 from collections import OrderedDict, namedtuple
 import glob
+from hashlib import sha512
 from itertools import chain
+import json
 import os
 import shutil
 import sys
@@ -34,6 +37,18 @@ import zipfile
 
 from hashes import update_hashes
 from tutorlib.interface.tutorial import Tutorial
+from tutorlib.online.updates import get_directory_hash
+
+
+# the file (in the destination directory) in which to record what was built
+# this is only used for incremental builds, and is not included in the zip
+MANIFEST_FILE = '.manifest.json'
+
+# the directory (in the destination directory) containing the per-tutorial
+# update archives, and the manifest describing them, which are published for
+# delta updates (see tutorlib.online.updates)
+UPDATES_DIR = 'updates'
+UPDATES_MANIFEST_FILE = 'manifest.json'
 
 
 class TutorialCreationError(Exception):
@@ -45,7 +60,7 @@ class TutorialCreationError(Exception):
 
 
 def generate_tutorial_package(config_file, destination_dir, source_dir=None,
-        ignore_invalid_tutorials=False, verbose=False):
+        ignore_invalid_tutorials=False, verbose=False, incremental=False):
     """
     Generate a Tutorial set from the given configuration file.
 
@@ -61,6 +76,9 @@ def generate_tutorial_package(config_file, destination_dir, source_dir=None,
       ignore_invalid_tutorials (bool, optional): Whether to ignore invalid
           tutorials, and proceed anyway.  If True, exceptions encountered when
           creating tutorials will be suppressed. Defaults to False.
+      incremental (bool, optional): Whether to update an existing package in
+          the destination directory, rather than creating a new one.  See
+          create_tutorial_package.  Defaults to False.
 
     """
     if source_dir is None:
@@ -72,6 +90,7 @@ def generate_tutorial_package(config_file, destination_dir, source_dir=None,
     could_parse = create_tutorial_package(
         source_dir, destination_dir, url, problem_sets,
         ignore_invalid_tutorials=ignore_invalid_tutorials,
+        incremental=incremental,
     )
 
     # output our results
@@ -198,6 +217,41 @@ def write_package_config(f, url):
     f.write(url + '\n')
 
 
+def get_source_hash(tutorial, source_dir):
+    """
+    Return a hash of the source files of the given tutorial.
+
+    This covers the names and contents of every file which would be copied by
+    write_tutorial.  Missing files are not an error here (they will be caught
+    by write_tutorial).
+
+    Args:
+      tutorial (TutorialInfo): The tutorial to hash.
+      source_dir (str): The source dir of the problems database (in which the
+          tutorial's .tut directory may be found).
+
+    Returns:
+      The sha512 hash of the tutorial's source files, as a hex string.
+
+    """
+    src_dir = os.path.join(source_dir, tutorial.directory)
+    hash_obj = sha512()
+
+    for filename in chain(Tutorial.SUBMODULES, Tutorial.FILES, tutorial.files):
+        hash_obj.update(filename.encode('utf8') + b'\0')
+
+        try:
+            with open(os.path.join(src_dir, filename), 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+
+        # include the length, so that file boundaries are unambiguous
+        hash_obj.update(str(len(data)).encode('ascii') + b'\0' + data)
+
+    return hash_obj.hexdigest()
+
+
 def write_tutorial(tutorial, source_dir, destination_dir):
     """
     Write the given tutorial to the given directory.
@@ -256,39 +310,197 @@ def write_tutorial(tutorial, source_dir, destination_dir):
         shutil.copyfile(src_path, dest_path)
 
 
-def create_zipfile(path, name):
+def get_package_files(path, name):
+    """
+    Return the files in the tutorial package at the given path.
+
+    This excludes the package zip file itself, the update archives, and any
+    hidden files in the top-level directory (such as the manifest).
+
+    Args:
+      path (str): The path to the tutorial package.
+      name (str): The name of the package zip file (excluding the extension).
+
+    Returns:
+      A sorted list of the paths to each file, relative to the package path.
+
+    """
+    files = []
+
+    def add_path(rel_path):
+        full_path = os.path.join(path, rel_path)
+        if os.path.isdir(full_path):
+            for fn in os.listdir(full_path):
+                add_path(os.path.join(rel_path, fn))
+        else:
+            files.append(rel_path)
+
+    for fn in os.listdir(path):
+        if fn.startswith('.') or fn in ('{}.zip'.format(name), UPDATES_DIR):
+            continue
+        add_path(fn)
+
+    return sorted(files)
+
+
+def create_zipfile(path, name, changed=None):
     """
     Create a zip file from the contents of the given path.
 
+    If the zip file already exists, and the top-level files and directories
+    which have changed are given, then only those members are read from disk.
+    All other members are copied from the existing zip file as-is.
+
     Args:
       path (str): The path to zip.
       name (str): The name of the resulting zip file (excluding the extension).
+      changed ({str}, optional): The names of the top-level files and
+          directories which have changed since the zip file was last created.
+          Defaults to None, which indicates that everything should be zipped
+          from scratch.
 
     """
-    cwd = os.getcwd()
-    os.chdir(path)
+    zip_path = os.path.join(path, '{}.zip'.format(name))
+    # hidden, so that it's not included in itself
+    tmp_path = os.path.join(path, '.{}.zip.tmp'.format(name))
+
+    old_zfile = None
+    if changed is not None and os.path.exists(zip_path):
+        old_zfile = zipfile.ZipFile(zip_path)
 
-    all_files = glob.glob("*")
+    try:
+        with zipfile.ZipFile(tmp_path, 'w') as zfile:
+            for rel_path in get_package_files(path, name):
+                arcname = rel_path.replace(os.sep, '/')
+                top_level = arcname.split('/', 1)[0]
+
+                if old_zfile is not None and top_level not in changed:
+                    try:
+                        info = old_zfile.getinfo(arcname)
+                    except KeyError:
+                        pass  # new file (shouldn't happen); add it from disk
+                    else:
+                        zfile.writestr(info, old_zfile.read(info))
+                        continue
 
-    with zipfile.ZipFile('{}.zip'.format(name), 'w') as zfile:
-        def add_path(path):
-            if os.path.isdir(path):
-                for fn in os.listdir(path):
-                    add_path(os.path.join(path, fn))
-            else:
-                zfile.write(path)
+                zfile.write(os.path.join(path, rel_path), arcname)
+    finally:
+        if old_zfile is not None:
+            old_zfile.close()
 
-        for file in all_files:
-            add_path(file)
+    os.replace(tmp_path, zip_path)
 
-    os.chdir(cwd)
+
+def write_updates(path, entries, changed):
+    """
+    Write the per-tutorial update archives, and the manifest describing them.
+
+    Each tutorial directory is written to <directory>.zip in the updates
+    directory, with the same paths as in the package zip file.
+
+    Args:
+      path (str): The path to the tutorial package.
+      entries ({str: dict}): The build manifest entries for each tutorial in
+          the package, keyed by tutorial directory name.
+      changed ({str}): The names of the top-level files and directories which
+          have changed since the update archives were last written.
+
+    """
+    updates_dir = os.path.join(path, UPDATES_DIR)
+    os.makedirs(updates_dir, exist_ok=True)
+
+    for directory in entries:
+        zip_path = os.path.join(updates_dir, '{}.zip'.format(directory))
+        if directory not in changed and os.path.exists(zip_path):
+            continue
+
+        tmp_path = zip_path + '.tmp'
+        tutorial_dir = os.path.join(path, directory)
+
+        with zipfile.ZipFile(tmp_path, 'w') as zfile:
+            for dirpath, _, filenames in os.walk(tutorial_dir):
+                for filename in filenames:
+                    file_path = os.path.join(dirpath, filename)
+                    arcname = os.path.relpath(file_path, path)
+                    zfile.write(file_path, arcname.replace(os.sep, '/'))
+        os.replace(tmp_path, zip_path)
+
+    # remove the archives of any tutorials which are no longer in the package
+    for filename in os.listdir(updates_dir):
+        directory, ext = os.path.splitext(filename)
+        if ext == '.zip' and directory not in entries:
+            os.remove(os.path.join(updates_dir, filename))
+
+    files = {}
+    for filename in ('tutorials.txt', 'config.txt'):
+        with open(os.path.join(path, filename)) as f:
+            files[filename] = f.read()
+
+    manifest_path = os.path.join(updates_dir, UPDATES_MANIFEST_FILE)
+    tmp_path = manifest_path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'files': files,
+            'tutorials': {
+                directory: entry['directory_hash']
+                for directory, entry in entries.items()
+            },
+        }, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def read_manifest(path):
+    """
+    Read the build manifest for the tutorial package at the given path.
+
+    Args:
+      path (str): The path to the tutorial package.
+
+    Returns:
+      The manifest, as a dictionary.  If there is no valid manifest, an empty
+      dictionary is returned (so everything will be rebuilt).
+
+    """
+    try:
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def write_manifest(path, manifest):
+    """
+    Write the build manifest for the tutorial package at the given path.
+
+    Args:
+      path (str): The path to the tutorial package.
+      manifest (dict): The manifest to write.
+
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    tmp_path = manifest_path + '.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=4, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
 
 
 def create_tutorial_package(source_dir, destination_dir, url, problem_sets,
-        ignore_invalid_tutorials=False):
+        ignore_invalid_tutorials=False, incremental=False):
     """
     Create a tutorial package using the provided data.
 
+    In an incremental build, the destination directory may already contain a
+    package created by a previous (incremental) build.  Only tutorials whose
+    source files have changed since that build are copied and re-hashed, and
+    only the changed members of the zip file are re-read from disk.  If nothing
+    has changed, the package is left untouched (including its timestamp).
+    If the destination directory has no build manifest, it is not known what
+    it contains, so it is removed and the package is built from scratch.
+
     Args:
       source_dir (str): The location of the problems in the tutorial package.
       destination_dir (str): The directory to output the tutorial package to.
@@ -298,18 +510,34 @@ def create_tutorial_package(source_dir, destination_dir, url, problem_sets,
       ignore_invalid_tutorials (bool, optional): Whether to ignore invalid
           tutorials, and proceed anyway.  If True, exceptions encountered when
           creating tutorials will be suppressed. Defaults to False.
+      incremental (bool, optional): Whether to update an existing package in
+          the destination directory.  Defaults to False.
 
     """
-    # try to create the destination dir, which will fail if it already exists
-    try:
-        os.mkdir(destination_dir)
-    except OSError as e:
-        raise TutorialCreationError(
-            'Destination directory exists: {}'.format(destination_dir)
-        ) from e
+    manifest = {}
+    if incremental and os.path.isdir(destination_dir):
+        manifest = read_manifest(destination_dir)
+        if not manifest:
+            shutil.rmtree(destination_dir)
+
+    if manifest:
+        rebuild = True
+    else:
+        # try to create the destination dir, which will fail if it already
+        # exists
+        try:
+            os.mkdir(destination_dir)
+        except OSError as e:
+            raise TutorialCreationError(
+                'Destination directory exists: {}'.format(destination_dir)
+            ) from e
+        rebuild = False
 
     parent_dir, dir_name = os.path.split(destination_dir)
 
+    # the top-level files and directories which we have changed
+    changed = set()
+
     # create configuration files
     package_tutorials_config = os.path.join(destination_dir, 'tutorials.txt')
     package_generic_config = os.path.join(destination_dir, 'config.txt')
@@ -317,8 +545,16 @@ def create_tutorial_package(source_dir, destination_dir, url, problem_sets,
     with open(package_tutorials_config, 'w') as f:
         write_package_tutorials_config(f, problem_sets)
 
-    with open(package_generic_config, 'w') as f:
-        write_package_config(f, url)
+    # this is what's written to tutorials.txt, in a JSON-friendly form
+    tutorials_config = [
+        [pset.name, pset.due, [[t.name, t.directory] for t in pset.tutorials]]
+        for pset in problem_sets
+    ]
+    if manifest.get('tutorials_config') != tutorials_config:
+        changed.add('tutorials.txt')
+
+    if manifest.get('url') != url:
+        changed.add('config.txt')
 
     # add the tutorial files
     # keep track of which ones succeeded and which failed (although the latter
@@ -326,10 +562,29 @@ def create_tutorial_package(source_dir, destination_dir, url, problem_sets,
     # problem_set.name : {tutorial.name : successful}
     could_parse = OrderedDict()
 
+    # tutorial.directory : {'source_hash': str, 'hash': str (base32)}
+    old_entries = manifest.get('tutorials', {})
+    entries = {}
+
     for problem_set in problem_sets:
         could_parse[problem_set.name] = OrderedDict()
 
         for tutorial in problem_set.tutorials:
+            source_hash = get_source_hash(tutorial, source_dir)
+            dest_dir = os.path.join(destination_dir, tutorial.directory)
+
+            entry = old_entries.get(tutorial.directory)
+            if entry is not None and entry['source_hash'] == source_hash \
+                    and 'directory_hash' in entry \
+                    and os.path.isdir(dest_dir):
+                entries[tutorial.directory] = entry
+                could_parse[problem_set.name][tutorial.name] = True
+                continue
+
+            changed.add(tutorial.directory)
+            if os.path.exists(dest_dir):
+                shutil.rmtree(dest_dir)
+
             try:
                 write_tutorial(tutorial, source_dir, destination_dir)
                 could_parse[problem_set.name][tutorial.name] = True
@@ -337,12 +592,48 @@ def create_tutorial_package(source_dir, destination_dir, url, problem_sets,
                 if not ignore_invalid_tutorials:
                     raise
                 could_parse[problem_set.name][tutorial.name] = False
+                continue
+
+            tutorial_hash = Tutorial(tutorial.name, dest_dir, None).hash
+            entries[tutorial.directory] = {
+                'source_hash': source_hash,
+                'hash': base64.b32encode(tutorial_hash).decode('utf8'),
+                'directory_hash': get_directory_hash(dest_dir),
+            }
+
+    # remove any tutorials which are no longer in the package
+    for directory in set(old_entries) - set(entries):
+        dest_dir = os.path.join(destination_dir, directory)
+        if os.path.exists(dest_dir):
+            shutil.rmtree(dest_dir)
+        changed.add(directory)
+
+    if rebuild and not changed:
+        return could_parse  # already up to date
+
+    with open(package_generic_config, 'w') as f:
+        write_package_config(f, url)
+    changed.add('config.txt')
 
     # finally, write our tutorial hashes file
-    update_hashes(parent_dir, destination_dir)
+    known_hashes = {
+        directory: base64.b32decode(entry['hash'])
+        for directory, entry in entries.items()
+    }
+    update_hashes(parent_dir, destination_dir, known_hashes)
 
     # zip everything together
-    create_zipfile(destination_dir, dir_name)
+    create_zipfile(destination_dir, dir_name, changed if rebuild else None)
+
+    # and publish the tutorials separately, for delta updates
+    write_updates(destination_dir, entries, changed)
+
+    if incremental:
+        write_manifest(destination_dir, {
+            'url': url,
+            'tutorials_config': tutorials_config,
+            'tutorials': entries,
+        })
 
     return could_parse
 
@@ -375,6 +666,11 @@ def main():
         '--verbose',
         action='store_true',
     )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Update an existing package, rebuilding only what has changed',
+    )
 
     args = parser.parse_args()
 
@@ -384,6 +680,7 @@ def main():
         source_dir=args.source_dir,
         ignore_invalid_tutorials=args.ignore_invalid_tutorials,
         verbose=args.verbose,
+        incremental=args.incremental,
     )
 
     return 0
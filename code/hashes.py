@@ -24,7 +24,7 @@ TutorialHashInfo = namedtuple(
 )
 
 
-def write_tutorial_hashes(f, path):
+def write_tutorial_hashes(f, path, known_hashes=None):
     """
     Create the tutorial hashes file for the tutorial package in the given
     destination directory.
@@ -36,10 +36,17 @@ def write_tutorial_hashes(f, path):
     Args:
       f (file): The file to write the tutorial hashes data to.
       path (str): The path to the tutorial package.
+      known_hashes ({str: bytes}, optional): The hashes of any tutorials which
+          are already known, keyed by tutorial directory name.  These will not
+          be recomputed.  Defaults to None.
 
     """
+    if known_hashes is None:
+        known_hashes = {}
+
+    # tutorials with known hashes never need to be loaded
     options = Namespace(tut_dir=path, ans_dir='/tmp/notreal')
-    tutorial_package = TutorialPackage(path, options)
+    tutorial_package = TutorialPackage(path, options, lazy=True)
 
     tutorial_package_name = tutorial_package.name.replace(' ', '_')
 
@@ -54,7 +61,13 @@ def write_tutorial_hashes(f, path):
         problem_set_name = problem_set.name.replace(' ', '_')
 
         for tutorial in problem_set:
-            b32hash = base64.b32encode(tutorial.hash).decode('utf8')
+            tutorial_hash = known_hashes.get(
+                os.path.basename(tutorial.tutorial_path)
+            )
+            if tutorial_hash is None:
+                tutorial_hash = tutorial.hash
+
+            b32hash = base64.b32encode(tutorial_hash).decode('utf8')
             tutorial_name = tutorial.name.replace(' ', '_')
 
             data = [
@@ -172,7 +185,20 @@ def generate_hash_mappings(old_hashes, new_hashes):
     return hash_mappings
 
 
-def update_hashes(parent_dir, tutorial_package_path):
+def update_hashes(parent_dir, tutorial_package_path, known_hashes=None):
+    """
+    Update the tutorial hashes and hash mappings files in the given directory
+    for the tutorial package at the given path.
+
+    Args:
+      parent_dir (str): The directory containing the tutorial_hashes and
+          tutorial_hash_mappings files.
+      tutorial_package_path (str): The path to the tutorial package.
+      known_hashes ({str: bytes}, optional): The hashes of any tutorials which
+          are already known, keyed by tutorial directory name.  These will not
+          be recomputed.  Defaults to None.
+
+    """
     tutorial_hashes_path = os.path.join(parent_dir, 'tutorial_hashes')
     hash_mappings_path = os.path.join(parent_dir, 'tutorial_hash_mappings')
 
@@ -191,7 +217,7 @@ def update_hashes(parent_dir, tutorial_package_path):
 
     # write out the new hashes
     with open(tutorial_hashes_path, 'w') as f:
-        write_tutorial_hashes(f, tutorial_package_path)
+        write_tutorial_hashes(f, tutorial_package_path, known_hashes)
 
     # load the new hashes
     # yes, this method of writing and then re-reading is lazy; sue me
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Re-test every stored submission against the current tutorial package.
+
+The server keeps the code for each submission in submissions/<user>/<hash>,
+where the hash is the base32 hash (without padding) of the tutorial at the
+time of submission.  This script walks a copy of that tree, maps each
+submission to the current version of its tutorial (using the
+tutorial_hash_mappings file), and runs the current tests and analysis on it in
+a pool of worker processes.
+
+Results are checkpointed as they complete, keyed on the hash of the answer and
+of the current tutorial.  Re-running the script only re-tests submissions
+where either of those has changed, so an interrupted run can be resumed, and
+a run after changing a single tutorial only re-tests that tutorial.
+
+Typical usage:
+  $ ./regrade.py ../data/submissions --tutorial_package ../CSSE1001Tutorials \\
+        --hash_mappings ../data/submissions/tutorial_hash_mappings
+
+"""
+from argparse import ArgumentParser
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+from hashlib import sha512
+import json
+import os
+import sys
+
+from hashes import parse_hash_mappings
+from tutorlib.config.namespaces import Namespace
+from tutorlib.interface.problems import TutorialPackage
+from tutorlib.interface.workers import CRASHED, TIMED_OUT, TestWorkerPool, \
+        WorkerPoolError
+from tutorlib.testing.results import TutorialTestResult
+from tutorlib.testing.submission import PreparedSubmission
+
+
+PASS = 'PASS'
+FAIL = 'FAIL'
+TIMEOUT = 'TIMEOUT'
+CRASH = 'CRASH'
+ERROR = 'ERROR'
+
+# how many results to record between writes of the checkpoint file
+CHECKPOINT_INTERVAL = 50
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description='Re-test every stored submission against the current '
+                    'tutorial package',
+    )
+
+    parser.add_argument(
+        'submissions_dir',
+        type=str,
+        help='The path to (a copy of) the server submissions directory',
+    )
+    parser.add_argument(
+        '--tutorial_package',
+        type=str,
+        help='The path to the tutorial package to test against',
+        default='../CSSE1001Tutorials',
+    )
+    parser.add_argument(
+        '--hash_mappings',
+        type=str,
+        help='The path to the tutorial_hash_mappings file, used to find the '
+             'current version of tutorials submitted under an old hash',
+        default=None,
+    )
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='The file to write the report to',
+        default='regrade.csv',
+    )
+    parser.add_argument(
+        '--format',
+        choices=['csv', 'json'],
+        help='The format of the report',
+        default='csv',
+    )
+    parser.add_argument(
+        '--checkpoint',
+        type=str,
+        help='The file to record completed results in',
+        default='regrade_checkpoint.json',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='The number of worker processes to run tests in',
+        default=os.cpu_count() or 1,
+    )
+
+    return parser.parse_args()
+
+
+def get_tutorial_package(path):
+    options = Namespace(tut_dir=path, ans_dir='/tmp/notreal')
+    return TutorialPackage(os.path.basename(path), options)
+
+
+def b32hash(data):
+    return base64.b32encode(data).decode('ascii')
+
+
+def unpadded(tutorial_hash):
+    """
+    Return the given base32 hash without its padding characters.
+
+    The server saves submitted code under the unpadded hash (as the padding
+    is not safe in a filename), so hashes must be compared in this form.
+
+    """
+    return tutorial_hash.strip('=')
+
+
+def get_resolver(tutorial_package, hash_mappings):
+    """
+    Return a function which maps a submitted tutorial hash to the current
+    version of that tutorial.
+
+    Args:
+      tutorial_package (TutorialPackage): The current tutorial package.
+      hash_mappings ({str: str}): A mapping from old hashes to the hashes which
+          replaced them (or None if the tutorial was removed).
+
+    Returns:
+      A function which takes a base32 hash, and returns a two-element tuple of
+      the ProblemSet and Tutorial which it corresponds to.  If the hash is not
+      for a tutorial in the package, both elements will be None.
+      The hash may be given with or without its padding.
+
+    """
+    current = {}
+    for problem_set in tutorial_package.problem_sets:
+        for tutorial in problem_set:
+            current[unpadded(b32hash(tutorial.hash))] = problem_set, tutorial
+
+    hash_mappings = {
+        unpadded(old_hash): None if new_hash is None else unpadded(new_hash)
+        for old_hash, new_hash in hash_mappings.items()
+    }
+
+    def resolve(tutorial_hash):
+        tutorial_hash = unpadded(tutorial_hash)
+        seen = set()
+        while tutorial_hash is not None and tutorial_hash not in current:
+            if tutorial_hash in seen:
+                return None, None
+            seen.add(tutorial_hash)
+            tutorial_hash = hash_mappings.get(tutorial_hash)
+        return current.get(tutorial_hash, (None, None))
+
+    return resolve
+
+
+def find_submissions(submissions_dir, resolve):
+    """
+    Find every submission for a tutorial in the current package.
+
+    Args:
+      submissions_dir (str): The path to the submissions directory.
+      resolve ((str) -> (ProblemSet, Tutorial)): The resolver returned by
+          get_resolver.
+
+    Yields:
+      A (user, submitted_hash, path, problem_set, tutorial) tuple for each
+      submission.
+
+    """
+    for user in sorted(os.listdir(submissions_dir)):
+        user_dir = os.path.join(submissions_dir, user)
+        if not os.path.isdir(user_dir):
+            continue  # eg, the tutorial_hashes file
+
+        # anything which isn't a known tutorial hash (eg, the submission_log)
+        # won't resolve, and so will be skipped
+        for submitted_hash in sorted(os.listdir(user_dir)):
+            problem_set, tutorial = resolve(submitted_hash)
+            if tutorial is None:
+                continue
+
+            path = os.path.join(user_dir, submitted_hash)
+            yield user, submitted_hash, path, problem_set, tutorial
+
+
+def grade(pool, tutorial, code):
+    """
+    Run the tests and analysis for the given tutorial on the given code.
+
+    This is equivalent to tutorlib.interface.tests.run_tests, except that the
+    tests are only ever run in the worker pool.  (The in-process fallback
+    relies on interrupting the main thread, which would not be safe here.)
+
+    Args:
+      pool (TestWorkerPool): The pool to run the tests in.
+      tutorial (Tutorial): The tutorial to test against.
+      code (str): The submitted code.
+
+    Returns:
+      One of PASS, FAIL, TIMEOUT, CRASH or ERROR.
+
+    """
+    submission = PreparedSubmission(code, tutorial.wrap_student_code)
+
+    # each access creates a new analyser, so this is safe to do concurrently
+    analyser = tutorial.analyser
+    if analyser.check_for_errors(submission) is not None:
+        return FAIL
+    analyser.analyse(submission)
+    analysis_passed = not analyser.errors
+
+    try:
+        results, status = pool.run(tutorial, submission)
+    except WorkerPoolError:
+        return ERROR
+
+    if status == TIMED_OUT:
+        return TIMEOUT
+    if status == CRASHED:
+        return CRASH
+
+    passed = all(
+        result.status == TutorialTestResult.PASS for _, result in results
+    )
+    return PASS if passed and analysis_passed else FAIL
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    # write atomically, so that an interrupted run never loses the checkpoint
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_report(path, fmt, rows):
+    fields = ['user', 'problem_set', 'tutorial', 'submitted_hash', 'status']
+
+    with open(path, 'w', newline='') as f:
+        if fmt == 'json':
+            json.dump([dict(zip(fields, row)) for row in rows], f, indent=2)
+        else:
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            writer.writerows(rows)
+
+
+def main(args):
+    tutorial_package = get_tutorial_package(args.tutorial_package)
+
+    hash_mappings = {}
+    if args.hash_mappings is not None:
+        with open(args.hash_mappings) as f:
+            hash_mappings = parse_hash_mappings(f)
+
+    resolve = get_resolver(tutorial_package, hash_mappings)
+    submissions = list(find_submissions(args.submissions_dir, resolve))
+
+    checkpoint = load_checkpoint(args.checkpoint)
+
+    # work out which submissions actually need to be re-tested
+    rows = {}
+    jobs = []
+
+    for user, submitted_hash, path, problem_set, tutorial in submissions:
+        with open(path) as f:
+            code = f.read()
+
+        key = '{}/{}'.format(user, submitted_hash)
+        answer_hash = b32hash(sha512(code.encode('utf8')).digest())
+        tutorial_hash = b32hash(tutorial.hash)
+
+        row = [user, problem_set.name, tutorial.name, submitted_hash]
+        rows[key] = row
+
+        entry = checkpoint.get(key)
+        if entry is not None and entry['answer_hash'] == answer_hash \
+                and entry['tutorial_hash'] == tutorial_hash:
+            continue  # unchanged since the last run
+
+        jobs.append((key, answer_hash, tutorial_hash, tutorial, code))
+
+    print('{} submissions, {} to test'.format(len(rows), len(jobs)),
+          file=sys.stderr)
+
+    # test them
+    tutorials = []
+    for _, _, _, tutorial, _ in jobs:
+        if tutorial not in tutorials:
+            tutorials.append(tutorial)
+
+    pool = TestWorkerPool(num_workers=args.workers)
+    pool.start()
+    pool.preload(tutorials)
+
+    try:
+        with ThreadPoolExecutor(args.workers) as executor:
+            futures = {
+                executor.submit(grade, pool, tutorial, code):
+                    (key, answer_hash, tutorial_hash)
+                for key, answer_hash, tutorial_hash, tutorial, code in jobs
+            }
+
+            for completed, future in enumerate(as_completed(futures), 1):
+                key, answer_hash, tutorial_hash = futures[future]
+                checkpoint[key] = {
+                    'answer_hash': answer_hash,
+                    'tutorial_hash': tutorial_hash,
+                    'status': future.result(),
+                }
+
+                if completed % CHECKPOINT_INTERVAL == 0:
+                    save_checkpoint(args.checkpoint, checkpoint)
+                    print('{}/{} tested'.format(completed, len(jobs)),
+                          file=sys.stderr)
+    finally:
+        pool.close()
+        save_checkpoint(args.checkpoint, checkpoint)
+
+    # write out the full report (including results from previous runs)
+    report = [
+        row + [checkpoint[key]['status']] for key, row in sorted(rows.items())
+    ]
+    write_report(args.output, args.format, report)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
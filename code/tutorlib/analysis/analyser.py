@@ -2,36 +2,47 @@ from abc import ABCMeta, abstractmethod
 import ast
 
 
-class ListGeneratingNodeVisitor(ast.NodeVisitor):
+def visit_tree(tree, visitors):
     """
-    A NodeVisitor subclass which logs the order in which nodes are visited.
+    Visit every node in the given tree with each of the given visitors.
 
-    This makes use of the default implementation of NodeVisitor.generic_visit,
-    which recursively visits children of nodes.
+    Nodes are visited in the same order as ast.NodeVisitor.generic_visit would
+    visit them (ie, depth-first, with children in field order).  Each visitor's
+    .visit method is called for a node before any of its children are visited,
+    and its .leave method is called once all of them have been left.
 
-    Class Attributes:
-      VISIT (constant): Identifier for the start of a node visit.  This is
-          appended to the events list immediately before a node is visited.
-      LEAVE (constant): Identifier for thee end of a node visit.  This is
-          appended to the events list immediately after a node is visited (and
-          so also after all of its children have been visited).
+    The traversal is iterative, so it needs no more memory than the depth of
+    the tree, and the visitors should not recurse themselves (see
+    TutorialNodeVisitor.generic_visit).  Where there are several visitors,
+    each event is passed to each visitor in turn, in the order given.
 
-    Attributes:
-      events ([constant, ast.AST]): List of visitation events.  The first item
-          in each pair will be one of VISIT or LEAVE, as appropriate.  The
-          second item in each pair is the node in question.
+    Args:
+      tree (ast.AST): The root of the tree to visit.
+      visitors ([TutorialNodeVisitor]): The visitors to use.  Each must have
+          both a .visit and a .leave method.
 
     """
-    VISIT = 'VISIT'
-    LEAVE = 'LEAVE'
+    visits = [visitor.visit for visitor in visitors]
+    leaves = [visitor.leave for visitor in visitors]
+
+    for visit in visits:
+        visit(tree)
 
-    def __init__(self):
-        self.events = []
+    # each entry is a node, and an iterator over the children not yet visited
+    stack = [(tree, ast.iter_child_nodes(tree))]
+    while stack:
+        node, children = stack[-1]
 
-    def generic_visit(self, node):
-        self.events.append((ListGeneratingNodeVisitor.VISIT, node))
-        super().generic_visit(node)
-        self.events.append((ListGeneratingNodeVisitor.LEAVE, node))
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            for leave in leaves:
+                leave(node)
+            continue
+
+        for visit in visits:
+            visit(child)
+        stack.append((child, ast.iter_child_nodes(child)))
 
 
 class CodeAnalyser(metaclass=ABCMeta):
@@ -87,9 +98,9 @@ class CodeAnalyser(metaclass=ABCMeta):
         """
         self.warnings.append(message)
 
-    def analyse(self, text):
+    def analyse(self, submission):
         """
-        Analyse the given student code text.
+        Analyse the given student code.
 
         Analysis will be performed using the visitor class given as an argument
         to the constructor.  This method ensures that all nodes are visited in
@@ -98,24 +109,14 @@ class CodeAnalyser(metaclass=ABCMeta):
 
         Defers to ._analyse() for detailed, problem-specific analysis.
 
+        The code must have compiled successfully (see .check_for_errors()).
+
         Args:
-          text (str): The code to analyse.
+          submission (PreparedSubmission): The code to analyse.
 
         """
-        # build up an ordered list of nodes in the default manner
-        tree = ast.parse(text)
-
-        list_generating_visitor = ListGeneratingNodeVisitor()
-        list_generating_visitor.visit(tree)
-
         # visit each node in turn with our visitor (which will not recurse)
-        handle_event = {
-            ListGeneratingNodeVisitor.VISIT: self.visitor.visit,
-            ListGeneratingNodeVisitor.LEAVE: self.visitor.leave,
-        }
-        for event, node in list_generating_visitor.events:
-            assert event in handle_event, 'Unknown event: {}'.format(event)
-            handle_event[event](node)
+        visit_tree(submission.tree, [self.visitor])
 
         # defer detailed analysis to subclasses
         self._analyse()
@@ -135,7 +136,7 @@ class CodeAnalyser(metaclass=ABCMeta):
         """
         pass
 
-    def check_for_errors(self, text):
+    def check_for_errors(self, submission):
         """
         Check whether the given student code has any compile errors.
 
@@ -146,7 +147,7 @@ class CodeAnalyser(metaclass=ABCMeta):
         Those exceptions will be dealt with during the testing phase.
 
         Args:
-          text (str): The code to analyse.
+          submission (PreparedSubmission): The code to analyse.
 
         Returns:
           The line number associated with exception, if any.
@@ -155,11 +156,10 @@ class CodeAnalyser(metaclass=ABCMeta):
           associated line number was encountered.
 
         """
-        try:
-            compile(text, '<student_code>', 'exec')
-        except Exception as e:
-            message = '{}: {}'.format(type(e).__name__, e)
-            self.add_error(message)
-            return getattr(e, 'lineno', None)
-
-        return None
+        e = submission.error
+        if e is None:
+            return None
+
+        message = '{}: {}'.format(type(e).__name__, e)
+        self.add_error(message)
+        return getattr(e, 'lineno', None)
@@ -9,7 +9,45 @@ from tutorlib.analysis.ast_tools \
 from tutorlib.analysis.node_objects \
         import Call, ClassDefinition, FunctionDefinition, Lambda
 from tutorlib.analysis.scope_manager import NodeScopeManager
-from tutorlib.testing.tester import STUDENT_FUNCTION_NAME  # urgh, messy
+from tutorlib.testing.submission import STUDENT_FUNCTION_NAME  # urgh, messy
+
+
+# every AST node class, as (name, class) pairs
+# this only needs to be found once, rather than for every visitor class
+_AST_NODE_CLASSES = inspect.getmembers(
+    ast,
+    lambda obj: inspect.isclass(obj) and issubclass(obj, ast.AST)
+        and obj is not ast.AST,
+)
+
+
+def _make_dispatch_table(cls, prefix, default_name):
+    """
+    Map each AST node class to the method of the given class which handles it.
+
+    The method for a node class is the one named prefix + the node class name
+    (in the same way as ast.NodeVisitor.visit finds it), or the default method
+    if there is no such method.
+
+    Args:
+      cls (type): The visitor class.
+      prefix (str): The prefix of the method names (eg, 'visit_').
+      default_name (str): The name of the method to use if there is no
+          specific method for a node class.
+
+    Returns:
+      A dict mapping node classes to (unbound) methods.
+
+    """
+    default = getattr(cls, default_name, None)
+
+    table = {}
+    for _, node_class in _AST_NODE_CLASSES:
+        method = getattr(cls, prefix + node_class.__name__, default)
+        if method is not None:
+            table[node_class] = method
+
+    return table
 
 
 class DefinesAllPossibleVisits(type):
@@ -26,15 +64,11 @@ class DefinesAllPossibleVisits(type):
 
     """
     def __new__(mcs, clsname, bases, dct):
-        is_node_class = lambda obj: inspect.isclass(obj) \
-                and issubclass(obj, ast.AST) and obj is not ast.AST
-        node_classes = inspect.getmembers(ast, is_node_class)
-
         generic_visit = dct.get('generic_visit', ast.NodeVisitor.generic_visit)
         base_has_method = lambda method_name: \
             any(getattr(base, method_name, None) is not None for base in bases)
 
-        for name, node in node_classes:
+        for name, node in _AST_NODE_CLASSES:
             method_name = 'visit_{}'.format(name)
 
             # we want to alias generic_visit iff a specific visit_classname
@@ -44,6 +78,31 @@ class DefinesAllPossibleVisits(type):
 
         return super().__new__(mcs, clsname, bases, dct)
 
+    def __init__(cls, clsname, bases, dct):
+        super().__init__(clsname, bases, dct)
+
+        # the tables used to dispatch visits and leaves by node class
+        # these are built on first use (see build_dispatch_tables), and must
+        # not be inherited from the base class
+        cls._visit_methods = None
+        cls._leave_methods = None
+
+    def build_dispatch_tables(cls):
+        """
+        Build the tables used to dispatch visits and leaves by node class.
+
+        This saves finding the method by name for every node visited.  The
+        tables are built when the class is first used, so methods added to the
+        class after that will not be used.
+
+        """
+        cls._visit_methods = _make_dispatch_table(
+            cls, 'visit_', 'generic_visit'
+        )
+        cls._leave_methods = _make_dispatch_table(
+            cls, 'leave_', 'generic_leave'
+        )
+
 
 class TutorialNodeVisitor(ast.NodeVisitor, metaclass=DefinesAllPossibleVisits):
     """
@@ -93,6 +152,30 @@ class TutorialNodeVisitor(ast.NodeVisitor, metaclass=DefinesAllPossibleVisits):
             return Lambda(node)
         return identifier_or_value(node, prefer_value=True)
 
+    def visit(self, node):
+        """
+        Visit a node.
+
+        This is equivalent to ast.NodeVisitor.visit, but finds the
+        .visit_ClassName method through the dispatch table built by
+        DefinesAllPossibleVisits.
+
+        Args:
+          node (ast.AST): The node to visit.
+
+        Returns:
+          Whatever the .visit_ClassName or .generic_visit method returns
+          (probably None).
+
+        """
+        if self._visit_methods is None:
+            type(self).build_dispatch_tables()
+
+        method = self._visit_methods.get(node.__class__)
+        if method is None:
+            return super().visit(node)
+        return method(self, node)
+
     def generic_visit(self, node):
         """
         Do nothing.
@@ -102,9 +185,9 @@ class TutorialNodeVisitor(ast.NodeVisitor, metaclass=DefinesAllPossibleVisits):
         are explicitly passed as arguments to .visit (or which are otherwise
         visited by the resulting visit_ClassName calls).
 
-        What we do instead is generate a list of all the nodes in the desired
-        format (using ListGeneratingNodeVisitor, or some other means), and then
-        iterate through that list, calling .visit on each.
+        What we do instead is traverse the tree separately (using visit_tree
+        in tutorlib.analysis.analyser, or some other means), calling .visit and
+        .leave on each node in turn.
 
         THis approach is necessary because of problems with recursively
         visiting nodes in both this class and its subclasses.
@@ -138,7 +221,8 @@ class TutorialNodeVisitor(ast.NodeVisitor, metaclass=DefinesAllPossibleVisits):
 
         This implementation is based off the ast.NodeVisitor.visit source code.
         It will defer to .leave_ClassName, if defined, or otherwise to
-        .generic_leave
+        .generic_leave (found through the dispatch table built by
+        DefinesAllPossibleVisits, where possible).
 
         Args:
           node (ast.AST): The node we are leaving.
@@ -148,6 +232,13 @@ class TutorialNodeVisitor(ast.NodeVisitor, metaclass=DefinesAllPossibleVisits):
           (probably None).
 
         """
+        if self._leave_methods is None:
+            type(self).build_dispatch_tables()
+
+        method = self._leave_methods.get(node.__class__)
+        if method is not None:
+            return method(self, node)
+
         method = 'leave_{}'.format(node.__class__.__name__)
         visitor = getattr(self, method, self.generic_leave)
         return visitor(node)
@@ -15,3 +15,13 @@ TUTORIAL_ATTEMPTS_FILE = os.path.join(MPT_DIR, 'tutorial_attempts')
 TMP_DIRECTORY = os.path.join(MPT_DIR, 'tmp')
 if not os.path.exists(TMP_DIRECTORY):
     os.mkdir(TMP_DIRECTORY)
+
+# compiled tutorial submodules (see tutorlib.utils.code_cache)
+# this is created on demand
+CODE_CACHE_DIRECTORY = os.path.join(MPT_DIR, 'cache', 'code')
+
+# hashes of tutorials (see Tutorial.HASH_CACHE_FILE)
+TUTORIAL_HASH_CACHE_FILE = os.path.join(MPT_DIR, 'cache', 'tutorial_hashes')
+
+# downloaded zip files, for revalidation (see tutorlib.utils.download_cache)
+DOWNLOAD_CACHE_DIRECTORY = os.path.join(MPT_DIR, 'cache', 'downloads')
@@ -10,6 +10,8 @@ import datetime, time, shutil
 from tutorlib.config.attempts import TutorialAttempts
 from tutorlib.config.configuration \
         import add_tutorial, load_config, save_config
+from tutorlib.config.shared \
+        import CODE_CACHE_DIRECTORY, TUTORIAL_HASH_CACHE_FILE
 from tutorlib.gui.app.menu import TutorialMenuDelegate, TutorialMenu
 from tutorlib.gui.app.output \
         import AnalysisOutput, TestOutput, TestOutputDelegate
@@ -25,8 +27,12 @@ import tutorlib.utils.messagebox as tkmessagebox
 from tutorlib.utils.threading import exec_sync
 from tutorlib.interface.interpreter import Interpreter
 from tutorlib.interface.problems import TutorialPackage, TutorialPackageError
+from tutorlib.interface.startup import CREDENTIALS_PHASE, TUTORIALS_PHASE, \
+        VERSION_PHASE
 from tutorlib.interface.tests import run_tests
+from tutorlib.interface.tutorial import Tutorial
 from tutorlib.interface.web_api import WebAPI, WebAPIError
+from tutorlib.interface.workers import TestWorkerPool
 from tutorlib.online.sync import SyncClient
 
 
@@ -55,9 +61,15 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
       menu (TutorialMenu): The menubar.
       online_status (Label): The label showing whether the student is currently
           logged in (ie, authenticated).
+      restart_to_update (bool): Whether the student chose to restart
+          MyPyTutor in order to install an update.
       short_description (Label): The label containing the short description
           of the current tutorial problem.
+      startup (StartupPipeline): The startup phases which were still running
+          in the background when the app was created, if any.
       sync_client (SyncClient): The tutorial synchronisation client.
+      test_pool (TestWorkerPool): The worker processes which run the tests on
+          the student's code.
       test_output (TestOutput): The frame displaying the current test results.
       tutorial_attempts (TutorialAttempts): The number of attempts that the
         student has made at a tutorial problem.
@@ -65,8 +77,12 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
           problem and associated data, such as hints.
 
     """
-    def __init__(self, master, web_api=None):
-        assert web_api is None or web_api.is_logged_in, \
+    def __init__(self, master, web_api=None, startup=None):
+        # the credentials startup phase logs in the given WebAPI instance
+        # (see _startup_credentials_done)
+        logging_in = startup is not None \
+                and startup.has_phase(CREDENTIALS_PHASE)
+        assert web_api is None or web_api.is_logged_in or logging_in, \
                 'If a WebAPI instance is provided, it must be logged in'
 
         #### Set up the window
@@ -87,9 +103,26 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
         ## Important top-level vars
         self.master = master
         self.cfg = load_config()
+        self.startup = startup
+        self.restart_to_update = False
+
+        # persist compiled tutorial submodules between sessions
+        # this must be set before any tutorials are loaded
+        Tutorial.CODE_CACHE_DIRECTORY = CODE_CACHE_DIRECTORY
+        Tutorial.HASH_CACHE_FILE = TUTORIAL_HASH_CACHE_FILE
+
+        # student code is tested in worker processes, which we start now so
+        # that they are ready by the time the student first checks their code
+        self.test_pool = TestWorkerPool(code_cache_dir=CODE_CACHE_DIRECTORY)
+        self.test_pool.start()
 
         ## Vars with side effects
-        self.tutorial_package = self.cfg.tutorials.default
+        # the default package may be being updated in the background, in
+        # which case we load it once that has finished, rather than reading
+        # it while it is rewritten (see _startup_tutorials_done)
+        if not self.cfg.tutorials.default or self.startup is None \
+                or self.startup.is_done(TUTORIALS_PHASE):
+            self.tutorial_package = self.cfg.tutorials.default
         self.menu.set_tutorial_packages(self.cfg.tutorials.names)
 
         ## Objects
@@ -98,7 +131,11 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
 
         if web_api is None:
             self.web_api = WebAPI(self._login_status_change)
-            self.master.after(0, self.login)
+            if self.startup is None:
+                self.master.after(0, self.login)
+        elif logging_in:
+            # we only listen for login status changes once this has finished
+            self.web_api = web_api
         else:
             self.web_api = web_api
             self.web_api.listener = self._login_status_change
@@ -111,6 +148,18 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
         ## Purely private vars
         self._is_closing = False
 
+        ## Background startup phases
+        # these only report back once the main loop is running
+        if self.startup is not None:
+            if logging_in:
+                self._when_startup_done(
+                    CREDENTIALS_PHASE, self._startup_credentials_done
+                )
+            self._when_startup_done(
+                TUTORIALS_PHASE, self._startup_tutorials_done
+            )
+            self._when_startup_done(VERSION_PHASE, self._startup_version_done)
+
         ## Finalise GUI Setup
 
         width = min(master.winfo_screenwidth(), self.cfg.resolution.width)
@@ -245,8 +294,15 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
                 'Attempt to select unknown package: {}'.format(package_name)
         options = getattr(self.cfg, package_name)
 
+        # don't read the default package while it is being updated
+        if package_name == self.cfg.tutorials.default:
+            self._wait_for_startup(TUTORIALS_PHASE)
+
         try:
-            self._tutorial_package = TutorialPackage(package_name, options)
+            # tutorials are loaded on demand, so that we start up faster
+            self._tutorial_package = TutorialPackage(
+                package_name, options, lazy=True
+            )
         except TutorialPackageError as e:
             tkmessagebox.showerror(
                 'Invalid Tutorial Package',
@@ -254,6 +310,12 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
             )
             return
 
+        # load the new package's tutorials into the test workers
+        self.test_pool.preload(
+            tutorial for problem_set in self.tutorial_package.problem_sets
+            for tutorial in problem_set
+        )
+
         # update menu
         self.menu.set_selected_tutorial_package(self.tutorial_package)
 
@@ -334,6 +396,100 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
             message
         )
 
+    ## Startup callbacks
+    def _when_startup_done(self, phase, callback):
+        """
+        Call the given callback on the main thread with the result of the
+        given startup phase, once it has finished.
+
+        """
+        self.startup.when_done(
+            phase, lambda result: self.master.after(0, callback, result)
+        )
+
+    def _wait_for_startup(self, phase):
+        """
+        Wait for the given startup phase to finish, if it is still running.
+
+        The UI will continue to process events while waiting.
+
+        """
+        if self.startup is not None and not self.startup.is_done(phase):
+            exec_sync(self.startup.wait, (phase,))
+
+    def _startup_credentials_done(self, logged_in):
+        """
+        Finish logging in with the student's stored credentials.
+
+        The credentials startup phase has already tried to log in, and cleared
+        the stored credentials if they were wrong.  If it did not succeed,
+        prompt the student to log in as usual.
+
+        """
+        if self._is_closing:
+            return
+
+        self.web_api.listener = self._login_status_change
+
+        if not logged_in:
+            self.login()
+            return
+
+        self._login_status_change(logged_in=True)
+        self._set_online_status(logged_in_user=self.web_api.user)
+
+    def _startup_tutorials_done(self, updated):
+        """
+        Load the default tutorial package, if that was deferred until it had
+        been updated, or reload it if it was updated.
+
+        """
+        if self._is_closing:
+            return
+
+        package = self.tutorial_package
+        if package is None:
+            if self.cfg.tutorials.default:
+                self.tutorial_package = self.cfg.tutorials.default
+            return
+
+        if not updated or package.name != self.cfg.tutorials.default:
+            return
+
+        current_name = None
+        if self.current_tutorial is not None:
+            current_name = self.current_tutorial.name
+
+        self.tutorial_package = self.cfg.tutorials.default
+
+        # switch to the new version of the problem the student has open
+        if current_name is not None:
+            problem = self.tutorial_package.tutorial_with_name(current_name)
+            if problem is not None:
+                self.change_problem(problem=problem)
+
+    def _startup_version_done(self, update_available):
+        """
+        Offer to restart MyPyTutor if an update is available.
+
+        """
+        if not update_available or self._is_closing:
+            return
+
+        restart = tkmessagebox.askyesno(
+            'Update Available',
+            'A new version of MyPyTutor is available.  Would you like to ' \
+            'restart MyPyTutor now to install it?  Otherwise, it will be ' \
+            'installed when you close MyPyTutor.',
+        )
+        if restart:
+            self.restart_to_update = True
+            self.close()
+
+            # the student cancelled closing
+            if not self._is_closing:
+                self.restart_to_update = False
+
     ## General callbacks
     def close(self, evt=None):
         """
@@ -352,6 +508,7 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
             self._is_closing = True
 
             self.interpreter.kill()
+            self.test_pool.close()
 
             self.attempts.save()
 
@@ -397,7 +554,7 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
         # run the tests
         # if the student code cannot be parsed, highlight the problem line
         tester, analyser, error_line = run_tests(
-            self.current_tutorial, code_text
+            self.current_tutorial, code_text, pool=self.test_pool
         )
 
         if error_line is not None:
@@ -501,6 +658,18 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
 
         # set the current tutorial
         assert problem is not None
+
+        # tutorials are loaded lazily, so this is where we find out if there
+        # is something wrong with one
+        try:
+            problem.load()
+        except Exception as e:
+            tkmessagebox.showerror(
+                'Invalid Tutorial',
+                'Failed to load {}: {}'.format(problem.name, e),
+            )
+            return
+
         self.current_tutorial = problem
 
         # show the problem text and description
@@ -526,6 +695,11 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
         # this will fill out the results and static analysis sections
         self.run_tests()
 
+        # the student is most likely to move on to the next problem
+        self.tutorial_package.prefetch(
+            self.tutorial_package.next(self.current_tutorial)
+        )
+
     def _login_status_change(self, logged_in, do_sync=True):
         if do_sync:  # on login or logout
             callback = partial(self.synchronise, no_login=not logged_in)
@@ -641,6 +815,9 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
         if not self.login():
             return None
 
+        # make sure we're asking about the latest version of the package
+        self._wait_for_startup(TUTORIALS_PHASE)
+
         try:
             submissions = self.web_api.get_submissions(self.tutorial_package)
         except WebAPIError as e:
@@ -704,6 +881,9 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
             if no_login or not self.login():
                 return
 
+        # don't synchronise answers against an out of date package
+        self._wait_for_startup(TUTORIALS_PHASE)
+
         # start showing the progress popup
         popup = ProgressPopup()
 
@@ -721,6 +901,10 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
                 'server.',
             )
 
+        def _update_progress(completed, total):
+            # called on the background thread, so defer to the main thread
+            self.master.after(0, popup.set_progress, completed, total)
+
         def _background_task():
             # certain methods used in the synchronisation process might throw
             # WebAPIError, so we want to wrap everything in an exception
@@ -728,7 +912,9 @@ class TutorialApp(TutorialMenuDelegate, TutorEditorDelegate,
             # note that as this is on a background thread, we must not make
             # any UI calls
             try:
-                success = self.sync_client.synchronise(self.tutorial_package)
+                success = self.sync_client.synchronise(
+                    self.tutorial_package, progress=_update_progress,
+                )
 
                 if not suppress_popups:
                     if success:
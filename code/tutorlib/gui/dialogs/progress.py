@@ -14,4 +14,25 @@ class ProgressPopup(tk.Toplevel):
         self.progress_bar.pack(
             side=tk.TOP, padx=10, pady=(0, 10), expand=tk.TRUE, fill=tk.X,
         )
-        self.progress_bar.start()
\ No newline at end of file
+        self.progress_bar.start()
+
+    def set_progress(self, completed, total):
+        """
+        Show the given amount of progress, rather than just that work is
+        taking place.
+
+        This must be called from the main thread.
+
+        Args:
+          completed (int): The number of items of work completed so far.
+          total (int): The total number of items of work.
+
+        """
+        if total <= 0:
+            return
+
+        if str(self.progress_bar['mode']) != 'determinate':
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode='determinate', maximum=total)
+
+        self.progress_bar.configure(value=completed)
@@ -1,4 +1,5 @@
 import os
+import threading
 
 from tutorlib.interface.tutorial import Tutorial
 
@@ -80,12 +81,14 @@ class TutorialPackage():
       name (str): The name of the tutorial package.
       options (Namespace): Tutorial package options (as taken from the
           MyPytutor config data).  Contains `.tut_dir` and `.ans_dir`.
+      lazy (bool): Whether tutorials are loaded on first use, rather than
+          when the package is loaded.
 
     """
     TUTORIALS_FILE = 'tutorials.txt'
     CONFIG_FILE = 'config.txt'
 
-    def __init__(self, name, options):
+    def __init__(self, name, options, lazy=False):
         """
         Initialise a new TutorialPackage object.
 
@@ -93,6 +96,10 @@ class TutorialPackage():
           name (str): The name of the tutorial package.
           options (Namespace): Tutorial package options (as taken from the
               MyPyTutor config data).
+          lazy (bool, optional): Whether to defer loading each tutorial until
+              it is first used (see Tutorial.load).  If True, errors in
+              individual tutorials will not be detected here.  Defaults to
+              False.
 
         Raises:
           TutorialPackageError: If any error is encountered while parsing the
@@ -102,6 +109,7 @@ class TutorialPackage():
         """
         self.name = name
         self.options = options
+        self.lazy = lazy
 
         path = os.path.join(options.tut_dir, TutorialPackage.CONFIG_FILE)
 
@@ -203,7 +211,9 @@ class TutorialPackage():
                 )
 
                 try:
-                    tutorial = Tutorial(name, tutorial_path, answer_path)
+                    tutorial = Tutorial(
+                        name, tutorial_path, answer_path, lazy=self.lazy
+                    )
                 except AssertionError as e:
                     raise TutorialPackageError(
                         'Could not load tutorial with name: {}'.format(name)
@@ -211,6 +221,53 @@ class TutorialPackage():
 
                 problem_set.add_problem(tutorial)
 
+        self._build_indexes()
+
+    def _build_indexes(self):
+        """
+        Build the indexes used to look up tutorials in constant time.
+
+        The hash index is built separately (see _get_hash_index), as computing
+        tutorial hashes is comparatively expensive.
+
+        """
+        self._tutorials = []
+        self._positions = {}
+        self._problem_sets = {}
+        self._names = {}
+
+        for problem_set in self.problem_sets:
+            for tutorial in problem_set:
+                self._positions[tutorial] = len(self._tutorials)
+                self._tutorials.append(tutorial)
+
+                # where there are duplicates, the first one wins
+                self._problem_sets.setdefault(tutorial, problem_set)
+                self._names.setdefault(tutorial.name, tutorial)
+
+        self._hashes = None
+
+    def _get_hash_index(self):
+        """
+        Return the index of tutorials by hash, building it if necessary.
+
+        Where possible, hashes are taken from the hash cache (see
+        Tutorial.HASH_CACHE_FILE), rather than being computed.
+
+        Returns:
+          A dictionary mapping tutorial hashes to tutorials.
+
+        """
+        if self._hashes is not None:
+            return self._hashes
+
+        self._hashes = {}
+        with Tutorial.batch_hashes():
+            for tutorial in self._tutorials:
+                self._hashes.setdefault(tutorial.hash, tutorial)
+
+        return self._hashes
+
     def _get_tutorial(self, current_tutorial, get_previous=True):
         """
         Get the next or previous tutorial after or before the given tutorial.
@@ -234,20 +291,19 @@ class TutorialPackage():
           is requested, then the last tutorial will be returned.
 
         """
-        previous_tutorial = None
-        return_next = current_tutorial is None  # return first if None
+        if current_tutorial is None:
+            return self._tutorials[0]
 
-        for problem_set in self.problem_sets:
-            for tutorial in problem_set:
-                if return_next:
-                    return tutorial
-                elif tutorial == current_tutorial:
-                    if get_previous:
-                        return previous_tutorial or tutorial  # same if first
-                    return_next = True
-                previous_tutorial = tutorial
+        position = self._positions.get(current_tutorial)
+        if position is None:
+            return self._tutorials[-1]  # not in this package
 
-        return tutorial  # if at end, return same
+        if get_previous:
+            position = max(position - 1, 0)  # same if first
+        else:
+            position = min(position + 1, len(self._tutorials) - 1)  # or last
+
+        return self._tutorials[position]
 
     def next(self, current_tutorial):
         """
@@ -287,6 +343,30 @@ class TutorialPackage():
         """
         return self._get_tutorial(current_tutorial, get_previous=True)
 
+    def prefetch(self, tutorial):
+        """
+        Load the given tutorial in a background thread, so that it is ready
+        by the time it is needed.
+
+        If the tutorial has already been loaded, do nothing.  Any errors in
+        loading the tutorial are ignored here; they will instead be raised
+        when the tutorial is used.
+
+        Args:
+          tutorial (Tutorial): The tutorial to load.
+
+        """
+        if tutorial is None or tutorial.is_loaded:
+            return
+
+        def _load():
+            try:
+                tutorial.load()
+            except Exception:
+                pass
+
+        threading.Thread(target=_load, daemon=True).start()
+
     def tutorial_with_name(self, tutorial_name):
         """
         Return the tutorial with the given name.
@@ -303,11 +383,7 @@ class TutorialPackage():
           earliest appearance in the earliest problem set) will be returned.
 
         """
-        for problem_set in self.problem_sets:
-            for tutorial in problem_set:
-                if tutorial.name == tutorial_name:
-                    return tutorial
-        return None
+        return self._names.get(tutorial_name)
 
     def tutorial_with_hash(self, tutorial_hash):
         """
@@ -325,11 +401,7 @@ class TutorialPackage():
           earliest appearance in the earliest problem set) will be returned.
 
         """
-        for problem_set in self.problem_sets:
-            for tutorial in problem_set:
-                if tutorial.hash == tutorial_hash:
-                    return tutorial
-        return None
+        return self._get_hash_index().get(tutorial_hash)
 
     def problem_set_containing(self, tutorial):
         """
@@ -343,9 +415,4 @@ class TutorialPackage():
           None otherwise.
 
         """
-        for problem_set in self.problem_sets:
-            for ps_tutorial in problem_set:
-                if ps_tutorial == tutorial:
-                    return problem_set
-
-        return None
+        return self._problem_sets.get(tutorial)
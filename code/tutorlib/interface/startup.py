@@ -0,0 +1,126 @@
+"""
+Background startup phases.
+
+Checking for updates and logging in all require network requests, which are
+independent of each other and of showing the main window.  Running them
+concurrently in the background means that the window can be shown straight
+away, and that startup takes only as long as the slowest request.
+
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+
+# the standard startup phases (see MyPyTutor.main)
+VERSION_PHASE = 'version'
+TUTORIALS_PHASE = 'tutorials'
+CREDENTIALS_PHASE = 'credentials'
+
+
+class StartupPipeline():
+    """
+    Runs independent startup phases concurrently in background threads.
+
+    Each phase is a function, identified by name.  Results are delivered by
+    callback (on a background thread), or can be waited for.
+
+    """
+    def __init__(self, max_workers=3):
+        """
+        Initialise a new StartupPipeline object.
+
+        Args:
+          max_workers (int, optional): The maximum number of phases to run at
+              once.  Defaults to 3.
+
+        """
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._futures = {}
+
+    def start(self, name, f, *args, **kwargs):
+        """
+        Start running the given phase in the background.
+
+        Args:
+          name (str): The name of the phase.
+          f (function): The function to call.  Any other arguments are passed
+              to this function.
+
+        """
+        assert name not in self._futures, \
+            'Phase {} has already been started'.format(name)
+        self._futures[name] = self._executor.submit(f, *args, **kwargs)
+
+    def has_phase(self, name):
+        """
+        Return whether the given phase has been started.
+
+        """
+        return name in self._futures
+
+    def is_done(self, name):
+        """
+        Return whether the given phase has finished (or was never started).
+
+        """
+        future = self._futures.get(name)
+        return future is None or future.done()
+
+    def wait(self, name):
+        """
+        Block until the given phase has finished.
+
+        If the phase was never started, return immediately.
+
+        """
+        future = self._futures.get(name)
+        if future is not None:
+            future.exception()  # waits, but does not raise
+
+    def result(self, name):
+        """
+        Return the result of the given phase, if it has finished.
+
+        If the phase has not finished, raised an exception, or was never
+        started, return None.
+
+        """
+        future = self._futures.get(name)
+        if future is None or not future.done() or future.cancelled() \
+                or future.exception() is not None:
+            return None
+        return future.result()
+
+    def when_done(self, name, callback):
+        """
+        Call the given callback with the result of the given phase, once it
+        has finished.
+
+        The callback may be called on a background thread, so it must not make
+        any UI calls directly.  If the phase raised an exception, or was never
+        started, the callback is called with None.
+
+        Args:
+          name (str): The name of the phase.
+          callback ((object) -> None): The function to call with the result.
+
+        """
+        future = self._futures.get(name)
+        if future is None:
+            callback(None)
+            return
+
+        def _done(future):
+            if future.cancelled() or future.exception() is not None:
+                callback(None)
+            else:
+                callback(future.result())
+
+        future.add_done_callback(_done)
+
+    def shutdown(self, wait=True):
+        """
+        Stop accepting new phases, optionally waiting for running phases to
+        finish.
+
+        """
+        self._executor.shutdown(wait=wait)
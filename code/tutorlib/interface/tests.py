@@ -1,21 +1,28 @@
 from tutorlib.interface.alarm import Alarm
 from tutorlib.interface.tutorial import Tutorial
+from tutorlib.interface.workers import WorkerPoolError
+from tutorlib.testing.submission import PreparedSubmission
 from tutorlib.testing.tester import TutorialTester
 
 
-def run_tests(tutorial, text):
+def run_tests(tutorial, text, pool=None):
     """
     Run the tests for the given tutorial.
 
     Testing and analysis will only be performed if no compilation errors were
     encountered when executing the student's code.
 
-    This function uses an Alarm object to prevent infinite loops from causing
-    MyPyTutor to hang.
+    If a TestWorkerPool is given, the tests are run in one of its worker
+    processes, which is killed if the tests time out.  Otherwise (or if the
+    pool cannot run the tests), the tests are run in this process, and an
+    Alarm object is used to prevent infinite loops from causing MyPyTutor to
+    hang.
 
     Args:
       tutorial (Tutorial): The tutorial to run the tests for.
       text (str): The student's code.
+      pool (TestWorkerPool, optional): The worker pool to run the tests in.
+          Defaults to None.
 
     Returns:
       A three-element tuple.
@@ -52,16 +59,31 @@ def run_tests(tutorial, text):
     # no such errors
     # note that we may have an error with no line information (this will be
     # the case with a NameError, for example)
+    # the code is parsed and compiled (at most) once, and shared by both the
+    # analyser and the tester
     analyser = tutorial.analyser
     tester = TutorialTester(tutorial.test_classes, lcls)
+    submission = PreparedSubmission(text, tutorial.wrap_student_code)
 
-    error_line = analyser.check_for_errors(text)
+    error_line = analyser.check_for_errors(submission)
     if error_line is not None:
         return tester, analyser, error_line
 
     if not analyser.errors:
         # there were no errors, so it's safe to perform the analysis
-        analyser.analyse(text)
+        analyser.analyse(submission)
+
+    # run the tests in a worker process, if we can
+    # any tests which do not complete will keep their NOT_RUN result
+    if pool is not None:
+        try:
+            results, _ = pool.run(tutorial, submission)
+        except WorkerPoolError:
+            pass  # fall back to running the tests here
+        else:
+            for index, result in results:
+                tester.set_result(index, result)
+            return tester, analyser, None
 
     # set up our timeout alarm
     alarm = Alarm(tutorial.timeout)
@@ -70,7 +92,7 @@ def run_tests(tutorial, text):
 
     # we can always run the tests no matter what
     try:
-        tester.run(text, tutorial.wrap_student_code)
+        tester.run(submission)
     except KeyboardInterrupt:
         pass  # we're going to ignore this for now
     finally:
@@ -1,11 +1,15 @@
 import ast
+from contextlib import contextmanager
 from hashlib import sha512
 import os
 import datetime
+import threading
 
 from tutorlib.analysis.analyser import CodeAnalyser
 from tutorlib.analysis.visitor import TutorialNodeVisitor
 from tutorlib.testing.cases import StudentTestCase
+from tutorlib.utils.code_cache import CodeCache
+from tutorlib.utils.hash_cache import get_hash_cache
 
 # keep PEP8 happy
 # these imports are indirectly used in Tutorial, and must not be removed
@@ -15,7 +19,7 @@ TutorialNodeVisitor = TutorialNodeVisitor
 StudentTestCase = StudentTestCase
 
 
-def exec_module(path, gbls=None, lcls=None):
+def exec_module(path, gbls=None, lcls=None, code_cache=None):
     """
     Execute the module at the given path using the provided globals and locals
 
@@ -48,6 +52,9 @@ def exec_module(path, gbls=None, lcls=None):
       lcls (dict, optional): The locals dictionary to use.  Defaults to None.
           If both gbls and lcls are None, then lcls will not be initialised at
           all; exec will be run with just a single argument.
+      code_cache (CodeCache, optional): The cache to get the compiled module
+          from.  Defaults to None, in which case the module will be compiled
+          from source.
 
     Returns:
       The globals and locals dictionaries, as updated by executing the module.
@@ -92,11 +99,16 @@ def exec_module(path, gbls=None, lcls=None):
     if gbls is None:
         gbls = {}
 
-    with open(path) as f:
-        if lcls is None:
-            exec(compile(f.read(), path, 'exec'), gbls)
-        else:
-            exec(compile(f.read(), path, 'exec'), gbls, lcls)
+    if code_cache is not None:
+        code = code_cache.compile(path)
+    else:
+        with open(path) as f:
+            code = compile(f.read(), path, 'exec')
+
+    if lcls is None:
+        exec(code, gbls)
+    else:
+        exec(code, gbls, lcls)
 
     if lcls is None:
         lcls = gbls
@@ -125,6 +137,12 @@ class Tutorial():
       FILES ([constant]): A list of all files, other than modules, in the
           tutorial package.
 
+      CODE_CACHE_DIRECTORY (str): The directory to store compiled submodules
+          in between sessions.  Defaults to None, which disables the on-disk
+          cache (compiled submodules are still cached in memory).
+      HASH_CACHE_FILE (str): The file to persist tutorial hashes in between
+          sessions.  Defaults to None, which disables the on-disk cache.
+
       TESTS_VARIABLE_NAME (constant): The name of the variable declared in
           TESTS_MODULE which will contain a list of test classes to use.
       ANALYSIS_VARIABLE_NAME (constant): The name of the variable decalred in
@@ -163,10 +181,13 @@ class Tutorial():
         DESCRIPTION_FILE,
     ]
 
+    CODE_CACHE_DIRECTORY = None
+    HASH_CACHE_FILE = None
+
     TESTS_VARIABLE_NAME = 'TEST_CLASSES'
     ANALYSIS_VARIABLE_NAME = 'ANALYSER'
 
-    def __init__(self, name, tutorial_path, answer_path):
+    def __init__(self, name, tutorial_path, answer_path, lazy=False):
         """
         Initialise a new Tutorial object.
 
@@ -176,28 +197,96 @@ class Tutorial():
               directory).  This must exist and contain the correct files.
           answer_path (str): The path to the student's answer (on the local
               disk).  This need not exist yet.
+          lazy (bool, optional): Whether to defer reading the description and
+              config file until they are first needed (or until load is
+              called).  Defaults to False.
 
         """
         self.name = name
         self.tutorial_path = tutorial_path
         self.answer_path = answer_path
 
-        # load the description
-        self.description = self.read_file(Tutorial.DESCRIPTION_FILE)
-
-        # parse the config file
-        _, config_lcls = self.exec_submodule(Tutorial.CONFIG_MODULE)
-
-        self.short_description = config_lcls.get('SHORT_DESCRIPTION', '')
-        self.wrap_student_code = config_lcls.get('WRAP_STUDENT_CODE', False)
-        self.timeout = config_lcls.get('TIMEOUT', 1)
-
-        self.hints = config_lcls.get('HINTS', [])
+        # compiled submodules, so that re-running (eg) the tests only requires
+        # executing the cached code object
+        self._code_cache = CodeCache(Tutorial.CODE_CACHE_DIRECTORY)
 
         # initial values for lazy properties
         self._hash = None
         self._preload_code_text = None
 
+        self._loaded = False
+        self._load_lock = threading.Lock()
+
+        if lazy:
+            assert os.path.isdir(tutorial_path), \
+                'No tutorial directory found at {}'.format(tutorial_path)
+        else:
+            self.load()
+
+    def load(self):
+        """
+        Load the tutorial description and config file.
+
+        This is done automatically on first access to any of the attributes
+        which depend on them, so it is only necessary to call this directly
+        in order to load the tutorial ahead of time (eg, in the background).
+
+        If the tutorial has already been loaded, do nothing.
+
+        """
+        with self._load_lock:
+            if self._loaded:
+                return
+
+            # load the description
+            self._description = self.read_file(Tutorial.DESCRIPTION_FILE)
+
+            # parse the config file
+            _, config_lcls = self.exec_submodule(Tutorial.CONFIG_MODULE)
+
+            self._short_description = config_lcls.get('SHORT_DESCRIPTION', '')
+            self._wrap_student_code = config_lcls.get(
+                'WRAP_STUDENT_CODE', False
+            )
+            self._timeout = config_lcls.get('TIMEOUT', 1)
+
+            self._hints = config_lcls.get('HINTS', [])
+
+            self._loaded = True
+
+    @property
+    def is_loaded(self):
+        """
+        Return whether the tutorial description and config have been loaded.
+
+        """
+        return self._loaded
+
+    @property
+    def description(self):
+        self.load()
+        return self._description
+
+    @property
+    def short_description(self):
+        self.load()
+        return self._short_description
+
+    @property
+    def wrap_student_code(self):
+        self.load()
+        return self._wrap_student_code
+
+    @property
+    def timeout(self):
+        self.load()
+        return self._timeout
+
+    @property
+    def hints(self):
+        self.load()
+        return self._hints
+
     def _get_answer_hash(self):
         """
         Return the hash of the local answer file.
@@ -261,24 +350,79 @@ class Tutorial():
 
         Each required submodule and file must actually exist.
 
+        If HASH_CACHE_FILE is set, the hash is taken from there if none of the
+        files have changed (as determined by their sizes and modification
+        times), and is otherwise added to it.
+
         Returns:
           A sha512 hash of the tutorial problem, according to the above rules.
 
         """
-        if self._hash is None:
-            hash_obj = sha512()
+        if self._hash is not None:
+            return self._hash
+
+        cache = None
+        if Tutorial.HASH_CACHE_FILE is not None:
+            cache = get_hash_cache(Tutorial.HASH_CACHE_FILE)
+            key = os.path.abspath(self.tutorial_path)
+            signature = self._get_hash_signature()
+
+            self._hash = cache.get(key, signature)
+            if self._hash is not None:
+                return self._hash
+
+        hash_obj = sha512()
 
-            for module_name in self.SUBMODULES:
-                text = self.read_submodule(module_name).encode('utf8')
-                hash_obj.update(text)
+        for module_name in self.SUBMODULES:
+            text = self.read_submodule(module_name).encode('utf8')
+            hash_obj.update(text)
 
-            for file_name in self.FILES:
-                text = self.read_file(file_name).encode('utf8')
-                hash_obj.update(text)
+        for file_name in self.FILES:
+            text = self.read_file(file_name).encode('utf8')
+            hash_obj.update(text)
+
+        self._hash = hash_obj.digest()
+
+        if cache is not None:
+            cache.put(key, signature, self._hash)
 
-            self._hash = hash_obj.digest()
         return self._hash
 
+    def _get_hash_signature(self):
+        """
+        Return the signature of the files which make up the tutorial hash.
+
+        Returns:
+          A list of [filename, size, mtime] lists, with the mtime in
+          nanoseconds.
+
+        """
+        signature = []
+
+        for file_name in self.SUBMODULES + self.FILES:
+            st = os.stat(os.path.join(self.tutorial_path, file_name))
+            signature.append([file_name, st.st_size, st.st_mtime_ns])
+
+        return signature
+
+    @staticmethod
+    @contextmanager
+    def batch_hashes():
+        """
+        Return a context manager which defers writing any hashes computed
+        inside it to HASH_CACHE_FILE until it exits.
+
+        Use this when hashing many tutorials, so that the cache file is only
+        written once, rather than once per tutorial.
+
+        """
+        if Tutorial.HASH_CACHE_FILE is None:
+            yield
+            return
+
+        with get_hash_cache(Tutorial.HASH_CACHE_FILE).deferred_save():
+            yield
+
     def _assert_valid_file(self, file_name):
         """
         Assert that the given filename exists in the tutorial package.
@@ -333,7 +477,9 @@ class Tutorial():
         self._assert_valid_module(module_name)
         path = os.path.join(self.tutorial_path, module_name)
 
-        return exec_module(path, gbls=gbls, lcls=lcls)
+        return exec_module(
+            path, gbls=gbls, lcls=lcls, code_cache=self._code_cache
+        )
 
     def read_submodule(self, module_name):
         """
@@ -381,7 +527,8 @@ class Tutorial():
         student's code.
 
         The result of this property is not cached, and new (distinct) class
-        objects will be returned on successive calls.
+        objects will be returned on successive calls.  (The compiled module is
+        cached, however, so only executing the module is repeated.)
 
         The subclasses are found by executing the TESTS_MODULE, and reading out
         the appropriate variable from the resulting locals dictionary.
@@ -413,7 +560,8 @@ class Tutorial():
         student's code.
 
         The result of this property is not cached, and a new CodeAnalyser
-        instance will be returned on each successive call.
+        instance will be returned on each successive call.  (The compiled
+        module is cached, however, so only executing the module is repeated.)
 
         The analyser is found by executing the ANALYSIS_MODULE, and reading out
         the appropraite variable from the resulting locals dictionary.
@@ -3,9 +3,10 @@ import json
 import urllib.parse
 import webbrowser
 
+from tutorlib.config.shared import DOWNLOAD_CACHE_DIRECTORY
 from tutorlib.online.exceptions import AuthError, RequestError, NullResponse
 from tutorlib.online.session import SessionManager
-from tutorlib.utils.tmp import retrieve
+from tutorlib.utils.download_cache import get_download_cache
 
 
 HELP_URL = 'http://csse1001.uqcloud.net/mpt3/help'
@@ -53,6 +54,13 @@ class WebAPI():
       LATE_OK (constant): The server indicated that the action or request was
           late, but the user has been permitted to complete this action late.
       MISSING (constant): The relevant submission is missing.
+      SYNC_NONE (constant): The local and server copies of an answer are
+          already in sync.
+      SYNC_UPLOAD (constant): The local copy of an answer should be uploaded.
+      SYNC_DOWNLOAD (constant): The server copy of an answer should be
+          downloaded.
+      BULK_SYNC (constant): The server supports the bulk sync protocol
+          (see get_capabilities).
 
     Attributes:
       session_manager (SessionManager): The underlying session manager.
@@ -65,6 +73,14 @@ class WebAPI():
 
     RESPONSES = {OK, LATE, LATE_OK, MISSING}
 
+    SYNC_NONE = 'none'
+    SYNC_UPLOAD = 'upload'
+    SYNC_DOWNLOAD = 'download'
+
+    SYNC_ACTIONS = {SYNC_NONE, SYNC_UPLOAD, SYNC_DOWNLOAD}
+
+    BULK_SYNC = 'bulk_sync'
+
     def __init__(self, listener=None):
         """
         Initialise a new WebAPI object.
@@ -266,6 +282,9 @@ class WebAPI():
         """
         Download the object at the given URL to the given filename.
 
+        Downloads are cached, so if the object has not changed on the server
+        since it was last downloaded, the cached copy is used instead.
+
         Args:
           url (str): The url to download.
           filename (str, optional): The filename to download to.  Defaults to
@@ -280,8 +299,8 @@ class WebAPI():
 
         """
         try:
-            filename = retrieve(url, filename=filename)
-            return filename
+            cache = get_download_cache(DOWNLOAD_CACHE_DIRECTORY)
+            return cache.retrieve(url, filename=filename)
         except Exception as e:
             raise WebAPIError(
                 message='Could Not Download File',
@@ -321,6 +340,44 @@ class WebAPI():
         result = self._get(values, require_login=False)
         return self._download(result.strip())
 
+    def get_tutorials_manifest(self):
+        """
+        Get the manifest of the per-tutorial update archives on the server.
+
+        Returns:
+          The manifest, as a dictionary (see tutorlib.online.updates).
+
+        Raises:
+          WebAPIError: If the request fails, or the response is not valid JSON.
+
+        """
+        values = {
+            'action': 'get_tut_manifest',
+        }
+
+        result = self._get(values, require_login=False)
+        return self._loads(result)
+
+    def get_tutorial_archive(self, manifest, directory):
+        """
+        Download the update archive for a single tutorial from the server.
+
+        Args:
+          manifest (dict): The manifest returned by get_tutorials_manifest.
+          directory (str): The directory name of the tutorial.
+
+        Returns:
+          The path to the zip file.
+
+        Raises:
+          WebAPIError: If any exception is encountered in the download process.
+
+        """
+        url = urllib.parse.urljoin(
+            manifest['url'], urllib.parse.quote('{}.zip'.format(directory))
+        )
+        return self._download(url)
+
     def get_mpt_zipfile(self):
         """
         Download the MyPyTutor Python 3.5 zip file from the server.
@@ -355,6 +412,31 @@ class WebAPI():
         }
         return self._get(values, require_login=False)
 
+    def get_capabilities(self):
+        """
+        Get the optional protocol features which the server supports.
+
+        Older servers do not advertise any features, so a feature should only
+        be used if it is listed here.
+
+        Returns:
+          A set of the supported features (eg, WebAPI.BULK_SYNC).
+
+        Raises:
+          WebAPIError: If the request fails.
+
+        """
+        values = {
+            'action': 'get_version',
+            'capabilities': 1,
+        }
+        response = self._get(values, require_login=False)
+        if response is None:
+            return set()
+
+        # the first word is the version
+        return set(response.split()[1:])
+
     def upload_answer(self, tutorial, problem_set, tutorial_package, code):
         """
         Upload the given code as the student's answer for the given tutorial
@@ -469,6 +551,138 @@ class WebAPI():
 
         return answer_hash, timestamp
 
+    def _loads(self, response):
+        """
+        Decode the given JSON response.
+
+        Raises:
+          WebAPIError: If the response is not valid JSON.
+
+        """
+        try:
+            return json.loads(response)
+        except (TypeError, ValueError):
+            raise WebAPIError(
+                message='Invalid Response',
+                details='Could not decode response: {}'.format(response),
+            )  # do not explicitly chain -- not independently useful to caller
+
+    def sync_answers(self, tutorial_package, manifest):
+        """
+        Compare the given local answers against the server copies, in a
+        single request.
+
+        The server copy of each answer which is newer on the server is
+        returned as part of the response.
+
+        Args:
+          tutorial_package (TutorialPackage): The tutorial package which
+              contains the answers.
+          manifest ([(ProblemSet, Tutorial, bytes, float)]): The problem set,
+              tutorial, local answer hash (as returned by Tutorial.answer_info)
+              and local modification time of each answer.  The hash and
+              modification time should be None if there is no local answer.
+
+        Returns:
+          A list of (problem_set_name, tutorial_name, action, code) tuples.
+
+          The action will be one of WebAPI.SYNC_ACTIONS.  The code will be the
+          server copy of the answer if the action is WebAPI.SYNC_DOWNLOAD, and
+          None otherwise.
+
+        The server must support WebAPI.BULK_SYNC (see get_capabilities).
+
+        Raises:
+          WebAPIError: If the request fails, or if the response is not
+              valid.
+
+        """
+        entries = []
+        for problem_set, tutorial, answer_hash, mtime in manifest:
+            if answer_hash is not None:
+                answer_hash = base64.b32encode(answer_hash).decode('ascii')
+
+            entries.append({
+                'problem_set_name': problem_set.name,
+                'tutorial_name': tutorial.name,
+                'hash': answer_hash,
+                'timestamp': mtime,
+            })
+
+        values = {
+            'action': 'sync_answers',
+            'tutorial_package_name': tutorial_package.name,
+            'manifest': json.dumps(entries),
+        }
+        response = self._post(values)
+
+        try:
+            results = [
+                (d['problem_set_name'], d['tutorial_name'], d['action'],
+                 d.get('code'))
+                for d in self._loads(response)
+            ]
+        except (KeyError, TypeError):
+            raise WebAPIError(
+                message='Invalid Response',
+                details='Missing keys on response: {}'.format(response),
+            )  # do not explicitly chain -- not independently useful to caller
+
+        for _, _, action, _ in results:
+            if action not in WebAPI.SYNC_ACTIONS:
+                raise WebAPIError(
+                    message='Invalid Response',
+                    details='Unknown sync action: {}'.format(action),
+                )
+
+        return results
+
+    def upload_answers(self, tutorial_package, answers):
+        """
+        Upload the given code as the student's answers for the given
+        tutorials, in a single request.
+
+        Args:
+          tutorial_package (TutorialPackage): The tutorial package which
+              contains the answers.
+          answers ([(ProblemSet, Tutorial, str)]): The problem set, tutorial
+              and code of each answer to upload.
+
+        Returns:
+          A list of bools, indicating whether each upload was successful.
+
+        The server must support WebAPI.BULK_SYNC (see get_capabilities).
+
+        Raises:
+          WebAPIError: If the request fails, or if the response is not
+              valid.
+
+        """
+        entries = [
+            {
+                'problem_set_name': problem_set.name,
+                'tutorial_name': tutorial.name,
+                'code': code,
+            }
+            for problem_set, tutorial, code in answers
+        ]
+
+        values = {
+            'action': 'upload_answers',
+            'tutorial_package_name': tutorial_package.name,
+            'answers': json.dumps(entries),
+        }
+        response = self._post(values)
+
+        results = self._loads(response)
+        if not isinstance(results, list) or len(results) != len(answers):
+            raise WebAPIError(
+                message='Invalid Response',
+                details='Unexpected response: {}'.format(response),
+            )
+
+        return [bool(result) for result in results]
+
     def submit_answer(self, tutorial, code, num_attempts):
         """
         Submit the given code as the student's answer for the given tutorial.
@@ -0,0 +1,485 @@
+"""
+A pool of worker processes for testing student code.
+
+Running the tests in the GUI process relies on Alarm (which interrupts the
+main thread) to stop runaway student code.  That does not work for loops in
+C code, or for student code which catches KeyboardInterrupt.  Running the
+tests in a separate process means that we can always kill it instead.
+
+Workers are started ahead of time, and tutorials can be preloaded into them,
+so that a test run only needs to send the student's code to an idle worker.
+
+The static analysis is cheap and cannot run student code, so it is still
+performed in the GUI process (see run_tests).
+
+"""
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import traceback
+
+from tutorlib.interface.tutorial import Tutorial
+from tutorlib.testing.cases import prepare_test_functions
+from tutorlib.testing.results import TutorialTestResult
+from tutorlib.testing.submission import PreparedSubmission
+from tutorlib.testing.tester import TutorialTester
+
+try:
+    import resource
+except ImportError:
+    resource = None  # not available on Windows
+
+
+# the number of worker processes to keep running
+NUM_WORKERS = 2
+
+# the maximum address space of each worker process, in bytes
+# this is only enforced where the resource module is available
+MEMORY_LIMIT = 512*1024*1024
+
+# how long to wait for a worker to start on a request, in seconds
+# the clock restarts whenever the worker finishes preloading a tutorial, so
+# this only needs to cover starting the process and loading one tutorial
+START_TIMEOUT = 10.0
+
+# extra time to allow on top of the tutorial's own timeout, in seconds
+TIMEOUT_GRACE = 0.5
+
+# how a test run in a worker ended (see TestWorkerPool.run)
+COMPLETED = 'completed'
+TIMED_OUT = 'timed_out'
+CRASHED = 'crashed'
+
+
+class WorkerPoolError(Exception):
+    """
+    An error encountered in running tests in a worker process.
+
+    This indicates that the tests could not be run in a worker at all (as
+    opposed to the student's code timing out or crashing the worker).
+
+    """
+    pass
+
+
+class WorkerTestError(WorkerPoolError):
+    """
+    An error reported by a worker process which could not run the tests (eg,
+    because the tutorial could not be loaded).
+
+    The worker caught the error itself, so it is still usable.
+
+    """
+    pass
+
+
+def _tutorial_args(tutorial):
+    """
+    Return the arguments needed to recreate the given tutorial in a worker.
+
+    """
+    return tutorial.name, tutorial.tutorial_path, tutorial.answer_path
+
+
+def _set_memory_limit(memory_limit):
+    """
+    Limit the address space of the current process, if possible.
+
+    """
+    if resource is None or memory_limit is None:
+        return
+
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    except (ValueError, OSError):
+        pass  # not supported on this platform (eg, some versions of OS X)
+
+
+def _worker_main(connection, code_cache_dir, memory_limit):
+    """
+    The main loop of a worker process.
+
+    Requests are (command, args) tuples.  The commands are:
+      'preload' -- load each of the given tutorials, ready to be tested,
+                   sending back ('ready', None) as each is loaded
+      'run' -- test the given code, sending back ('started', None), then a
+               ('result', (index, serialised result)) for each test, and
+               finally either ('done', None) or ('error', traceback)
+      'close' -- exit
+
+    Args:
+      connection (Connection): The connection to the parent process.
+      code_cache_dir (str): The directory to store compiled tutorial
+          submodules in, or None.
+      memory_limit (int): The maximum address space of this process, in
+          bytes, or None.
+
+    """
+    _set_memory_limit(memory_limit)
+    Tutorial.CODE_CACHE_DIRECTORY = code_cache_dir
+
+    tutorials = {}
+
+    def get_tutorial(name, tutorial_path, answer_path):
+        tutorial = tutorials.get(tutorial_path)
+        if tutorial is None:
+            tutorial = Tutorial(name, tutorial_path, answer_path)
+            tutorials[tutorial_path] = tutorial
+        return tutorial
+
+    def send_result(index, result):
+        connection.send(('result', (index, result.serialise())))
+
+    while True:
+        try:
+            command, args = connection.recv()
+        except (EOFError, OSError):
+            return  # parent has gone away
+
+        if command == 'close':
+            return
+
+        if command == 'preload':
+            for tutorial_args in args:
+                try:
+                    # compile (and cache) the submodules we'll be executing,
+                    # and the test functions which will be run
+                    tutorial = get_tutorial(*tutorial_args)
+                    prepare_test_functions(tutorial.test_classes)
+                except Exception:
+                    pass  # any problem will be reported when it is run
+
+                connection.send(('ready', None))
+        elif command == 'run':
+            tutorial_args, code_text = args
+            connection.send(('started', None))
+
+            try:
+                tutorial = get_tutorial(*tutorial_args)
+
+                lcls = {}
+                tutorial.exec_submodule(Tutorial.SUPPORT_MODULE, lcls, None)
+
+                submission = PreparedSubmission(
+                    code_text, tutorial.wrap_student_code
+                )
+                tester = TutorialTester(tutorial.test_classes, lcls)
+                tester.run(submission, listener=send_result)
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+            else:
+                connection.send(('done', None))
+
+
+def _kill_process(process):
+    """
+    Forcibly stop the given process, and wait for it to exit.
+
+    SIGTERM can be caught by student code, so use SIGKILL where we can.
+
+    """
+    if process.is_alive():
+        try:
+            if hasattr(signal, 'SIGKILL'):
+                os.kill(process.pid, signal.SIGKILL)
+            else:
+                process.terminate()
+        except (OSError, AttributeError):
+            pass  # already exited
+    process.join()
+
+
+class _Worker():
+    """
+    A handle to a single worker process.
+
+    Attributes:
+      connection (Connection): The connection to the worker process.
+      process (Process): The worker process.
+
+    """
+    def __init__(self, context, code_cache_dir, memory_limit):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_connection, code_cache_dir, memory_limit),
+            daemon=True,
+        )
+        self.process.start()
+
+        # only the child should hold its end of the pipe, so that we get an
+        # EOFError if it exits
+        child_connection.close()
+
+    def send(self, command, args=None):
+        """
+        Send the given request to the worker.
+
+        Raises:
+          WorkerPoolError: If the worker has exited.
+
+        """
+        try:
+            self.connection.send((command, args))
+        except (OSError, ValueError) as e:
+            raise WorkerPoolError('Worker process has exited') from e
+
+    def run(self, tutorial, submission, timeout):
+        """
+        Test the given code for the given tutorial in this worker.
+
+        Code objects cannot be sent to another process, so only the text of
+        the submission is sent; the worker compiles it once for all tests.
+
+        Args:
+          tutorial (Tutorial): The tutorial to run the tests for.
+          submission (PreparedSubmission): The student's code.
+          timeout (float): The maximum time the tests may take, in seconds.
+
+        Returns:
+          A two-element tuple.
+
+          The first element is a list of (index, TutorialTestResult) tuples,
+          for each test which completed.
+
+          The second element is how the run ended: one of COMPLETED,
+          TIMED_OUT or CRASHED.  Unless all of the tests completed, the worker
+          must be killed.
+
+        Raises:
+          WorkerTestError: If the worker could not run the tests.  The worker
+              is still usable.
+          WorkerPoolError: If the worker could not start the tests.
+
+        """
+        self.send('run', (_tutorial_args(tutorial), submission.text))
+
+        # the worker first finishes any preloading it has been asked to do
+        # we only give up if it stops making progress on that
+        kind = None
+        try:
+            while kind != 'started':
+                if not self.connection.poll(START_TIMEOUT):
+                    raise WorkerPoolError('Worker process did not respond')
+                kind, _ = self.connection.recv()
+        except (EOFError, OSError) as e:
+            raise WorkerPoolError('Worker process has exited') from e
+
+        deadline = time.monotonic() + timeout
+        results = []
+
+        while True:
+            remaining = deadline - time.monotonic()
+
+            try:
+                if remaining <= 0 or not self.connection.poll(remaining):
+                    return results, TIMED_OUT
+                kind, data = self.connection.recv()
+            except (EOFError, OSError):
+                return results, CRASHED  # student code killed the worker
+
+            if kind == 'result':
+                index, result = data
+                results.append(
+                    (index, TutorialTestResult.deserialise(result))
+                )
+            elif kind == 'done':
+                return results, COMPLETED
+            elif kind == 'error':
+                raise WorkerTestError(data)
+
+    def kill(self):
+        """
+        Forcibly stop the worker.
+
+        """
+        _kill_process(self.process)
+        self.connection.close()
+
+    def close(self):
+        """
+        Ask the worker to exit, killing it if it does not do so promptly.
+
+        """
+        try:
+            self.send('close')
+        except WorkerPoolError:
+            pass
+
+        self.process.join(1)
+        self.kill()
+
+
+class TestWorkerPool():
+    """
+    A pool of worker processes for running tests on student code.
+
+    Attributes:
+      num_workers (int): The number of worker processes to keep running.
+      memory_limit (int): The maximum address space of each worker, in bytes,
+          or None for no limit.
+      code_cache_dir (str): The directory for workers to store compiled
+          tutorial submodules in, or None.
+
+    """
+    def __init__(self, num_workers=NUM_WORKERS, memory_limit=MEMORY_LIMIT,
+            code_cache_dir=None):
+        """
+        Initialise a new TestWorkerPool object.
+
+        No processes are started until start (or run) is called.
+
+        Args:
+          num_workers (int, optional): The number of worker processes to keep
+              running.  Defaults to NUM_WORKERS.
+          memory_limit (int, optional): The maximum address space of each
+              worker, in bytes.  Defaults to MEMORY_LIMIT.
+          code_cache_dir (str, optional): The directory for workers to store
+              compiled tutorial submodules in.  Defaults to None.
+
+        """
+        self.num_workers = num_workers
+        self.memory_limit = memory_limit
+        self.code_cache_dir = code_cache_dir
+
+        # use spawn everywhere: forking a process with Tk running is unsafe
+        self._context = multiprocessing.get_context('spawn')
+
+        self._lock = threading.Lock()
+        self._idle = queue.Queue()
+        self._workers = []
+        self._preload = []
+        self._started = False
+
+    def _spawn(self):
+        """
+        Start a new worker, preload it, and mark it as idle.
+
+        This must be called with the lock held.
+
+        """
+        worker = _Worker(
+            self._context, self.code_cache_dir, self.memory_limit
+        )
+        if self._preload:
+            worker.send('preload', self._preload)
+
+        self._workers.append(worker)
+        self._idle.put(worker)
+
+    def _replace(self, worker):
+        """
+        Kill the given worker, and start a new one in its place.
+
+        """
+        worker.kill()
+
+        with self._lock:
+            self._workers.remove(worker)
+            if self._started:
+                self._spawn()
+
+    def start(self):
+        """
+        Start the worker processes.
+
+        If the pool has already been started, do nothing.
+
+        """
+        with self._lock:
+            if self._started:
+                return
+
+            self._started = True
+            for _ in range(self.num_workers):
+                self._spawn()
+
+    def preload(self, tutorials):
+        """
+        Load the given tutorials into every worker, so that they are ready to
+        be tested without any further setup.
+
+        This replaces any previously preloaded tutorials.
+
+        Args:
+          tutorials ([Tutorial]): The tutorials to preload.
+
+        """
+        with self._lock:
+            self._preload = [_tutorial_args(t) for t in tutorials]
+
+            # requests are handled in order, so it's safe to send this to
+            # workers which are busy
+            for worker in self._workers:
+                try:
+                    worker.send('preload', self._preload)
+                except WorkerPoolError:
+                    pass  # will be replaced when it is next used
+
+    def run(self, tutorial, submission):
+        """
+        Run the tests for the given tutorial on the given code.
+
+        This will block until a worker is free, and then until the tests have
+        completed or the tutorial's timeout (plus TIMEOUT_GRACE) has passed.
+        If the tests time out, or the worker stops responding, the worker is
+        killed and replaced.
+
+        Args:
+          tutorial (Tutorial): The tutorial to run the tests for.
+          submission (PreparedSubmission): The student's code.
+
+        Returns:
+          A two-element tuple.
+
+          The first element is a list of (index, TutorialTestResult) tuples,
+          for each test which completed.  The index is the index of the test
+          class in the tutorial's test_classes.
+
+          The second element is how the run ended: COMPLETED if every test
+          completed, TIMED_OUT if the tests took too long, or CRASHED if the
+          worker exited (eg, because the student's code killed it).
+
+        Raises:
+          WorkerTestError: If the worker could not run the tests.
+          WorkerPoolError: If the tests could not be run in a worker.
+
+        """
+        self.start()
+
+        worker = self._idle.get()
+
+        try:
+            results, status = worker.run(
+                tutorial, submission, tutorial.timeout + TIMEOUT_GRACE
+            )
+        except WorkerTestError:
+            # the worker caught the error, so there's no need to replace it
+            self._idle.put(worker)
+            raise
+        except WorkerPoolError:
+            self._replace(worker)
+            raise
+
+        if status == COMPLETED:
+            self._idle.put(worker)
+        else:
+            self._replace(worker)
+
+        return results, status
+
+    def close(self):
+        """
+        Stop all of the worker processes.
+
+        """
+        with self._lock:
+            self._started = False
+            workers, self._workers = self._workers, []
+            self._idle = queue.Queue()
+
+        for worker in workers:
+            worker.close()
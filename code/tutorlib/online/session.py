@@ -30,6 +30,7 @@
 import http.cookiejar
 import http.client
 import json
+import socket
 import urllib.parse
 import urllib.request
 
@@ -37,19 +38,32 @@ from tutorlib.gui.dialogs.login import LoginDialog
 import tutorlib.utils.messagebox as tkmessagebox
 from tutorlib.online.exceptions import AuthError, BadResponse, RequestError
 from tutorlib.online.parser import FormParser, strip_header
+from tutorlib.online.transport import GzipProcessor, KeepAliveHandler
 
 
 LOGIN_DOMAIN = 'auth.uq.edu.au'
 LOGOUT_URL = 'http://api.uqcloud.net/logout'
 SERVER = 'http://csse1001.uqcloud.net/cgi-bin/mpt3/mpt_cgi.py'
 
+# how long to wait for the server to respond to a request, in seconds
+TIMEOUT = 30
 
-def make_opener():
-    """Make a URL opener with cookies enabled, and proxies disabled."""
+
+def make_opener(url=SERVER):
+    """Make a URL opener with cookies enabled, and proxies disabled.
+    Connections are kept alive, and reused for later requests to the same
+    host.  Responses are gzipped, as are large request bodies sent to the
+    MyPyTutor server at `url` (other servers, eg for login, will not accept
+    them).  The opener may be used from multiple threads at once.
+    """
     cookiejar = http.cookiejar.CookieJar()
     proxy_handler = urllib.request.ProxyHandler(proxies={})
     cookie_processor = urllib.request.HTTPCookieProcessor(cookiejar=cookiejar)
-    opener = urllib.request.build_opener(cookie_processor, proxy_handler)
+    keep_alive_handler = KeepAliveHandler()
+    gzip_processor = GzipProcessor(hosts=[urllib.parse.urlsplit(url).netloc])
+    opener = urllib.request.build_opener(
+        cookie_processor, proxy_handler, keep_alive_handler, gzip_processor
+    )
     return opener
 
 
@@ -57,19 +71,22 @@ class SessionManager:
     """A class to manage login sessions, as well as sending/receiving data from
     the web server."""
 
-    def __init__(self, url=SERVER, listener=None):
+    def __init__(self, url=SERVER, listener=None, timeout=TIMEOUT):
         """Constructor.
         `url` is the location of the MyPyTutor server.
         `listener` is a callback method. This method will get called when the
         user logs in or out, so that the view can update accordingly.
+        `timeout` is how long to wait for the server to respond to each
+        request, in seconds.
         """
         if listener is None:
             listener = lambda: None
 
         self._url = url
+        self._timeout = timeout
         self._callback = listener
         self._user = None
-        self._opener = make_opener()
+        self._opener = make_opener(url)
 
     def user_info(self):
         return self._user
@@ -168,10 +185,11 @@ class SessionManager:
 
     def _open(self, url, data=None):
         try:
-            return self._opener.open(url, data)
+            return self._opener.open(url, data, self._timeout)
         except AuthError as e:
             raise  # just to indicate that this is a possible error
-        except (http.client.HTTPException, urllib.request.URLError) as e:
+        except (http.client.HTTPException, urllib.request.URLError,
+                socket.timeout) as e:
             raise RequestError(
                 'Connection Error.  '
                 'Check your network connection and try again.'
@@ -198,7 +216,14 @@ class SessionManager:
             # The user needs to log in
             self.login()
             response = self._open(url, data)
-        text = response.read().decode('utf8')
+
+        try:
+            text = response.read().decode('utf8')
+        except (http.client.HTTPException, socket.timeout) as e:
+            raise RequestError(
+                'Connection Error.  '
+                'Check your network connection and try again.'
+            ) from e
         return strip_header(text)
 
     def post(self, data):
@@ -1,10 +1,51 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import time
+
+from tutorlib.interface.web_api import WebAPI, WebAPIError
+
+
+# the maximum number of tutorials to sync at once (when not using bulk sync)
+MAX_WORKERS = 4
+
+# the number of times to try syncing a tutorial before giving up
+MAX_ATTEMPTS = 3
+
+# the delay before retrying a failed sync, in seconds
+# this doubles after each failed attempt
+RETRY_DELAY = 0.5
 
 
 class SyncClient():
-    def __init__(self, web_api):
+    """
+    Synchronises the student's local answers with those on the server.
+
+    Attributes:
+      web_api (WebAPI): The WebAPI instance to use.
+      max_workers (int): The maximum number of tutorials to sync at once.
+      max_attempts (int): The number of times to try syncing each tutorial.
+      retry_delay (float): The delay before the first retry, in seconds.
+
+    """
+    def __init__(self, web_api, max_workers=MAX_WORKERS,
+            max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        """
+        Initialise a new SyncClient object.
+
+        Args:
+          web_api (WebAPI): The WebAPI instance to use.
+          max_workers (int, optional): The maximum number of tutorials to sync
+              at once.  Defaults to MAX_WORKERS.
+          max_attempts (int, optional): The number of times to try syncing
+              each tutorial.  Defaults to MAX_ATTEMPTS.
+          retry_delay (float, optional): The delay before the first retry, in
+              seconds.  Defaults to RETRY_DELAY.
+
+        """
         self.web_api = web_api
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
 
     def download_answer(self, tutorial, tutorial_package):
         """
@@ -96,42 +137,127 @@ class SyncClient():
             tutorial, problem_set, tutorial_package
         )
 
-    def _do_sync(self, tutorial, tutorial_package):
-        def f():
-            remote_hash, remote_mtime = self.get_answer_info(
-                tutorial, tutorial_package
-            )
+    def _sync_tutorial(self, tutorial, tutorial_package):
+        """
+        Synchronise the answer to a single tutorial.
+
+        Returns:
+          Whether the answer was synchronised successfully.
+
+        Raises:
+          WebAPIError: If any request fails.
+
+        """
+        remote_hash, remote_mtime = self.get_answer_info(
+            tutorial, tutorial_package
+        )
+
+        if not tutorial.has_answer:
+            if remote_hash is not None:  # there exists a remote copy
+                return self.download_answer(tutorial, tutorial_package)
+            return True
+
+        local_hash, local_mtime = tutorial.answer_info
+
+        if local_hash == remote_hash:  # no changes
+            return True
+
+        if remote_hash is None or local_mtime >= remote_mtime:
+            return self.upload_answer(tutorial, tutorial_package)
+        else:
+            return self.download_answer(tutorial, tutorial_package)
+
+    def _sync_tutorial_with_retries(self, tutorial, tutorial_package):
+        """
+        Synchronise the answer to a single tutorial, retrying on failure.
+
+        Failed attempts are retried with exponential backoff, up to a total
+        of max_attempts attempts.
+
+        Returns:
+          Whether the answer was synchronised successfully.
+
+        Raises:
+          WebAPIError: If the last attempt fails with a WebAPIError.
+
+        """
+        delay = self.retry_delay
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if self._sync_tutorial(tutorial, tutorial_package):
+                    return True
+            except WebAPIError:
+                if attempt == self.max_attempts:
+                    raise
+
+            if attempt < self.max_attempts:
+                time.sleep(delay)
+                delay *= 2
+
+        return False
+
+    def _synchronise_bulk(self, tutorial_package):
+        """
+        Synchronise the tutorial answers using the bulk sync protocol.
+
+        The server must support WebAPI.BULK_SYNC.
+
+        This makes at most two requests, regardless of the number of tutorials:
+        one to compare every answer (and download those which are newer on the
+        server), and one to upload every answer which is newer locally.
+
+        Args:
+          tutorial_package (TutorialPackage): The tutorial package to sync.
 
-            if not tutorial.has_answer:
-                if remote_hash is not None:  # there exists a remote copy
-                    self.download_answer(tutorial, tutorial_package)
-                return True
+        Returns:
+          Whether every answer was synchronised successfully.
 
-            local_hash, local_mtime = tutorial.answer_info
+        Raises:
+          WebAPIError: If any request fails.
 
-            if local_hash == remote_hash:  # no changes
-                return True
+        """
+        manifest = []
+        tutorials = {}
+
+        for problem_set in tutorial_package.problem_sets:
+            for tutorial in problem_set:
+                local_hash, local_mtime = tutorial.answer_info
+                manifest.append(
+                    (problem_set, tutorial, local_hash, local_mtime)
+                )
+                tutorials[problem_set.name, tutorial.name] \
+                    = problem_set, tutorial
+
+        decisions = self.web_api.sync_answers(tutorial_package, manifest)
+
+        success = True
+        uploads = []
+        for problem_set_name, tutorial_name, action, code in decisions:
+            problem_set, tutorial = tutorials.get(
+                (problem_set_name, tutorial_name), (None, None)
+            )
+            if tutorial is None:
+                continue  # not something we asked about; ignore
 
-            if remote_hash is None or local_mtime >= remote_mtime:
-                success = self.upload_answer(tutorial, tutorial_package)
-            else:
-                success = self.download_answer(tutorial, tutorial_package)
+            if action == WebAPI.SYNC_DOWNLOAD:
+                if code is None:
+                    success = False  # no answer to download after all
+                    continue
 
-            if not success:
-                return False
+                with open(tutorial.answer_path, 'w') as f:
+                    f.write(code)
+            elif action == WebAPI.SYNC_UPLOAD:
+                with open(tutorial.answer_path) as f:
+                    uploads.append((problem_set, tutorial, f.read()))
 
-        def try_repeatedly(f, n=3):
-            def fn():
-                for _ in range(n):
-                    result = f()
-                    if result:
-                        return result
-                return result
-            return fn
+        if not uploads:
+            return success
 
-        return try_repeatedly(f)
+        results = self.web_api.upload_answers(tutorial_package, uploads)
+        return success and all(results)
 
-    def synchronise(self, tutorial_package):
+    def synchronise(self, tutorial_package, progress=None):
         """
         Synchronise the tutorial answers.
 
@@ -145,26 +271,65 @@ class SyncClient():
           * the local and remote answers differ, but the local one was modified
             at the same time as or before the one on the server.
 
+        The bulk sync protocol is used if the server supports it.  Otherwise,
+        each tutorial is synchronised separately, using at most max_workers
+        threads.
+
         This method performs the actual synchronisation.  It does not handle
         any exceptions which may be thrown by the underlying code (ie, it may
         raise WebAPIError).
 
         Args:
           tutorial_package (TutorialPackage): The tutorial package to sync.
+          progress ((int, int) -> None, optional): A callback which will be
+              called with the number of tutorials synchronised so far, and the
+              total number of tutorials.  This will be called from a
+              background thread.  Defaults to None.
+
+        Returns:
+          Whether every answer was synchronised successfully.
 
         """
-        max_workers = len(tutorial_package.problem_sets)
-        with ThreadPoolExecutor(max_workers) as executor:
-            futures = []
+        if progress is None:
+            progress = lambda completed, total: None
+
+        tutorials = [
+            tutorial for problem_set in tutorial_package.problem_sets
+            for tutorial in problem_set
+        ]
+        total = len(tutorials)
+
+        progress(0, total)
 
-            for problem_set in tutorial_package.problem_sets:
-                for tutorial in problem_set:
-                    executor.submit(self._do_sync(tutorial, tutorial_package))
+        if WebAPI.BULK_SYNC in self.web_api.get_capabilities():
+            success = self._synchronise_bulk(tutorial_package)
+            progress(total, total)
+            return success
+
+        max_workers = max(1, min(self.max_workers, total))
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._sync_tutorial_with_retries, tutorial,
+                    tutorial_package,
+                )
+                for tutorial in tutorials
+            ]
 
             success = True
-            for future in as_completed(futures):
-                if not future.result():
+            for completed, future in enumerate(as_completed(futures), 1):
+                try:
+                    result = future.result()
+                except WebAPIError:
+                    # don't start any more work if we're going to fail anyway
+                    for f in futures:
+                        f.cancel()
+                    raise
+
+                if not result:
                     success = False
                     # atm, not breaking out early
 
+                progress(completed, total)
+
         return success
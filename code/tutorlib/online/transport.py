@@ -0,0 +1,360 @@
+"""
+A keep-alive transport for urllib.
+
+The standard urllib handlers open a new connection for every request (and
+explicitly ask the server to close it afterwards).  Talking to the MyPyTutor
+server involves many small requests, so the cost of connecting (and, for
+https, of the TLS handshake) dominates.
+
+KeepAliveHandler replaces the standard http and https handlers, and keeps
+idle connections in a ConnectionPool so that they can be reused by later
+requests to the same host.  Every other part of urllib (cookies, redirects,
+error handling) works exactly as before.
+
+GzipProcessor compresses large request bodies sent to the MyPyTutor server,
+and asks every server to compress its responses.
+
+"""
+import gzip
+import http.client
+import io
+import select
+import socket
+import ssl
+import threading
+import urllib.error
+import urllib.request
+import urllib.response
+import zlib
+
+
+# the maximum number of idle connections to keep open to each host
+MAX_IDLE_PER_HOST = 8
+
+# the minimum size of a request body to compress, in bytes
+# smaller bodies do not compress well enough to be worth it
+COMPRESS_THRESHOLD = 1024
+
+# errors which, on a reused connection, indicate that the server has closed it
+# since it was last used (eg, because the keep-alive timeout expired)
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    ConnectionResetError,
+    BrokenPipeError,
+    ConnectionAbortedError,
+)
+
+# methods which can safely be sent again if the response to them is lost
+# others (eg, POST) may already have been acted on by the server
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+
+class ConnectionPool():
+    """
+    A thread-safe pool of idle http.client connections, by scheme and host.
+
+    A connection is only ever used by one request at a time: it is removed
+    from the pool for the duration of the request, and returned afterwards.
+
+    """
+    def __init__(self, max_idle_per_host=MAX_IDLE_PER_HOST, context=None):
+        """
+        Initialise a new ConnectionPool object.
+
+        Args:
+          max_idle_per_host (int, optional): The maximum number of idle
+              connections to keep open to each host.
+          context (ssl.SSLContext, optional): The context to use for https
+              connections.  Defaults to the default SSL context.
+
+        """
+        self.max_idle_per_host = max_idle_per_host
+        self._context = context
+
+        # map of (scheme, host) to a list of idle connections
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, scheme, host, timeout):
+        """
+        Get a connection to the given host.
+
+        Args:
+          scheme (str): Either 'http' or 'https'.
+          host (str): The host (and optional port) to connect to.
+          timeout (float): The socket timeout, in seconds.
+
+        Returns:
+          A two-element tuple of the connection, and whether it has been used
+          before (in which case it may have been closed by the server).
+
+        """
+        while True:
+            with self._lock:
+                idle = self._idle.get((scheme, host))
+                conn = idle.pop() if idle else None
+
+            if conn is None:
+                break
+
+            # skip connections which the server has already closed, as
+            # requests which cannot be retried would otherwise fail on them
+            if is_connection_dropped(conn):
+                conn.close()
+                continue
+
+            conn.timeout = timeout
+            if conn.sock is not None:
+                # urllib uses a sentinel when no timeout is given
+                if timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+                    timeout = socket.getdefaulttimeout()
+                conn.sock.settimeout(timeout)
+            return conn, True
+
+        if scheme == 'https':
+            if self._context is None:
+                self._context = ssl.create_default_context()
+            conn = http.client.HTTPSConnection(
+                host, timeout=timeout, context=self._context
+            )
+        else:
+            conn = http.client.HTTPConnection(host, timeout=timeout)
+
+        return conn, False
+
+    def put(self, scheme, host, conn):
+        """
+        Return a connection to the pool, once its response has been read.
+
+        If the pool for the host is already full, close the connection.
+
+        """
+        with self._lock:
+            idle = self._idle.setdefault((scheme, host), [])
+            if len(idle) < self.max_idle_per_host:
+                idle.append(conn)
+                return
+
+        conn.close()
+
+    def close(self):
+        """
+        Close all idle connections.
+
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def is_connection_dropped(conn):
+    """
+    Return whether the given idle connection has been closed by the server.
+
+    An idle connection should have nothing to read, so if its socket is
+    readable, the server has closed it (or sent something unexpected, in
+    which case it is not safe to reuse either).
+
+    """
+    if conn.sock is None:
+        return False  # will reconnect automatically
+
+    try:
+        readable, _, _ = select.select([conn.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
+
+
+class KeepAliveHandler(urllib.request.HTTPHandler,
+                       urllib.request.HTTPSHandler):
+    """
+    A urllib handler for http and https which reuses connections.
+
+    Responses are read in full before being returned, so that the connection
+    can be returned to the pool straight away.  This is intended for API
+    requests, which have small responses; it should not be used for large
+    downloads.
+
+    Attributes:
+      pool (ConnectionPool): The pool of idle connections.
+
+    """
+    def __init__(self, pool=None):
+        """
+        Initialise a new KeepAliveHandler object.
+
+        Args:
+          pool (ConnectionPool, optional): The pool to use.  Defaults to a new
+              ConnectionPool.
+
+        """
+        urllib.request.AbstractHTTPHandler.__init__(self)
+        self.pool = pool if pool is not None else ConnectionPool()
+
+    def http_open(self, req):
+        return self._open(req, 'http')
+
+    def https_open(self, req):
+        return self._open(req, 'https')
+
+    def _send(self, conn, req, headers):
+        """
+        Send the given request on the given connection.
+
+        """
+        conn.request(
+            req.get_method(), req.selector, req.data, headers,
+            encode_chunked=req.has_header('Transfer-encoding'),
+        )
+
+    def _receive(self, conn):
+        """
+        Read the response to the last request sent on the given connection.
+
+        Returns:
+          A two-element tuple of the http.client.HTTPResponse object, and the
+          response body.
+
+        """
+        response = conn.getresponse()
+        return response, response.read()
+
+    def _open(self, req, scheme):
+        """
+        Make the given request, reusing a pooled connection if possible.
+
+        This mirrors urllib.request.AbstractHTTPHandler.do_open.
+
+        If a reused connection turns out to have been closed by the server,
+        the request is retried on another connection, provided that it cannot
+        have been acted on twice: either it was not sent in full, or its
+        method is idempotent.
+
+        """
+        host = req.host
+        if not host:
+            raise urllib.error.URLError('no host given')
+
+        headers = dict(req.unredirected_hdrs)
+        headers.update(
+            (k, v) for k, v in req.headers.items() if k not in headers
+        )
+        headers['Connection'] = 'keep-alive'
+        headers = {name.title(): val for name, val in headers.items()}
+
+        can_resend = req.get_method() in IDEMPOTENT_METHODS
+
+        while True:
+            conn, reused = self.pool.get(scheme, host, req.timeout)
+            sent = False
+            try:
+                self._send(conn, req, headers)
+                sent = True
+                response, body = self._receive(conn)
+            except STALE_CONNECTION_ERRORS as e:
+                conn.close()
+                if reused and (can_resend or not sent):
+                    continue  # the server closed it; try another
+                raise urllib.error.URLError(e)
+            except OSError as e:
+                conn.close()
+                raise urllib.error.URLError(e)
+            except BaseException:
+                conn.close()
+                raise
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.put(scheme, host, conn)
+
+        result = urllib.response.addinfourl(
+            io.BytesIO(body), response.msg, req.get_full_url(),
+            response.status,
+        )
+        result.msg = response.reason
+        return result
+
+
+class GzipProcessor(urllib.request.BaseHandler):
+    """
+    A urllib processor which compresses request bodies and responses.
+
+    Request bodies larger than the threshold are sent with
+    Content-Encoding: gzip, and every request asks for a gzipped response.
+    Gzipped responses are decompressed transparently.
+
+    Only request bodies sent to the given hosts are compressed, as other
+    servers (eg, the login server) will not accept them.
+
+    Attributes:
+      hosts ({str}): The hosts (with port, if given) to compress request
+          bodies for.
+
+    """
+    # run before the http handlers' own request processing, so that they see
+    # (and set the Content-Length of) the compressed body
+    handler_order = 400
+
+    def __init__(self, hosts=(), threshold=COMPRESS_THRESHOLD):
+        """
+        Initialise a new GzipProcessor object.
+
+        Args:
+          hosts (iterable of str, optional): The hosts to compress request
+              bodies for.  Defaults to none.
+          threshold (int, optional): The minimum size of a request body to
+              compress, in bytes.  Defaults to COMPRESS_THRESHOLD.
+
+        """
+        self.hosts = set(hosts)
+        self.threshold = threshold
+
+    def http_request(self, req):
+        if not req.has_header('Accept-encoding'):
+            req.add_unredirected_header('Accept-Encoding', 'gzip')
+
+        data = req.data
+        if req.host in self.hosts and isinstance(data, bytes) \
+                and len(data) >= self.threshold \
+                and not req.has_header('Content-encoding'):
+            req.data = gzip.compress(data)
+            req.add_unredirected_header('Content-Encoding', 'gzip')
+
+            # the body has changed, so the length will need recalculating
+            req.remove_header('Content-length')
+
+        return req
+
+    def http_response(self, req, response):
+        encoding = response.headers.get('Content-Encoding', '')
+        if encoding.strip().lower() != 'gzip':
+            return response
+
+        try:
+            body = gzip.decompress(response.read())
+        except (OSError, EOFError, zlib.error) as e:
+            raise urllib.error.URLError(
+                'Invalid gzipped response: {}'.format(e)
+            ) from e
+        finally:
+            response.close()
+
+        headers = response.headers
+        del headers['Content-Encoding']
+        del headers['Content-Length']
+
+        result = urllib.response.addinfourl(
+            io.BytesIO(body), headers, response.geturl(), response.code
+        )
+        result.msg = response.msg
+        return result
+
+    https_request = http_request
+    https_response = http_response
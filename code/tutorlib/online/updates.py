@@ -0,0 +1,232 @@
+"""
+Delta updates for tutorial packages.
+
+Alongside the full tutorial package zip file, create_tutorial.py publishes a
+small zip file for each tutorial directory, and a manifest with a hash of the
+contents of each directory.  This allows a client to download only the
+tutorials which have changed, instead of the whole package.
+
+The manifest is a dictionary with keys:
+  url -- the base URL of the update archives (added by the server)
+  files -- a mapping of the package configuration filenames (tutorials.txt
+           and config.txt) to their contents
+  tutorials -- a mapping of each tutorial directory name to the hash of its
+               contents, as returned by get_directory_hash
+
+"""
+from hashlib import sha512
+import os
+import shutil
+import tempfile
+from zipfile import BadZipFile, ZipFile
+
+
+# the package file containing the timestamp, which is written last
+CONFIG_FILE = 'config.txt'
+
+
+class PackageUpdateError(Exception):
+    """
+    An error encountered when applying a delta update to a tutorial package.
+
+    """
+    pass
+
+
+def get_directory_hash(path):
+    """
+    Return a hash of the contents of the given directory.
+
+    This covers the relative path and contents of every file in the directory
+    (recursively), in a consistent order.
+
+    Args:
+      path (str): The path to the directory.
+
+    Returns:
+      The sha512 hash of the directory, as a hex string.
+
+    """
+    hash_obj = sha512()
+
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()  # walk subdirectories in a consistent order
+
+        for filename in sorted(filenames):
+            file_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(file_path, path).replace(os.sep, '/')
+
+            with open(file_path, 'rb') as f:
+                data = f.read()
+
+            # include the length, so that file boundaries are unambiguous
+            hash_obj.update(rel_path.encode('utf8') + b'\0')
+            hash_obj.update(str(len(data)).encode('ascii') + b'\0' + data)
+
+    return hash_obj.hexdigest()
+
+
+def _check_name(name):
+    """
+    Check that the given name from the manifest refers to an entry in the
+    top level of the package directory.
+
+    Raises:
+      PackageUpdateError: If the name is not a plain file or directory name.
+
+    """
+    if not name or name.startswith('.') or os.path.basename(name) != name:
+        raise PackageUpdateError('Invalid name in manifest: {}'.format(name))
+
+
+def get_changed_tutorials(tut_dir, manifest):
+    """
+    Return the tutorial directories which differ from those in the manifest.
+
+    Args:
+      tut_dir (str): The path to the local tutorial package.
+      manifest (dict): The manifest of the latest tutorial package.
+
+    Returns:
+      A sorted list of the names of the tutorial directories which are
+      missing or out of date.
+
+    """
+    changed = []
+
+    for directory, directory_hash in manifest['tutorials'].items():
+        path = os.path.join(tut_dir, directory)
+        if not os.path.isdir(path) \
+                or get_directory_hash(path) != directory_hash:
+            changed.append(directory)
+
+    return sorted(changed)
+
+
+def _extract_tutorial(archive_path, directory, staging_dir):
+    """
+    Extract the update archive for the given tutorial into the staging
+    directory.
+
+    Raises:
+      PackageUpdateError: If the archive is invalid.
+
+    """
+    try:
+        with ZipFile(archive_path) as zf:
+            prefix = '{}/'.format(directory)
+            for name in zf.namelist():
+                if not name.startswith(prefix) or '..' in name.split('/'):
+                    raise PackageUpdateError(
+                        'Unexpected file in update for {}: {}'.format(
+                            directory, name
+                        )
+                    )
+
+            zf.extractall(staging_dir)
+    except BadZipFile as e:
+        raise PackageUpdateError(
+            'Invalid update archive for {}'.format(directory)
+        ) from e
+
+
+def _write_file(path, contents, staging_dir):
+    """
+    Atomically replace the file at the given path with the given contents.
+
+    """
+    tmp_path = os.path.join(staging_dir, os.path.basename(path))
+    with open(tmp_path, 'w') as f:
+        f.write(contents)
+    os.replace(tmp_path, path)
+
+
+def update_tutorial_package(tut_dir, web_api):
+    """
+    Update the tutorial package in the given directory, by downloading only
+    the tutorials which have changed.
+
+    Updated tutorials are downloaded and verified in a staging directory, and
+    only then swapped into place, one directory at a time.  The package
+    timestamp (in config.txt) is written last, so if the update is interrupted
+    the package will still be seen as out of date, and the update will be
+    completed on the next attempt.
+
+    Args:
+      tut_dir (str): The path to the local tutorial package.
+      web_api (WebAPI): The WebAPI instance to use.
+
+    Returns:
+      The number of tutorials which were updated.
+
+    Raises:
+      PackageUpdateError: If the manifest or any of the update archives are
+          invalid.
+      WebAPIError: If any request fails.
+
+    """
+    manifest = web_api.get_tutorials_manifest()
+
+    try:
+        tutorials = manifest['tutorials']
+        files = manifest['files']
+        manifest['url']
+    except (KeyError, TypeError) as e:
+        raise PackageUpdateError('Invalid manifest') from e
+
+    for name in list(tutorials) + list(files):
+        _check_name(name)
+
+    changed = get_changed_tutorials(tut_dir, manifest)
+
+    # stage inside the package directory, so that everything is on the same
+    # filesystem (and so renames are atomic)
+    staging_dir = tempfile.mkdtemp(prefix='.update-', dir=tut_dir)
+
+    try:
+        for directory in changed:
+            archive_path = web_api.get_tutorial_archive(manifest, directory)
+            try:
+                _extract_tutorial(archive_path, directory, staging_dir)
+            finally:
+                os.remove(archive_path)
+
+            # the package may have been rebuilt since we got the manifest
+            staged_path = os.path.join(staging_dir, directory)
+            if not os.path.isdir(staged_path) \
+                    or get_directory_hash(staged_path) != tutorials[directory]:
+                raise PackageUpdateError(
+                    'Update for {} does not match manifest'.format(directory)
+                )
+
+        # everything has been downloaded; swap in the new tutorials
+        for directory in changed:
+            path = os.path.join(tut_dir, directory)
+            if os.path.exists(path):
+                os.rename(
+                    path, os.path.join(staging_dir, '{}.old'.format(directory))
+                )
+            os.rename(os.path.join(staging_dir, directory), path)
+
+        for filename, contents in files.items():
+            if filename != CONFIG_FILE:
+                _write_file(
+                    os.path.join(tut_dir, filename), contents, staging_dir
+                )
+
+        # remove any tutorials which are no longer in the package
+        for name in os.listdir(tut_dir):
+            path = os.path.join(tut_dir, name)
+            if not name.startswith('.') and name not in tutorials \
+                    and os.path.isdir(path):
+                shutil.rmtree(path)
+
+        if CONFIG_FILE in files:
+            _write_file(
+                os.path.join(tut_dir, CONFIG_FILE), files[CONFIG_FILE],
+                staging_dir,
+            )
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return len(changed)
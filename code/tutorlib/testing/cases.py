@@ -22,6 +22,77 @@ from tutorlib.testing.support import trim_indentation
 STUDENT_LOCALS_NAME = 'student_lcls'
 TEST_RESULT_IDENTIFIER = '__test_result'
 
+# map of (code object, filename, line number) of a test function to the
+# compiled (definition, call) code objects for running it in the student
+# context (see get_test_function_code)
+_test_function_code = {}
+
+
+def get_test_function_code(f):
+    """
+    Return the code needed to run the given test function in the student
+    context.
+
+    Getting the source of a function re-reads and tokenises the file it is
+    defined in, which is much more expensive than running most tests.  The
+    result is therefore cached, keyed on the function's code object and
+    source location.  A tests module is only recompiled when it changes (see
+    CodeCache), so the functions defined in it keep the same code objects
+    each time it is executed.
+
+    Args:
+      f (function or code): The test function, or its code object.
+
+    Returns:
+      A two-element tuple of code objects.  The first defines the function,
+      and the second calls it, storing the result as TEST_RESULT_IDENTIFIER.
+
+    """
+    code = getattr(f, '__code__', f)
+    key = code, code.co_filename, code.co_firstlineno
+
+    cached = _test_function_code.get(key)
+    if cached is not None:
+        return cached
+
+    function_source = trim_indentation(inspect.getsource(code))
+    definition = compile(function_source, '<test_function>', 'exec')
+
+    test_statement = '{} = {}()'.format(TEST_RESULT_IDENTIFIER, code.co_name)
+    call = compile(test_statement, '<test_run>', 'single')
+
+    _test_function_code[key] = definition, call
+    return definition, call
+
+
+def prepare_test_functions(test_classes):
+    """
+    Fill the test function cache for the given test classes.
+
+    Every function defined directly in a test method is prepared, as it may be
+    run in the student context.  Functions whose source cannot be compiled on
+    its own (eg, lambdas) are skipped.
+
+    Args:
+      test_classes ([StudentTestCase]): The test classes to prepare.  This is
+          a list of classes, not of instances.
+
+    """
+    for test_class in test_classes:
+        for name in unittest.TestLoader().getTestCaseNames(test_class):
+            method_code = getattr(getattr(test_class, name), '__code__', None)
+            if method_code is None:
+                continue
+
+            for const in method_code.co_consts:
+                if not inspect.iscode(const) or const.co_name == '<lambda>':
+                    continue
+
+                try:
+                    get_test_function_code(const)
+                except (OSError, TypeError, SyntaxError):
+                    pass  # will fail in the same way when it is run
+
 
 class StudentTestCase(unittest.TestCase):
     """
@@ -92,23 +163,19 @@ class StudentTestCase(unittest.TestCase):
         student_lcls = globals()[STUDENT_LOCALS_NAME]
         lcls = copy.copy(student_lcls)
 
-        function_source = trim_indentation(inspect.getsource(f))
-        exec(compile(function_source, '<test_function>', 'exec'), lcls)
+        definition, call = get_test_function_code(f)
+        exec(definition, lcls)
 
         # we now have our function, as an object, in the context of the
         # student code
         # now we need to actually *run* it, and extract the output, in that
-        # same context, and again we need a string for that
-        function_name = f.__name__
-        test_statement = '{} = {}()'.format(
-            TEST_RESULT_IDENTIFIER, function_name
-        )
+        # same context, and again we need a string for that (compiled above)
 
         # finally, actually execute that test function, and extract the result
         with redirect_stdin(input_stream), redirect_stdout(output_stream), \
                 redirect_stderr(error_stream), \
                 redirect_input_prompt(lcls, input_prompts_stream):
-            exec(compile(test_statement, '<test_run>', 'single'), lcls)
+            exec(call, lcls)
             result = lcls[TEST_RESULT_IDENTIFIER]
 
         self.standard_output = output_stream.getvalue()
@@ -129,6 +129,52 @@ class TutorialTestResult():
             'status must be one of {}'.format(TutorialTestResult.STATUSES)
         self._status = status
 
+    def serialise(self):
+        """
+        Return a representation of this result which can be pickled.
+
+        Exceptions raised by student code cannot, in general, be pickled (or
+        may not unpickle to the same thing), so only the message and line
+        number of the exception are retained.
+
+        Returns:
+          A tuple which can be passed to deserialise.
+
+        """
+        if self._exception is None:
+            exception_info = None
+        else:
+            exception_info = (
+                str(self._exception),
+                getattr(self._exception, 'line_number', None),
+            )
+
+        return (self.description, self.status, exception_info,
+                self.output_text, self.error_text)
+
+    @classmethod
+    def deserialise(cls, data):
+        """
+        Create a new TutorialTestResult from the output of serialise.
+
+        Any exception will be recreated as a StudentTestError, with the same
+        message and line number as the original exception.
+
+        Args:
+          data (tuple): The serialised result.
+
+        Returns:
+          A new TutorialTestResult object.
+
+        """
+        description, status, exception_info, output_text, error_text = data
+
+        exception = None
+        if exception_info is not None:
+            exception = StudentTestError(*exception_info)
+
+        return cls(description, status, exception, output_text, error_text)
+
 
 class TestResult(unittest.TestResult):
     """
@@ -0,0 +1,148 @@
+import ast
+
+from tutorlib.testing.support import indent
+
+
+STUDENT_FUNCTION_NAME = '_function_under_test'
+STUDENT_CODE_FILENAME = '<student_code>'
+
+
+class PreparedSubmission():
+    """
+    A student's code, parsed and compiled ready for analysis and testing.
+
+    Checking a submission involves checking it for compile errors, analysing
+    its syntax tree, and then executing it once for each test class.  Rather
+    than each of those steps parsing and compiling the code itself, they all
+    share a single PreparedSubmission, which does that work at most once.
+
+    The tree and code objects are only built when first needed.  The compiled
+    code object may be executed any number of times.
+
+    Attributes:
+      text (str): The student's code.
+      wrap_student_code (bool): Whether the code is wrapped in a function
+          (named STUDENT_FUNCTION_NAME) before being executed for testing.
+          This moves any global definitions into the function, so that they
+          do not run when the code is first executed but can be called later.
+      num_offset_lines (int): The number of extra lines inserted before the
+          student's code in the code executed for testing.
+
+    """
+    def __init__(self, text, wrap_student_code=False):
+        """
+        Initialise a new PreparedSubmission object.
+
+        Args:
+          text (str): The student's code.
+          wrap_student_code (bool, optional): If True, wrap the code in a
+              function before executing it for testing.  Defaults to False.
+
+        """
+        self.text = text
+        self.wrap_student_code = wrap_student_code
+        self.num_offset_lines = 1 if wrap_student_code else 0
+
+        self._compiled = False
+        self._tree = None
+        self._code = None
+        self._error = None
+
+        self._test_compiled = False
+        self._test_code = None
+        self._test_error = None
+
+    def _compile(self):
+        """
+        Parse and compile the student's code, if that has not been done yet.
+
+        """
+        if self._compiled:
+            return
+        self._compiled = True
+
+        try:
+            self._tree = ast.parse(self.text, STUDENT_CODE_FILENAME)
+            self._code = compile(self._tree, STUDENT_CODE_FILENAME, 'exec')
+        except Exception as e:
+            self._error = e
+
+    @property
+    def tree(self):
+        """
+        The syntax tree of the student's code, as an ast.Module.
+
+        This is None if the code could not be parsed.
+
+        """
+        self._compile()
+        return self._tree
+
+    @property
+    def code(self):
+        """
+        The compiled student's code, as a code object.
+
+        This is None if the code could not be compiled.
+
+        """
+        self._compile()
+        return self._code
+
+    @property
+    def error(self):
+        """
+        The exception raised in parsing or compiling the student's code, or
+        None if the code compiled successfully.
+
+        """
+        self._compile()
+        return self._error
+
+    def _compile_test_code(self):
+        """
+        Compile the code to execute for testing, if that has not been done
+        yet.
+
+        """
+        if self._test_compiled:
+            return
+        self._test_compiled = True
+
+        if not self.wrap_student_code:
+            self._test_code = self.code
+            self._test_error = self.error
+            return
+
+        wrapped_text = 'def {}():\n{}'.format(
+            STUDENT_FUNCTION_NAME, indent(self.text)
+        )
+
+        try:
+            self._test_code = compile(
+                wrapped_text, STUDENT_CODE_FILENAME, 'exec'
+            )
+        except Exception as e:
+            self._test_error = e
+
+    @property
+    def test_code(self):
+        """
+        The code object to execute for testing (wrapped in a function if
+        wrap_student_code is set).
+
+        This is None if the code could not be compiled.
+
+        """
+        self._compile_test_code()
+        return self._test_code
+
+    @property
+    def test_error(self):
+        """
+        The exception raised in compiling the code to execute for testing, or
+        None if it compiled successfully.
+
+        """
+        self._compile_test_code()
+        return self._test_error
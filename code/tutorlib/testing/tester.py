@@ -8,13 +8,10 @@ import tutorlib.testing.cases
 from tutorlib.testing.cases import StudentTestCase, STUDENT_LOCALS_NAME
 from tutorlib.testing.results import TestResult, TutorialTestResult
 from tutorlib.testing.support \
-        import StudentTestError, construct_header_message, indent, \
+        import StudentTestError, construct_header_message, \
                inject_to_module, remove_from_module
 
 
-STUDENT_FUNCTION_NAME = '_function_under_test'
-
-
 class InvalidInputError(Exception):
     """
     An error raised when the student's code requests input during compilation.
@@ -80,67 +77,92 @@ class TutorialTester():
             result.status == TutorialTestResult.PASS for result in self.results
         )
 
-    def run(self, code_text, wrap_student_code):
+    def set_result(self, index, result):
+        """
+        Set the result of the test at the given index in test_classes.
+
+        This allows the tests to be run elsewhere (eg, in a worker process),
+        with only the results being recorded here.
+
+        Args:
+          index (int): The index of the test class in test_classes.
+          result (TutorialTestResult): The result of the test.
+
+        """
+        self._results[self.test_classes[index]] = result
+
+    def run(self, submission, listener=None):
         """
-        Test the given code.
+        Test the given submission.
 
-        If necessary, the student's code will be wrapped.  This involves moving
-        any global definitions into a function, so that they do not run when
-        the module is first compiled and executed but can be called later.
+        If necessary, the student's code will have been wrapped (see
+        PreparedSubmission).  The code is compiled only once, no matter how
+        many test classes there are, but each test class is run in its own
+        copy of the support namespace (see run_test).
 
         The actual running of each test is deferred to the run_test method.
 
         Args:
-          code_text (str): The code to test.
-          wrap_student_code (bool): If True, wrap the given code text in a
-              function before executing it.
+          submission (PreparedSubmission): The code to test.
+          listener ((int, TutorialTestResult) -> None, optional): A callback
+              which will be called with the index and result of each test as
+              it completes.  Defaults to None.
 
         """
-        if wrap_student_code:
-            code_text = 'def {}():\n{}'.format(
-                STUDENT_FUNCTION_NAME, indent(code_text)
-            )
-            num_offset_lines = 1
-        else:
-            num_offset_lines = 0
-
-        for test_class in self.test_classes:
-            result = self.run_test(test_class, code_text, num_offset_lines)
+        for index, test_class in enumerate(self.test_classes):
+            result = self.run_test(test_class, submission)
 
             self._results[test_class] = result
 
-    def run_test(self, test_class, code_text, num_offset_lines):
+            if listener is not None:
+                listener(index, result)
+
+    def run_test(self, test_class, submission):
         """
         Test the given code using the given test case class.
 
-        As far as possible, this will not alter the test_gbls and test_lcls
-        attributes.  However, it is theoretically possible for the students
-        to alter them (eg, by directly messing with builtins in globals).
-
-        We take a deepcopy of test_lcls if possible, which should avoid this
-        problem in that respect, but unfortunately that's not possible with
-        test_gbls (certain builtin values can/will cause a copy to fail).
+        As far as possible, this will not alter the test_lcls attribute.  Each
+        test gets a fresh copy of test_lcls (a deepcopy if possible), in which
+        the student's code is executed.
 
-        As a result, mild prayers and/or small sacrificies are recommended
-        when calling this method.
+        However, it is theoretically possible for the students to alter it
+        (eg, by directly messing with builtins in globals), so mild prayers
+        and/or small sacrificies are recommended when calling this method.
 
         Args:
           test_class (StudentTestCase): The test class (not instance) to use.
-          code_text (str): The code to test.
-          num_offset_lines (int): The number of extra lines inserted before the
-            student's code.
+          submission (PreparedSubmission): The code to test.
 
         Returns:
           The result of running the test, as a TutorialTestResult object.
 
         """
+        # the code only needs to be compiled once for every test class, so any
+        # error in compiling it will be the same every time
+        if submission.test_error is not None:
+            e = submission.test_error
+            if isinstance(e, SyntaxError):
+                message = 'No code to test'
+            else:
+                message = 'Could not parse student code: {}'.format(e)
+
+            line_number = getattr(e, 'lineno', None)
+            if line_number is not None:
+                line_number -= submission.num_offset_lines
+
+            return TutorialTestResult(
+                test_class.DESCRIPTION,
+                TutorialTestResult.FAIL,
+                StudentTestError(message, line_number),
+            )
+
         # grab a copy of our context to use
         try:
             lcls = copy.deepcopy(self.test_lcls)
         except:
             lcls = copy.copy(self.test_lcls)
 
-        # replace input, so that prompts don't cause compile/exec to hang
+        # replace input, so that prompts don't cause exec to hang
         old_input = lcls.get('input')
 
         def _input(prompt=''):
@@ -151,9 +173,9 @@ class TutorialTester():
             )
         lcls['input'] = _input
 
-        # execute the student's code, and grab a reference to the function
+        # execute the student's code
         try:
-            exec(compile(code_text, '<student_code>', 'exec'), lcls)
+            exec(submission.test_code, lcls)
         except Exception as e:
             # there are some special messages that we want to try to provide
             if isinstance(e, SyntaxError):
@@ -166,7 +188,7 @@ class TutorialTester():
             # attempt to grab the line number
             # assume there's at least one entry (which there must be)
             _, line_number, _, _ = traceback.extract_tb(e.__traceback__)[-1]
-            line_number -= num_offset_lines
+            line_number -= submission.num_offset_lines
 
             return TutorialTestResult(
                 test_class.DESCRIPTION,
@@ -182,6 +204,21 @@ class TutorialTester():
                 else:
                     lcls['input'] = old_input
 
+        return self._run_test_in_namespace(test_class, lcls)
+
+    def _run_test_in_namespace(self, test_class, lcls):
+        """
+        Run a test using the given test class, against the given namespace.
+
+        Args:
+          test_class (StudentTestCase): The test class (not instance) to use.
+          lcls ({str: object}): The namespace in which the student's code has
+              been executed.
+
+        Returns:
+          The result of running the test, as a TutorialTestResult object.
+
+        """
         # inject necessary data into global scope
         inject_to_module(tutorlib.testing.cases, STUDENT_LOCALS_NAME, lcls)
 
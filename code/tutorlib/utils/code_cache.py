@@ -0,0 +1,146 @@
+from hashlib import sha512
+import importlib.util
+import marshal
+import os
+
+
+class CodeCache():
+    """
+    A cache of compiled code objects for module files.
+
+    Compiling a module is much more expensive than executing the resulting
+    code object, so the code objects are kept in memory for as long as the
+    module file is unchanged (as determined by its modification time and size).
+
+    If a cache directory is given, the compiled code is also written to disk,
+    in the same way as __pycache__ (but keyed on a hash of the path and source,
+    rather than on the module name).  This means that only the first use of a
+    module after it changes will require compilation, even across sessions.
+
+    Attributes:
+      cache_dir (str): The directory to store compiled code in, or None if
+          compiled code should only be cached in memory.
+
+    """
+    def __init__(self, cache_dir=None):
+        """
+        Initialise a new CodeCache object.
+
+        Args:
+          cache_dir (str, optional): The directory to store compiled code in.
+              This will be created if it does not exist.  Defaults to None,
+              which indicates that compiled code should not be stored on disk.
+
+        """
+        self.cache_dir = cache_dir
+
+        # map of path to ((mtime, size), code object)
+        self._code = {}
+
+    def compile(self, path):
+        """
+        Return a code object for the module at the given path.
+
+        Args:
+          path (str): The path of the module to compile.
+
+        Returns:
+          The compiled code object.
+
+        Raises:
+          SyntaxError: If the module is not valid Python.
+
+        """
+        st = os.stat(path)
+        signature = st.st_mtime, st.st_size
+
+        cached = self._code.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with open(path) as f:
+            source = f.read()
+
+        code = self._load(path, source)
+        if code is None:
+            code = compile(source, path, 'exec')
+            self._store(path, source, code)
+
+        self._code[path] = signature, code
+        return code
+
+    def clear(self):
+        """
+        Clear the in-memory cache.
+
+        """
+        self._code.clear()
+
+    def _get_cache_path(self, path, source):
+        """
+        Return the path to the on-disk cache file for the given module.
+
+        The code object includes the path (for tracebacks), so both the path
+        and the source are included in the key.
+
+        """
+        key = sha512(
+            path.encode('utf8') + b'\0' + source.encode('utf8')
+        ).hexdigest()
+        return os.path.join(self.cache_dir, key[:40] + '.pyc')
+
+    def _load(self, path, source):
+        """
+        Load the compiled code for the given module from disk.
+
+        Returns:
+          The compiled code object, or None if there is no valid cached copy.
+
+        """
+        if self.cache_dir is None:
+            return None
+
+        try:
+            with open(self._get_cache_path(path, source), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # bytecode is only valid for the version of Python which wrote it
+        magic = importlib.util.MAGIC_NUMBER
+        if not data.startswith(magic):
+            return None
+
+        try:
+            return marshal.loads(data[len(magic):])
+        except (EOFError, ValueError, TypeError):
+            return None  # corrupt cache file; just recompile
+
+    def _store(self, path, source, code):
+        """
+        Write the compiled code for the given module to disk.
+
+        Failure to write the cache is not an error.
+
+        """
+        if self.cache_dir is None:
+            return
+
+        cache_path = self._get_cache_path(path, source)
+        tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            with open(tmp_path, 'wb') as f:
+                f.write(importlib.util.MAGIC_NUMBER)
+                f.write(marshal.dumps(code))
+
+            # replace atomically, so that a concurrent reader never sees a
+            # partially written file
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
@@ -0,0 +1,214 @@
+from hashlib import sha1
+import json
+import os
+import shutil
+import threading
+import urllib.error
+import urllib.request
+
+from tutorlib.utils.tmp import mkstemp
+
+
+class DownloadCache():
+    """
+    A persistent cache of downloaded files, keyed by URL.
+
+    Each cached file is stored with the validators (ETag and Last-Modified)
+    which the server sent with it.  When the same URL is retrieved again, the
+    request is made conditional on those validators, and if the server
+    responds with 304 Not Modified, the cached copy is used instead of
+    downloading the file again.
+
+    Responses without validators are not cached.
+
+    Attributes:
+      directory (str): The directory containing the cached files.
+
+    """
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, directory):
+        """
+        Initialise a new DownloadCache object.
+
+        Args:
+          directory (str): The directory to store cached files in.  This will
+              be created if it does not exist.
+
+        """
+        self.directory = directory
+
+        # map of url to {'file': ..., 'etag': ..., 'last_modified': ...}
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, DownloadCache.INDEX_FILE)
+
+    def _load(self):
+        """
+        Load the cache index, if it has not already been loaded.
+
+        This must be called with the lock held.
+
+        """
+        if self._entries is not None:
+            return
+
+        try:
+            with open(self._index_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}  # missing or corrupt; start again
+
+        self._entries = entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        """
+        Write the cache index.
+
+        Failure to write the index is not an error.  This must be called with
+        the lock held.
+
+        """
+        tmp_path = '{}.{}.tmp'.format(self._index_path, os.getpid())
+
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self._index_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _get_entry(self, url):
+        """
+        Return the cache entry for the given url, if the cached file exists.
+
+        This must be called with the lock held.
+
+        """
+        self._load()
+
+        entry = self._entries.get(url)
+        if not isinstance(entry, dict) or 'file' not in entry:
+            return None
+
+        path = os.path.join(self.directory, entry['file'])
+        if not os.path.isfile(path):
+            return None
+
+        return entry
+
+    def retrieve(self, url, filename=None):
+        """
+        Retrieve the object at the given URL, and store it to the local
+        filesystem.
+
+        This has the same interface as tutorlib.utils.tmp.retrieve.  The file
+        returned is always a copy, so the caller may modify or delete it.
+
+        Args:
+          url (str): The URL to retrieve.
+          filename (str, optional): The path to save the retrieved file to.
+            If None, the file will be saved to the MyPyTutor temporary
+            directory.
+
+        Returns:
+          The path to the downloaded file.
+
+        """
+        if filename is None:
+            _, filename = mkstemp()
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            entry = self._get_entry(url)
+
+            request = urllib.request.Request(url)
+            if entry is not None:
+                if entry.get('etag'):
+                    request.add_header('If-None-Match', entry['etag'])
+                if entry.get('last_modified'):
+                    request.add_header(
+                        'If-Modified-Since', entry['last_modified']
+                    )
+
+            try:
+                response = urllib.request.urlopen(request)
+            except urllib.error.HTTPError as e:
+                if e.code != 304 or entry is None:
+                    raise
+
+                # our copy is still current
+                e.close()
+                shutil.copyfile(
+                    os.path.join(self.directory, entry['file']), filename
+                )
+                return filename
+
+            with response:
+                etag = response.headers.get('ETag')
+                last_modified = response.headers.get('Last-Modified')
+
+                if etag is None and last_modified is None:
+                    # the server doesn't support revalidation; don't cache
+                    with open(filename, 'wb') as f:
+                        shutil.copyfileobj(response, f)
+                    return filename
+
+                # download to a temporary file, so that an interrupted
+                # download never replaces a good cached copy
+                cache_file = sha1(url.encode('utf8')).hexdigest()
+                cache_path = os.path.join(self.directory, cache_file)
+                tmp_path = '{}.{}.tmp'.format(cache_path, os.getpid())
+
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        shutil.copyfileobj(response, f)
+                    os.replace(tmp_path, cache_path)
+                except BaseException:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                    raise
+
+            self._entries[url] = {
+                'file': cache_file,
+                'etag': etag,
+                'last_modified': last_modified,
+            }
+            self._save()
+
+            shutil.copyfile(cache_path, filename)
+
+        return filename
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_download_cache(directory):
+    """
+    Return the DownloadCache for the given directory.
+
+    The same object is returned for every call with the same directory, so
+    that the cache index is only read once.
+
+    Args:
+      directory (str): The cache directory.
+
+    Returns:
+      The DownloadCache object.
+
+    """
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = DownloadCache(directory)
+        return cache
@@ -0,0 +1,182 @@
+import base64
+from contextlib import contextmanager
+import json
+import os
+import threading
+
+
+class HashCache():
+    """
+    A persistent cache of hashes of sets of files.
+
+    Each hash is stored with a signature of the files it was computed from
+    (such as their sizes and modification times).  A cached hash is only
+    returned if the signature is unchanged, so the cache never needs to be
+    invalidated explicitly.
+
+    The cache is stored as a JSON file, which is read on first use and written
+    (atomically) whenever a new hash is added.  When adding many hashes, use
+    deferred_save to write the file only once.
+
+    Attributes:
+      path (str): The path of the cache file.
+
+    """
+    def __init__(self, path):
+        """
+        Initialise a new HashCache object.
+
+        Args:
+          path (str): The path of the cache file.  This (and its directory)
+              will be created if it does not exist.
+
+        """
+        self.path = path
+
+        # map of key to [signature, base32 hash]
+        self._entries = None
+        self._lock = threading.Lock()
+
+        # the number of active deferred_save blocks, and whether there are
+        # entries which have not been written since
+        self._deferrals = 0
+        self._dirty = False
+
+    def _load(self):
+        """
+        Load the cache file, if it has not already been loaded.
+
+        This must be called with the lock held.
+
+        """
+        if self._entries is not None:
+            return
+
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            entries = {}  # missing or corrupt; start again
+
+        self._entries = entries if isinstance(entries, dict) else {}
+
+    def _save(self):
+        """
+        Write the cache file.
+
+        Failure to write the cache is not an error.  This must be called with
+        the lock held.
+
+        """
+        self._dirty = False
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            with open(tmp_path, 'w') as f:
+                json.dump(self._entries, f)
+
+            # replace atomically, so that a concurrent reader never sees a
+            # partially written file
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def get(self, key, signature):
+        """
+        Return the cached hash for the given key.
+
+        Args:
+          key (str): The key of the hash (eg, a path).
+          signature (list): The current signature of the files hashed.  This
+              must be JSON-serialisable.
+
+        Returns:
+          The cached hash, as bytes, or None if there is no cached hash with
+          a matching signature.
+
+        """
+        with self._lock:
+            self._load()
+            entry = self._entries.get(key)
+
+        if not isinstance(entry, list) or len(entry) != 2 \
+                or entry[0] != signature:
+            return None
+
+        try:
+            return base64.b32decode(entry[1])
+        except (TypeError, ValueError):
+            return None  # corrupt entry; will be recomputed
+
+    def put(self, key, signature, value):
+        """
+        Add the given hash to the cache, and write the cache file (unless this
+        is inside a deferred_save block).
+
+        Args:
+          key (str): The key of the hash (eg, a path).
+          signature (list): The signature of the files hashed.  This must be
+              JSON-serialisable.
+          value (bytes): The hash.
+
+        """
+        with self._lock:
+            self._load()
+            self._entries[key] = [
+                signature, base64.b32encode(value).decode('ascii')
+            ]
+            self._dirty = True
+
+            if not self._deferrals:
+                self._save()
+
+    @contextmanager
+    def deferred_save(self):
+        """
+        Return a context manager which defers writing the cache file until it
+        exits, so that adding many hashes only writes the file once.
+
+        These blocks may be nested, or used from several threads at once.  The
+        file is written when the last of them exits, if any hashes were added.
+
+        """
+        with self._lock:
+            self._deferrals += 1
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._deferrals -= 1
+                if not self._deferrals and self._dirty:
+                    self._save()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_hash_cache(path):
+    """
+    Return the HashCache for the given path.
+
+    The same object is returned for every call with the same path, so that the
+    cache file is only read once.
+
+    Args:
+      path (str): The path of the cache file.
+
+    Returns:
+      The HashCache object.
+
+    """
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = HashCache(path)
+        return cache